@@ -11,6 +11,11 @@ class ChatRequest:
     query: str
     chat_history: List[ChatMessage] = field(default_factory=list)
 
+@dataclass
+class BatchChatRequest:
+    requests: List[ChatRequest]
+    stream: bool = False
+
 @dataclass
 class ArticleInfo:
     id: int
@@ -1,9 +1,19 @@
 from fastapi import APIRouter, HTTPException, Body
-from typing import Dict, Any, List, Union
-from app.api.models import ChatResponse, ChatRequest
-from app.core.rag import RAG
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from typing import Dict, Any, List, Tuple, Union
+from app.api.models import ChatResponse, ChatRequest, BatchChatRequest
+from app.core.rag import RAG, OVERLOADED_RESPONSE
+from app.core.llm_scheduler import LLMOverloadedError
+from app.core.batch import BatchRAG
+from app.core.context import RequestContext
+from app.core.formatter import parse_response
+from app.core.warmup import warmup
+from app.utils.metrics import metrics
+from app.config import settings
+import asyncio
+import json
 import logging
-import re
+import time
 
 logger = logging.getLogger(__name__)
 
@@ -20,89 +30,184 @@ def enhance_response_formatting(text: str) -> Dict[str, Any]:
         logger.warning(f"Response is not a string: {type(text)}. Converting to string.")
         text = str(text)
     
-    text = re.sub(r'(?m)^[-*] ', '• ', text)  
-    text = re.sub(r'(?m)^(•)(?!\s)', r'\1 ', text) 
-    text = re.sub(r'(?m)^(\d+)\.\s*\*?\*?\[Clinic (\d+)\]\*?\*?:?\s*', r'\1. **[Clinic \2]**: ', text)
-    text = re.sub(r'(?m)^(\d+)\.\s*\*?\*?\[Article (\d+)\]\*?\*?:?\s*', r'\1. **[Article \2]**: ', text)
-    
-    # Ensure clinic bullet points are properly indented
-    text = re.sub(r'(?m)^((\d+)\. \*\*\[Clinic \d+\]\*\*:.+\n)(?=•)', r'\1   ', text)
-    text = re.sub(r'(?m)^([A-Z][A-Za-z\s]+):\s*$', r'**\1:**', text)
-    text = re.sub(r'(?m)(•\s.+)\n(?=\d+\.\s+\*\*\[Clinic)', r'\1\n\n', text)
-    
-    clinic_pattern = r'(?:\*\*\[Clinic (\d+)\]\*\*|\[Clinic (\d+)\])'
-    clinic_refs = re.findall(clinic_pattern, text)
-    clinic_references = [int(c[0] or c[1]) for c in clinic_refs if c[0] or c[1]]
-    article_pattern = r'(?:\*\*\[Article (\d+)\]\*\*|\[Article (\d+)\])'
-    article_refs = re.findall(article_pattern, text)
-    article_references = [int(a[0] or a[1]) for a in article_refs if a[0] or a[1]]
-    
-    section_pattern = r'\*\*([^:*]+):\*\*'
-    sections = re.findall(section_pattern, text)
-    
-    clinic_entries = []
-    clinic_entry_pattern = r'(\d+)\.\s+\*\*\[Clinic (\d+)\]\*\*:\s+(.+?)(?=\n\n\d+\.\s+\*\*\[Clinic|\n\n\*\*|\Z)'
-    clinic_matches = re.findall(clinic_entry_pattern, text, re.DOTALL)
-    
-    for match in clinic_matches:
-        number, clinic_id, content = match
-        bullet_items = re.findall(r'•\s+([^•]+?)(?=\n\s*•|\Z)', content, re.DOTALL)
-        bullet_items = [item.strip() for item in bullet_items]
-        
-        clinic_entries.append({
-            "number": int(number),
-            "clinic_id": int(clinic_id),
-            "name": content.split('\n')[0].strip(),
-            "details": bullet_items
-        })
+    return parse_response(text)
+
+def parse_chat_request(request: Union[Dict[str, Any], ChatRequest]) -> Tuple[str, List[Dict[str, str]]]:
+    """Extract the query and a normalised chat history from a chat request body."""
+    if isinstance(request, dict):
+        query = request.get("query", "")
+        chat_history_raw = request.get("chat_history", [])
+    else:
+        query = request.query
+        chat_history_raw = request.chat_history
     
-    structured_data = {
-        "formatted_text": text,
-        "metadata": {
-            "clinic_references": clinic_references,
-            "article_references": article_references,
-            "sections": sections,
-            "clinic_entries": clinic_entries
-        }
+    chat_history = [
+        {"role": msg.get("role", "user") if isinstance(msg, dict) else msg.role, 
+         "content": msg.get("content", "") if isinstance(msg, dict) else msg.content}
+        for msg in chat_history_raw
+    ]
+    return query, chat_history
+
+def chat_result(
+    response: str,
+    articles: List[Dict[str, Any]],
+    clinics: List[Dict[str, Any]],
+    context: RequestContext
+) -> Dict[str, Any]:
+    """The response body of one chat request, with the answer formatted."""
+    if not isinstance(response, str):
+        logger.warning(f"Response from RAG is not a string: {type(response)}. Converting to string.")
+        response = str(response)
+    started = time.perf_counter()
+    enhanced_response = enhance_response_formatting(response)
+    context.timings["formatting"] = time.perf_counter() - started
+    return {
+        "response": enhanced_response["formatted_text"],
+        "formatted_data": enhanced_response["metadata"],
+        "articles": articles,
+        "clinics": clinics,
+        "usage": context.usage
     }
-    
-    return structured_data
+
+def format_sse(event: str, data: Dict[str, Any]) -> str:
+    """Encode one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
 @router.post("/chat")
 async def chat(request: Union[Dict[str, Any], ChatRequest]):
+    context = None
     try:
-        if isinstance(request, dict):
-            query = request.get("query", "")
-            chat_history_raw = request.get("chat_history", [])
-        else:
-            query = request.query
-            chat_history_raw = request.chat_history
-        
-        chat_history = [
-            {"role": msg.get("role", "user") if isinstance(msg, dict) else msg.role, 
-             "content": msg.get("content", "") if isinstance(msg, dict) else msg.content}
-            for msg in chat_history_raw
-        ]
+        query, chat_history = parse_chat_request(request)
+        context = RequestContext(query=query)
         
         response, articles, clinics = await RAG.process_query(
             query=query,
-            chat_history=chat_history
+            chat_history=chat_history,
+            context=context
         )
-        if not isinstance(response, str):
-            logger.warning(f"Response from RAG is not a string: {type(response)}. Converting to string.")
-            response = str(response)
-        enhanced_response = enhance_response_formatting(response)
-        return {
-            "response": enhanced_response["formatted_text"],
-            "formatted_data": enhanced_response["metadata"],
-            "articles": articles,
-            "clinics": clinics
-        }
+        return chat_result(response, articles, clinics, context)
         
+    except asyncio.CancelledError:
+        context.outcome = "cancelled"
+        raise
+    except LLMOverloadedError as e:
+        # Shed load quickly rather than queue behind a slow model
+        context.outcome = "shed"
+        return JSONResponse(
+            {"detail": str(e), "response": OVERLOADED_RESPONSE},
+            status_code=503,
+            headers={"Retry-After": str(max(1, round(e.retry_after)))}
+        )
     except Exception as e:
         logger.error(f"Error in chat endpoint: {str(e)}")
+        if context is not None:
+            context.outcome = "error"
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if context is not None:
+            context.record_metrics("chat")
+
+@router.post("/chat/stream")
+async def chat_stream(request: Union[Dict[str, Any], ChatRequest]):
+    """
+    Streaming chat over Server-Sent Events. Emits ``resources`` (articles and
+    clinics) as soon as retrieval finishes, ``token`` events as the answer is
+    generated, and a final ``done`` event carrying the fully formatted
+    response and ``formatted_data`` metadata.
+    """
+    query, chat_history = parse_chat_request(request)
+    context = RequestContext(query=query)
+
+    async def event_stream():
+        try:
+            async for event, data in RAG.stream_query(query=query, chat_history=chat_history, context=context):
+                if event in ("done", "error"):
+                    started = time.perf_counter()
+                    enhanced_response = enhance_response_formatting(data["response"])
+                    context.timings["formatting"] = time.perf_counter() - started
+                    data = {
+                        **data,
+                        "response": enhanced_response["formatted_text"],
+                        "formatted_data": enhanced_response["metadata"]
+                    }
+                yield format_sse(event, data)
+        except (asyncio.CancelledError, GeneratorExit):
+            # The client went away mid-stream
+            context.outcome = "cancelled"
+            raise
+        finally:
+            context.record_metrics("chat_stream")
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/chat/batch")
+async def chat_batch(request: Union[Dict[str, Any], BatchChatRequest]):
+    """
+    Answer many chat requests in one call. The queries are embedded together
+    and retrieval is shared across the batch; generations run with bounded
+    parallelism. Returns ``{"results": [...]}`` in request order or, with
+    ``"stream": true``, NDJSON with one result per line in completion order,
+    each carrying its ``index``.
+    """
+    if isinstance(request, dict):
+        raw_requests = request.get("requests", [])
+        stream = bool(request.get("stream", False))
+    else:
+        raw_requests = request.requests
+        stream = request.stream
+    if not isinstance(raw_requests, list):
+        raise HTTPException(status_code=422, detail="requests must be a list of chat requests")
+    if len(raw_requests) > settings.BATCH_MAX_QUERIES:
+        raise HTTPException(
+            status_code=413, detail=f"A batch holds at most {settings.BATCH_MAX_QUERIES} requests"
+        )
+    try:
+        requests = [parse_chat_request(raw_request) for raw_request in raw_requests]
+    except (AttributeError, TypeError) as e:
+        raise HTTPException(status_code=422, detail=f"Invalid chat request in batch: {str(e)}")
+    contexts = [RequestContext(query=query) for query, _ in requests]
+
+    async def results():
+        recorded = set()
+        try:
+            async for index, response, articles, clinics in BatchRAG.process(requests, contexts):
+                result = {"index": index, **chat_result(response, articles, clinics, contexts[index])}
+                contexts[index].record_metrics("chat_batch")
+                recorded.add(index)
+                yield result
+        finally:
+            # Requests left unanswered when the client went away or the batch failed
+            for index, context in enumerate(contexts):
+                if index not in recorded:
+                    context.outcome = "cancelled"
+                    context.record_metrics("chat_batch")
+
+    if stream:
+        async def ndjson():
+            async for result in results():
+                yield json.dumps(result) + "\n"
+
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+    ordered: List[Dict[str, Any]] = [{} for _ in contexts]
+    async for result in results():
+        ordered[result.pop("index")] = result
+    return {"results": ordered}
 
 @router.get("/health")
 async def health_check():
     return {"status": "ok"}
+
+@router.get("/ready")
+async def readiness_check():
+    """503 until the warm-up has finished, then 200; both with the startup time breakdown."""
+    return JSONResponse(warmup.report(), status_code=200 if warmup.ready else 503)
+
+@router.get("/metrics")
+async def metrics_endpoint():
+    """Request, stage, token, fallback and cache metrics in the Prometheus text format."""
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
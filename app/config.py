@@ -19,11 +19,142 @@ class Settings:
         # Vector settings
         self.EMBEDDING_DIM = 1536
         self.SIMILARITY_THRESHOLD = 0.75
-        
+
+        # Embedding cache
+        self.EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+        self.EMBEDDING_CACHE_MEMORY_SIZE = int(os.getenv("EMBEDDING_CACHE_MEMORY_SIZE", "4096"))
+        self.EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", ".cache/embeddings.sqlite3")
+        self.EMBEDDING_CACHE_MAX_DISK_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_DISK_ENTRIES", "200000"))
+
+        # Embedding batching (provider limits: 2048 inputs per request, ~8k tokens per input)
+        self.EMBEDDING_BATCH_MAX_INPUTS = int(os.getenv("EMBEDDING_BATCH_MAX_INPUTS", "512"))
+        self.EMBEDDING_BATCH_MAX_TOKENS = int(os.getenv("EMBEDDING_BATCH_MAX_TOKENS", "100000"))
+        self.EMBEDDING_MAX_CONCURRENT_REQUESTS = int(os.getenv("EMBEDDING_MAX_CONCURRENT_REQUESTS", "4"))
+
+        # Embedding dispatcher: single-text requests from concurrent requests are
+        # collected for up to WINDOW seconds (or MAX_BATCH texts) and sent as one
+        # multi-input request; callers wait once MAX_QUEUE texts are outstanding
+        self.EMBEDDING_DISPATCH_ENABLED = os.getenv("EMBEDDING_DISPATCH_ENABLED", "true").lower() == "true"
+        self.EMBEDDING_DISPATCH_WINDOW_SECONDS = float(os.getenv("EMBEDDING_DISPATCH_WINDOW_SECONDS", "0.005"))
+        self.EMBEDDING_DISPATCH_MAX_BATCH = int(os.getenv("EMBEDDING_DISPATCH_MAX_BATCH", "64"))
+        self.EMBEDDING_DISPATCH_MAX_QUEUE = int(os.getenv("EMBEDDING_DISPATCH_MAX_QUEUE", "1024"))
+
+        # Ingestion (python -m app.ingest): chunk size, rows per embed/upsert batch,
+        # concurrent batches, and the file recording what has been written
+        self.INGEST_CHUNK_MAX_TOKENS = int(os.getenv("INGEST_CHUNK_MAX_TOKENS", "400"))
+        self.INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "256"))
+        self.INGEST_MAX_CONCURRENT_WRITES = int(os.getenv("INGEST_MAX_CONCURRENT_WRITES", "4"))
+        self.INGEST_STATE_PATH = os.getenv("INGEST_STATE_PATH", ".cache/ingest.sqlite3")
+
+        # HTTP transport: pooled keep-alive connections for OpenAI and Supabase
+        # (HTTP/2 for Supabase when the h2 package is installed). Timeouts are
+        # per operation; the connect timeout applies to all of them.
+        self.HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "64"))
+        self.HTTP_KEEPALIVE_SECONDS = float(os.getenv("HTTP_KEEPALIVE_SECONDS", "30"))
+        self.HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() == "true"
+        self.HTTP_CONNECT_TIMEOUT_SECONDS = float(os.getenv("HTTP_CONNECT_TIMEOUT_SECONDS", "5"))
+        self.OPENAI_CHAT_TIMEOUT_SECONDS = float(os.getenv("OPENAI_CHAT_TIMEOUT_SECONDS", "60"))
+        self.OPENAI_EMBEDDING_TIMEOUT_SECONDS = float(os.getenv("OPENAI_EMBEDDING_TIMEOUT_SECONDS", "20"))
+        self.SUPABASE_QUERY_TIMEOUT_SECONDS = float(os.getenv("SUPABASE_QUERY_TIMEOUT_SECONDS", "10"))
+        self.SUPABASE_BULK_TIMEOUT_SECONDS = float(os.getenv("SUPABASE_BULK_TIMEOUT_SECONDS", "120"))
+
+        # Startup: the warm-up (pools, indexes, caches, tokenizer) must finish
+        # within WARMUP_TIMEOUT_SECONDS per step before /api/ready turns ready;
+        # import plus warm-up time over the budget is logged as a warning
+        self.WARMUP_TIMEOUT_SECONDS = float(os.getenv("WARMUP_TIMEOUT_SECONDS", "60"))
+        # Seconds between retries of a failed critical warm-up step (connections,
+        # reference data, article index); the app is not ready until they succeed
+        self.WARMUP_RETRY_SECONDS = float(os.getenv("WARMUP_RETRY_SECONDS", "5"))
+        self.STARTUP_BUDGET_SECONDS = float(os.getenv("STARTUP_BUDGET_SECONDS", "30"))
+
+        # Blocking I/O (Supabase client) is offloaded to a bounded thread pool
+        self.IO_THREADPOOL_SIZE = int(os.getenv("IO_THREADPOOL_SIZE", "32"))
+
+        # Local vector index (used when the pgvector RPCs are unavailable)
+        self.VECTOR_INDEX_REFRESH_SECONDS = float(os.getenv("VECTOR_INDEX_REFRESH_SECONDS", "300"))
+        # Stored quantized ("int8" or "float16") and memory-mapped so workers share one
+        # copy; an empty path keeps a float32 copy in each worker instead. With
+        # rescoring, the best RESCORE_FACTOR * top_k candidates are rescored in float32.
+        self.VECTOR_INDEX_PATH = os.getenv("VECTOR_INDEX_PATH", ".cache/article_index")
+        self.VECTOR_INDEX_DTYPE = os.getenv("VECTOR_INDEX_DTYPE", "int8")
+        self.VECTOR_INDEX_RESCORE = os.getenv("VECTOR_INDEX_RESCORE", "true").lower() == "true"
+        self.VECTOR_INDEX_RESCORE_FACTOR = int(os.getenv("VECTOR_INDEX_RESCORE_FACTOR", "4"))
+
+        # Reference-data snapshot (clinics, specialties, insurance, article metadata)
+        self.REFERENCE_DATA_TTL_SECONDS = float(os.getenv("REFERENCE_DATA_TTL_SECONDS", "900"))
+        self.REFERENCE_DATA_REFRESH_SECONDS = float(os.getenv("REFERENCE_DATA_REFRESH_SECONDS", "300"))
+
         # RAG settings
         self.MAX_ARTICLE_RESULTS = 3
         self.MAX_CLINIC_RESULTS = 3
+
+        # Lexical (BM25) retrieval over article sections and clinics, fused with the
+        # vector results by reciprocal-rank fusion
+        self.LEXICAL_SEARCH_ENABLED = os.getenv("LEXICAL_SEARCH_ENABLED", "true").lower() == "true"
+        self.BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+        self.BM25_B = float(os.getenv("BM25_B", "0.75"))
+        self.RRF_K = int(os.getenv("RRF_K", "60"))
+
+        # Context packing: retrieval over-fetches candidate sections, which are
+        # merged per article, diversified (MMR) and packed into a token budget,
+        # no larger than the context of the top three rows cut at 500 characters
+        self.CONTEXT_CANDIDATES = int(os.getenv("CONTEXT_CANDIDATES", "12"))
+        self.CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "450"))
+        self.CONTEXT_SECTION_MAX_TOKENS = int(os.getenv("CONTEXT_SECTION_MAX_TOKENS", "250"))
+        self.CONTEXT_MMR_LAMBDA = float(os.getenv("CONTEXT_MMR_LAMBDA", "0.7"))
+
+        # Chat history: the most recent turns are sent verbatim within a token
+        # budget; older turns are folded into a rolling summary. Once the budget
+        # is exceeded the window shrinks to the low-watermark fraction of it, so
+        # the summary is only recomputed every few turns.
+        self.HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "1500"))
+        self.HISTORY_LOW_WATERMARK = float(os.getenv("HISTORY_LOW_WATERMARK", "0.5"))
+        self.HISTORY_SUMMARY_MODEL = os.getenv("HISTORY_SUMMARY_MODEL", "gpt-3.5-turbo")
+        self.HISTORY_SUMMARY_MAX_TOKENS = int(os.getenv("HISTORY_SUMMARY_MAX_TOKENS", "300"))
+        self.HISTORY_SUMMARY_TIMEOUT_SECONDS = float(os.getenv("HISTORY_SUMMARY_TIMEOUT_SECONDS", "6"))
+        self.HISTORY_SUMMARY_CACHE_SIZE = int(os.getenv("HISTORY_SUMMARY_CACHE_SIZE", "1024"))
+
+        # Semantic answer cache for first-turn queries
+        self.ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+        self.ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1024"))
+        self.ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+        self.ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+
+        # Identical in-flight /api/chat requests (same normalised query and
+        # history) share one pipeline run instead of each calling the model
+        self.SINGLEFLIGHT_ENABLED = os.getenv("SINGLEFLIGHT_ENABLED", "true").lower() == "true"
+
+        # Stage scheduling: per-stage timeouts (seconds) after which a stage degrades
+        self.ANALYSIS_TIMEOUT_SECONDS = float(os.getenv("ANALYSIS_TIMEOUT_SECONDS", "8"))
+        self.RETRIEVAL_TIMEOUT_SECONDS = float(os.getenv("RETRIEVAL_TIMEOUT_SECONDS", "10"))
+        # Query analysis: "hybrid" (local fast path, LLM when unsure), "local" or "llm"
+        self.ANALYZER_MODE = os.getenv("ANALYZER_MODE", "hybrid").lower()
+        # Minimum nearest-centroid margin for the local tier to answer on its own
+        self.ANALYZER_MIN_MARGIN = float(os.getenv("ANALYZER_MIN_MARGIN", "0.04"))
+        # Seconds to wait before embedding the prototype phrases again after a failure
+        self.ANALYZER_CENTROID_RETRY_SECONDS = float(os.getenv("ANALYZER_CENTROID_RETRY_SECONDS", "30"))
+        # Fraction of locally answered queries also sent to the LLM to measure agreement
+        self.ANALYZER_SHADOW_RATE = float(os.getenv("ANALYZER_SHADOW_RATE", "0.0"))
+        # When true a clinic keyword in the query always triggers clinic search;
+        # when false the query analysis can veto the speculative clinic search.
+        self.CLINIC_KEYWORDS_AUTHORITATIVE = os.getenv("CLINIC_KEYWORDS_AUTHORITATIVE", "true").lower() == "true"
         
+        # Answer completions: at most MAX_CONCURRENT run at once; the rest wait
+        # in a queue ordered by the query's risk level (high first). A request
+        # that cannot start within QUEUE_DEADLINE seconds, or finds MAX_QUEUE
+        # requests already waiting, is answered with a 503
+        self.LLM_MAX_CONCURRENT_COMPLETIONS = int(os.getenv("LLM_MAX_CONCURRENT_COMPLETIONS", "32"))
+        self.LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "256"))
+        self.LLM_QUEUE_DEADLINE_SECONDS = float(os.getenv("LLM_QUEUE_DEADLINE_SECONDS", "10"))
+
+        # Batch chat (/api/chat/batch): queries per request, generations (and LLM
+        # query analyses) in flight per batch, and whether retrieval scores the
+        # whole batch against the local article and clinic indexes (one
+        # matrix-matrix product) instead of one pgvector RPC per query
+        self.BATCH_MAX_QUERIES = int(os.getenv("BATCH_MAX_QUERIES", "256"))
+        self.BATCH_MAX_CONCURRENT_GENERATIONS = int(os.getenv("BATCH_MAX_CONCURRENT_GENERATIONS", "8"))
+        self.BATCH_LOCAL_SCORING = os.getenv("BATCH_LOCAL_SCORING", "true").lower() == "true"
+
         # Disclaimers
         self.MEDICAL_DISCLAIMER = ("I'm an AI assistant designed to provide information and support, "
                                  "not to replace professional medical advice. Please consult with a "
@@ -0,0 +1,112 @@
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+import time
+
+import numpy as np
+
+from app.config import settings
+from app.utils.metrics import metrics
+
+
+@dataclass
+class CachedAnswer:
+    query: str
+    response: str
+    articles: List[Dict[str, Any]]
+    clinics: List[Dict[str, Any]]
+
+
+class SemanticAnswerCache:
+    """
+    Response cache keyed on query embeddings. Embeddings live in a
+    preallocated, L2-normalised float32 matrix so a lookup is one
+    matrix-vector product over every slot; the nearest live entry is served
+    when its cosine similarity reaches the threshold. Entries expire after a
+    TTL and, when the cache is full, the least recently used slot is reused.
+    """
+
+    def __init__(self, capacity: int, threshold: float, ttl: float, dim: int):
+        self.capacity = capacity
+        self.threshold = threshold
+        self.ttl = ttl
+        self.matrix = np.zeros((capacity, dim), dtype=np.float32)
+        self.expires_at = np.zeros(capacity, dtype=np.float64)
+        self.last_used = np.zeros(capacity, dtype=np.float64)
+        self.entries: List[Optional[CachedAnswer]] = [None] * capacity
+
+        self.hits = 0
+        self.misses = 0
+        self.bypasses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _normalize(embedding) -> Optional[np.ndarray]:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    def lookup(self, query_embedding) -> Optional[Tuple[CachedAnswer, float]]:
+        """Nearest live entry and its similarity, or None if nothing is close enough."""
+        vector = self._normalize(query_embedding)
+        now = time.time()
+        live = self.expires_at > now
+        if vector is None or not live.any():
+            self.misses += 1
+            return None
+
+        scores = self.matrix @ vector
+        scores[~live] = -np.inf
+        slot = int(np.argmax(scores))
+        if scores[slot] < self.threshold:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.last_used[slot] = now
+        return self.entries[slot], float(scores[slot])
+
+    def store(self, query_embedding, answer: CachedAnswer) -> None:
+        vector = self._normalize(query_embedding)
+        if vector is None:
+            return
+        now = time.time()
+        free = np.flatnonzero(self.expires_at <= now)
+        if len(free):
+            slot = int(free[0])
+        else:
+            slot = int(np.argmin(self.last_used))
+            self.evictions += 1
+        self.matrix[slot] = vector
+        self.entries[slot] = answer
+        self.expires_at[slot] = now + self.ttl
+        self.last_used[slot] = now
+        self.stores += 1
+
+    def record_bypass(self) -> None:
+        self.bypasses += 1
+
+    def clear(self) -> None:
+        self.expires_at[:] = 0
+        self.entries = [None] * self.capacity
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypasses": self.bypasses,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "entries": int((self.expires_at > time.time()).sum()),
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+answer_cache = SemanticAnswerCache(
+    capacity=settings.ANSWER_CACHE_SIZE,
+    threshold=settings.ANSWER_CACHE_THRESHOLD,
+    ttl=settings.ANSWER_CACHE_TTL_SECONDS,
+    dim=settings.EMBEDDING_DIM
+)
+metrics.register_stats("rag_answer_cache", "Semantic answer cache lookups, stores and entries.", answer_cache.stats)
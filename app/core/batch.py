@@ -0,0 +1,185 @@
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+import asyncio
+import logging
+import time
+
+from app.core.context import RequestContext
+from app.core.rag import RAG, ERROR_RESPONSE, OVERLOADED_RESPONSE
+from app.core.llm_scheduler import completion_scheduler, LLMOverloadedError
+from app.core.llm import LLM, DEFAULT_QUERY_ANALYSIS
+from app.core.vector_store import VectorStore
+from app.core.query_analyzer import query_analyzer
+from app.core.history import history_manager
+from app.core.packing import context_packer
+from app.core.answer_cache import CachedAnswer
+from app.utils.embeddings import aget_embeddings
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# (index in the batch, response, articles, clinics)
+BatchResult = Tuple[int, str, List[Dict[str, Any]], List[Dict[str, Any]]]
+
+
+@dataclass
+class BatchItem:
+    index: int
+    query: str
+    chat_history: List[Dict[str, str]]
+    context: RequestContext
+    analysis: Optional[Dict[str, Any]] = None
+    articles: List[Dict[str, Any]] = field(default_factory=list)
+    clinics: List[Dict[str, Any]] = field(default_factory=list)
+
+
+class BatchRAG:
+    """
+    The RAG pipeline for many queries at once. Work that does not depend on
+    a single query is shared: the queries are embedded in as few requests as
+    the batching allows, retrieval scores the whole batch together (or
+    hydrates the union of the RPC hits once), and only analysis escalations,
+    history summaries and generations run per query, with bounded
+    parallelism.
+    """
+
+    @staticmethod
+    async def embed(items: List[BatchItem]) -> None:
+        started = time.perf_counter()
+        vectors = await aget_embeddings([item.query for item in items])
+        elapsed = time.perf_counter() - started
+        for item, vector in zip(items, vectors):
+            item.context.query_embedding = vector
+            item.context.timings["embedding"] = elapsed
+
+    @staticmethod
+    async def analyze(item: BatchItem, semaphore: asyncio.Semaphore) -> None:
+        """Analyse one query; a failed or timed-out analysis leaves ``item.analysis`` None."""
+        started = time.perf_counter()
+        try:
+            async with semaphore:
+                item.analysis = await asyncio.wait_for(
+                    query_analyzer.analyze(item.query, item.context), settings.ANALYSIS_TIMEOUT_SECONDS
+                )
+        except Exception as e:
+            logger.warning(f"Query analysis failed for batch item {item.index}: {str(e) or type(e).__name__}")
+        finally:
+            item.context.timings["analysis"] = time.perf_counter() - started
+
+    @staticmethod
+    async def retrieve(items: List[BatchItem], semaphore: asyncio.Semaphore) -> None:
+        """
+        Analyse every query while the articles are searched for the whole
+        batch, then search clinics for the queries that need them, and pack
+        each query's context.
+        """
+        started = time.perf_counter()
+        analyses = asyncio.gather(*(BatchRAG.analyze(item, semaphore) for item in items))
+        articles = VectorStore.search_articles_batch(
+            [item.query for item in items],
+            [item.context.query_embedding for item in items],
+            top_k=settings.CONTEXT_CANDIDATES
+        )
+        _, articles = await asyncio.gather(analyses, articles)
+        articles_elapsed = time.perf_counter() - started
+
+        clinic_items = [
+            item for item in items
+            if RAG.needs_clinics(RAG.matches_clinic_keywords(item.query), item.analysis)
+        ]
+        clinics_started = time.perf_counter()
+        clinics = await VectorStore.search_clinics_batch(
+            [item.query for item in clinic_items],
+            [item.context.query_embedding for item in clinic_items]
+        )
+        clinics_elapsed = time.perf_counter() - clinics_started
+        clinics_by_index = {item.index: rows for item, rows in zip(clinic_items, clinics)}
+
+        elapsed = time.perf_counter() - started
+        for item, rows in zip(items, articles):
+            if item.analysis is None:
+                item.analysis = dict(DEFAULT_QUERY_ANALYSIS)
+            item.articles, item.clinics = context_packer.pack(rows, clinics_by_index.get(item.index, []), item.context)
+            item.context.timings["articles"] = articles_elapsed
+            if item.index in clinics_by_index:
+                item.context.timings["clinics"] = clinics_elapsed
+            item.context.timings["retrieval"] = elapsed
+        logger.info(
+            f"Batch retrieval for {len(items)} queries ({len(clinic_items)} with clinics) in {elapsed:.2f}s"
+        )
+
+    @staticmethod
+    async def generate(item: BatchItem, semaphore: asyncio.Semaphore) -> BatchResult:
+        context = item.context
+        try:
+            async with semaphore:
+                history = await history_manager.prepare(item.chat_history, context)
+                async with completion_scheduler.slot(RAG.risk_level(item.query, item.analysis), context):
+                    started = time.perf_counter()
+                    response = await LLM.generate_response(
+                        query=item.query,
+                        articles=item.articles,
+                        clinics=item.clinics,
+                        chat_history=history.messages,
+                        history_summary=history.summary,
+                        context=context
+                    )
+                    context.timings["generation"] = time.perf_counter() - started
+            RAG.remember_answer(
+                item.query, item.chat_history, context, item.analysis,
+                CachedAnswer(query=item.query, response=response, articles=item.articles, clinics=item.clinics)
+            )
+            return item.index, response, item.articles, item.clinics
+        except LLMOverloadedError:
+            context.outcome = "shed"
+            return item.index, OVERLOADED_RESPONSE, item.articles, item.clinics
+        except Exception as e:
+            logger.error(f"Error in batch item {item.index}: {str(e)}")
+            context.outcome = "error"
+            return item.index, ERROR_RESPONSE, [], []
+
+    @staticmethod
+    async def process(
+        requests: List[Tuple[str, List[Dict[str, str]]]],
+        contexts: List[RequestContext]
+    ) -> AsyncIterator[BatchResult]:
+        """
+        Answer ``(query, chat_history)`` requests, yielding
+        ``(index, response, articles, clinics)`` for each as soon as it is
+        ready: answer-cache hits first, then generations in completion order.
+        A failing query gets the error response without failing the batch.
+        """
+        items = [
+            BatchItem(index=i, query=query, chat_history=chat_history, context=context)
+            for i, ((query, chat_history), context) in enumerate(zip(requests, contexts))
+        ]
+        if not items:
+            return
+        semaphore = asyncio.Semaphore(settings.BATCH_MAX_CONCURRENT_GENERATIONS)
+        try:
+            await BatchRAG.embed(items)
+            pending = []
+            for item in items:
+                cached = await RAG.lookup_cached_answer(item.query, item.chat_history, item.context)
+                if cached is None:
+                    pending.append(item)
+                    continue
+                item.context.outcome = "cached"
+                yield item.index, cached.response, cached.articles, cached.clinics
+            if pending:
+                await BatchRAG.retrieve(pending, semaphore)
+        except Exception as e:
+            logger.error(f"Error in batch retrieval: {str(e)}")
+            for item in items:
+                if item.context.outcome != "cached":
+                    item.context.outcome = "error"
+                    yield item.index, ERROR_RESPONSE, [], []
+            return
+
+        tasks = [asyncio.create_task(BatchRAG.generate(item, semaphore)) for item in pending]
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                yield await next_result
+        finally:
+            for task in tasks:
+                task.cancel()
@@ -0,0 +1,43 @@
+from dataclasses import dataclass, field
+from typing import List, Dict, Optional
+import asyncio
+import time
+
+from app.utils.embeddings import aget_embedding
+from app.utils.metrics import request_seconds, requests_total, stage_seconds, tokens_total
+
+
+@dataclass
+class RequestContext:
+    """
+    Per-request state shared by every retrieval stage, so the query is
+    embedded once and stage timings (in seconds) and token usage are
+    collected in one place. ``outcome`` is "ok", "cached", "coalesced",
+    "shed", "error" or "cancelled" once the request has finished.
+    """
+    query: str
+    query_embedding: Optional[List[float]] = None
+    timings: Dict[str, float] = field(default_factory=dict)
+    usage: Dict[str, int] = field(default_factory=dict)
+    outcome: str = "ok"
+    started: float = field(default_factory=time.perf_counter, repr=False)
+    _embedding_lock: asyncio.Lock = field(default_factory=asyncio.Lock, repr=False)
+
+    async def embed_query(self) -> List[float]:
+        """Embed the query on first use and reuse the vector afterwards, even across concurrent stages."""
+        async with self._embedding_lock:
+            if self.query_embedding is None:
+                started = time.perf_counter()
+                self.query_embedding = await aget_embedding(self.query)
+                self.timings["embedding"] = time.perf_counter() - started
+        return self.query_embedding
+
+    def record_metrics(self, endpoint: str) -> None:
+        """Add this request's stage timings, token usage, latency and outcome to the metrics."""
+        for stage, seconds in self.timings.items():
+            stage_seconds.observe(seconds, stage=stage)
+        for kind, tokens in self.usage.items():
+            if kind.endswith("_tokens") and tokens:
+                tokens_total.inc(tokens, kind=kind[:-len("_tokens")])
+        request_seconds.observe(time.perf_counter() - self.started, endpoint=endpoint)
+        requests_total.inc(endpoint=endpoint, outcome=self.outcome)
@@ -0,0 +1,269 @@
+"""
+Single-pass, line-oriented response formatter.
+
+Produces the same output as the original chain of ``re.sub`` passes in
+LLM.format_response and routes.enhance_response_formatting, plus the
+structured metadata, in one pass over the lines of the text. Because it only
+ever looks one or two lines back (and holds a line while a bare clinic or
+article header waits for its content), it also works incrementally on a
+token stream: ``feed`` returns text as soon as it can no longer change.
+
+Three cross-line artefacts of the old regexes are deliberately not
+reproduced, since they corrupt the text rather than format it:
+
+* a heading like ``Tips:`` no longer swallows preceding lines made only of
+  letters and spaces (``Some Title\\nTips:`` used to become one bold run);
+* a list number on its own line (``1.\\n[Clinic 1]``) is not joined onto the
+  following clinic or article reference;
+* section names are only extracted from single-line ``**Name:**`` runs.
+"""
+from typing import Any, Dict, List, Optional
+import re
+
+# Line rewrites, applied in the order of the original substitutions
+_CLINIC_REF_HEADER = re.compile(r'(\d+)\.\s*\*?\*?\[Clinic (\d+)\]\*?\*?:?\s*')
+_ARTICLE_REF_HEADER = re.compile(r'(\d+)\.\s*\*?\*?\[Article (\d+)\]\*?\*?:?\s*')
+_FORMATTED_CLINIC_HEADER = re.compile(r'\d+\. \*\*\[Clinic \d+\]\*\*:.')
+_PLAIN_HEADING = re.compile(r'([A-Z][A-Za-z\s]+):\s*')
+_CLINIC_START = re.compile(r'\d+\.\s+\*\*\[Clinic')
+_BULLET_WITH_TEXT = re.compile(r'•\s.')
+_BOLD_HEADING = re.compile(r'\*\*[A-Z][a-zA-Z ]+:\*\*')
+
+# Metadata extraction
+_CLINIC_REFERENCE = re.compile(r'(?:\*\*\[Clinic (\d+)\]\*\*|\[Clinic (\d+)\])')
+_ARTICLE_REFERENCE = re.compile(r'(?:\*\*\[Article (\d+)\]\*\*|\[Article (\d+)\])')
+_SECTION = re.compile(r'\*\*([^:*]+):\*\*')
+_CLINIC_ENTRY = re.compile(r'(\d+)\.\s+\*\*\[Clinic (\d+)\]\*\*:(?=\s|$)')
+_CLINIC_ENTRY_END = re.compile(r'\d+\.\s+\*\*\[Clinic|\*\*')
+_CLINIC_ENTRY_BULLET = re.compile(r'•\s+([^•]+?)(?=\n\s*•|\Z)', re.DOTALL)
+
+
+def _is_blank(line: str) -> bool:
+    return not line or line.isspace()
+
+
+class _ReferenceJoiner:
+    """
+    Normalises numbered ``[Clinic N]`` / ``[Article N]`` references. A
+    reference with nothing after it is joined with the next non-blank line,
+    as the trailing ``\\s*`` of the original pattern did.
+    """
+
+    def __init__(self, pattern: re.Pattern, kind: str, emit):
+        self.pattern = pattern
+        self.kind = kind
+        self.emit = emit
+        self.pending: Optional[str] = None
+
+    def push(self, line: str, last: bool) -> None:
+        prefix = ""
+        if self.pending is not None:
+            if _is_blank(line):
+                if last:
+                    self.emit(self.pending, True)
+                    self.pending = None
+                return
+            prefix, self.pending = self.pending, None
+            if line[0].isspace():
+                self.emit(prefix + line.lstrip(), last)
+                return
+            # The joined line still starts a line of the original text, so it
+            # is normalised (and possibly joined) in turn
+
+        match = self.pattern.match(line) if line[:1].isdigit() else None
+        if match is None:
+            self.emit(prefix + line, last)
+            return
+        header = f"{prefix}{match.group(1)}. **[{self.kind} {match.group(2)}]**: "
+        if match.end() == len(line) and not last:
+            self.pending = header
+            return
+        self.emit(header + line[match.end():], last)
+
+
+class ResponseFormatter:
+    """
+    Formats a response and extracts its metadata in a single pass.
+
+    ``space_headings`` adds the blank line before bold section headings that
+    LLM.format_response inserts; enhance_response_formatting does not.
+    Use ``format_text``/``parse_response`` for complete strings, or ``feed``/``close``
+    for a stream of chunks.
+    """
+
+    def __init__(self, space_headings: bool = True):
+        self.space_headings = space_headings
+        self._buffer = ""
+        self._clinics = _ReferenceJoiner(_CLINIC_REF_HEADER, "Clinic", self._articles_push)
+        self._articles = _ReferenceJoiner(_ARTICLE_REF_HEADER, "Article", self._indent_push)
+
+        self._previous_line: Optional[str] = None      # indentation rule
+        self._after_heading = False                    # heading rule
+        self._spacing_lines: List[Optional[str]] = [None, None]  # clinic spacing rule
+        self._spaced_previous = False
+        self._heading_previous: Optional[str] = None   # heading spacing rule
+        self._heading_line_count = 0
+
+        self._output: List[str] = []
+        self._line_count = 0
+
+        self.clinic_references: List[int] = []
+        self.article_references: List[int] = []
+        self.sections: List[str] = []
+        self.clinic_entries: List[Dict[str, Any]] = []
+        self._entry: Optional[Dict[str, Any]] = None
+
+    # Formatting stages
+
+    def _push(self, line: str, last: bool) -> None:
+        # Dash/asterisk bullets become "•", and bullets get a space after them
+        if line.startswith(("- ", "* ")):
+            line = "• " + line[2:]
+        elif line.startswith("•") and (len(line) > 1 and not line[1].isspace() or len(line) == 1 and last):
+            line = "• " + line[1:]
+        self._clinics.push(line, last)
+
+    def _articles_push(self, line: str, last: bool) -> None:
+        self._articles.push(line, last)
+
+    def _indent_push(self, line: str, last: bool) -> None:
+        # The first bullet under a clinic header is indented under it
+        previous, self._previous_line = self._previous_line, line
+        if line.startswith("•") and previous and _FORMATTED_CLINIC_HEADER.match(previous):
+            line = "   " + line
+        self._heading_push(line)
+
+    def _heading_push(self, line: str) -> None:
+        # "Title:" lines become "**Title:**", dropping blank lines right after them
+        if self._after_heading:
+            if _is_blank(line):
+                return
+            self._after_heading = False
+        match = _PLAIN_HEADING.fullmatch(line) if "A" <= line[:1] <= "Z" and ":" in line else None
+        if match:
+            line = f"**{match.group(1)}:**"
+            self._after_heading = True
+        self._clinic_spacing_push(line)
+
+    def _clinic_spacing_push(self, line: str) -> None:
+        # A blank line separates a bullet from the clinic header after it
+        before_previous, previous = self._spacing_lines
+        spaced = False
+        if line[:1].isdigit() and previous is not None and _CLINIC_START.match(line):
+            if _BULLET_WITH_TEXT.search(previous):
+                spaced = True
+            elif before_previous is not None and before_previous.endswith("•") and previous \
+                    and not self._spaced_previous:
+                spaced = True
+        if spaced:
+            self._heading_spacing_push("")
+        self._spacing_lines = [previous, line]
+        self._spaced_previous = spaced
+        self._heading_spacing_push(line)
+
+    def _heading_spacing_push(self, line: str) -> None:
+        # A blank line separates a paragraph from the bold heading after it
+        if self.space_headings:
+            previous = self._heading_previous
+            if previous and line.startswith("**") and _BOLD_HEADING.match(line) and \
+                    (self._heading_line_count > 1 or any(c != "•" for c in previous[:-1])):
+                self._write("")
+            self._heading_previous = line
+            self._heading_line_count += 1
+        self._write(line)
+
+    def _write(self, line: str) -> None:
+        if self._line_count:
+            self._output.append("\n")
+        self._output.append(line)
+        self._line_count += 1
+        self._collect(line)
+
+    # Metadata
+
+    def _collect(self, line: str) -> None:
+        if "[" in line:
+            self.clinic_references.extend(int(a or b) for a, b in _CLINIC_REFERENCE.findall(line) if a or b)
+            self.article_references.extend(int(a or b) for a, b in _ARTICLE_REFERENCE.findall(line) if a or b)
+        if "**" in line:
+            self.sections.extend(_SECTION.findall(line))
+
+        entry = self._entry
+        if entry is not None:
+            lines = entry["lines"]
+            if not lines:
+                if not _is_blank(line):
+                    lines.append(line.lstrip())
+                return
+            # An entry ends at a blank line followed by another clinic or a bold line
+            if lines[-1] == "" and len(lines) > 1 and _CLINIC_ENTRY_END.match(line):
+                lines.pop()
+                self._finish_entry()
+            else:
+                lines.append(line)
+                return
+
+        match = _CLINIC_ENTRY.search(line) if "**[Clinic " in line else None
+        if match:
+            content = line[match.end():].lstrip()
+            self._entry = {
+                "number": int(match.group(1)),
+                "clinic_id": int(match.group(2)),
+                "lines": [content] if content else []
+            }
+
+    def _finish_entry(self) -> None:
+        entry, self._entry = self._entry, None
+        if not entry or not entry["lines"]:
+            return
+        content = "\n".join(entry["lines"])
+        self.clinic_entries.append({
+            "number": entry["number"],
+            "clinic_id": entry["clinic_id"],
+            "name": content.split('\n')[0].strip(),
+            "details": [item.strip() for item in _CLINIC_ENTRY_BULLET.findall(content)]
+        })
+
+    # Public API
+
+    def _drain(self) -> str:
+        text = "".join(self._output)
+        self._output.clear()
+        return text
+
+    def feed(self, chunk: str) -> str:
+        """Add streamed text; returns the formatted text that is now final."""
+        self._buffer += chunk
+        if "\n" in self._buffer:
+            *lines, self._buffer = self._buffer.split("\n")
+            for line in lines:
+                self._push(line, False)
+        return self._drain()
+
+    def close(self) -> str:
+        """Finish the stream, returning the remaining formatted text."""
+        line, self._buffer = self._buffer, ""
+        self._push(line, True)
+        self._finish_entry()
+        return self._drain()
+
+    def metadata(self) -> Dict[str, Any]:
+        return {
+            "clinic_references": self.clinic_references,
+            "article_references": self.article_references,
+            "sections": self.sections,
+            "clinic_entries": self.clinic_entries
+        }
+
+
+def format_text(text: str) -> str:
+    """Equivalent of the original LLM.format_response substitutions."""
+    formatter = ResponseFormatter(space_headings=True)
+    return formatter.feed(text) + formatter.close()
+
+
+def parse_response(text: str, space_headings: bool = False) -> Dict[str, Any]:
+    """Format ``text`` and extract its metadata, as enhance_response_formatting did."""
+    formatter = ResponseFormatter(space_headings=space_headings)
+    formatted = formatter.feed(text) + formatter.close()
+    return {"formatted_text": formatted, "metadata": formatter.metadata()}
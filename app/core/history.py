@@ -0,0 +1,162 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+import asyncio
+import hashlib
+import logging
+import time
+
+from app.core.context import RequestContext
+from app.core.llm import LLM
+from app.utils.tokens import MESSAGE_OVERHEAD_TOKENS, count_tokens
+from app.utils.metrics import metrics
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PreparedHistory:
+    """The part of a chat history that is sent with a request."""
+    messages: List[Dict[str, str]]
+    summary: Optional[str]
+    summarized: int
+    tokens: int
+
+
+def _message_tokens(message: Dict[str, str]) -> int:
+    return MESSAGE_OVERHEAD_TOKENS + count_tokens(message["content"])
+
+
+def _prefix_digest(messages: List[Dict[str, str]]) -> str:
+    """Identifies a conversation prefix; the summary cache is keyed on it."""
+    digest = hashlib.sha1()
+    for message in messages:
+        digest.update(message["role"].encode("utf-8") + b"\0" + message["content"].encode("utf-8") + b"\0")
+    return digest.hexdigest()
+
+
+class ChatHistoryManager:
+    """
+    Keeps the chat history sent with each completion within a token budget.
+    The most recent turns are sent verbatim; older turns are folded into a
+    rolling summary. When the window overflows it shrinks to the low
+    watermark, so the window start (and with it the summary) only moves every
+    few turns. The start is replayed from the history alone, so it is the
+    same on every request of a conversation and the summary for it is cached.
+    """
+
+    def __init__(self, budget: int, low_watermark: float, cache_size: int):
+        self.budget = budget
+        self.low_watermark = low_watermark
+        self.cache_size = cache_size
+        self.summaries: "OrderedDict[str, str]" = OrderedDict()
+        self._pending: Dict[str, asyncio.Task] = {}
+        self.stats: Dict[str, int] = {
+            "summary_hits": 0,
+            "summaries_computed": 0,
+            "summary_timeouts": 0,
+            "summary_errors": 0,
+        }
+
+    def window_starts(self, chat_history: List[Dict[str, str]]) -> List[int]:
+        """Every position the window has started at as the conversation grew, oldest first."""
+        starts = [0]
+        start = 0
+        total = 0
+        for i, message in enumerate(chat_history):
+            total += _message_tokens(message)
+            if total <= self.budget:
+                continue
+            target = self.budget * self.low_watermark
+            # Slide past whole turns: the window always opens on a user message
+            while start < i and (total > target or chat_history[start]["role"] != "user"):
+                total -= _message_tokens(chat_history[start])
+                start += 1
+            if start != starts[-1]:
+                starts.append(start)
+        return starts
+
+    def _remember(self, key: str, summary: str) -> None:
+        self.summaries[key] = summary
+        self.summaries.move_to_end(key)
+        while len(self.summaries) > self.cache_size:
+            self.summaries.popitem(last=False)
+
+    async def _compute(self, key: str, previous: Optional[str], messages: List[Dict[str, str]]) -> Optional[str]:
+        try:
+            summary = await LLM.summarize_conversation(previous, messages)
+        except Exception as e:
+            self.stats["summary_errors"] += 1
+            logger.error(f"History summarisation failed: {str(e)}")
+            return None
+        self.stats["summaries_computed"] += 1
+        self._remember(key, summary)
+        return summary
+
+    async def summary(self, chat_history: List[Dict[str, str]], starts: List[int]) -> Optional[str]:
+        """
+        Summary of ``chat_history[:starts[-1]]``. It is built from the latest
+        earlier window start whose summary is cached, in a single call; if it
+        takes longer than the timeout the request goes ahead without it and
+        the summary is cached for the next turn.
+        """
+        start = starts[-1]
+        key = _prefix_digest(chat_history[:start])
+        if key in self.summaries:
+            self.stats["summary_hits"] += 1
+            self.summaries.move_to_end(key)
+            return self.summaries[key]
+
+        task = self._pending.get(key)
+        if task is None:
+            base, previous = 0, None
+            for earlier in reversed(starts[1:-1]):
+                cached = self.summaries.get(_prefix_digest(chat_history[:earlier]))
+                if cached is not None:
+                    base, previous = earlier, cached
+                    break
+            task = asyncio.create_task(self._compute(key, previous, chat_history[base:start]))
+            self._pending[key] = task
+            task.add_done_callback(lambda _: self._pending.pop(key, None))
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), settings.HISTORY_SUMMARY_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            self.stats["summary_timeouts"] += 1
+            logger.warning("History summary not ready in time, sending recent turns only")
+            return None
+
+    async def prepare(
+        self,
+        chat_history: List[Dict[str, str]],
+        context: Optional[RequestContext] = None
+    ) -> PreparedHistory:
+        """The recent turns and the summary of older ones to send with a request."""
+        started = time.perf_counter()
+        summary = None
+        start = 0
+        if chat_history:
+            starts = self.window_starts(chat_history)
+            start = starts[-1]
+            if start:
+                summary = await self.summary(chat_history, starts)
+
+        messages = chat_history[start:]
+        tokens = sum(_message_tokens(message) for message in messages)
+        if summary:
+            tokens += MESSAGE_OVERHEAD_TOKENS + count_tokens(summary)
+        if context is not None:
+            context.timings["history"] = time.perf_counter() - started
+            context.usage["history_tokens"] = tokens
+            context.usage["summarized_messages"] = start
+        return PreparedHistory(messages=messages, summary=summary, summarized=start, tokens=tokens)
+
+
+history_manager = ChatHistoryManager(
+    budget=settings.HISTORY_TOKEN_BUDGET,
+    low_watermark=settings.HISTORY_LOW_WATERMARK,
+    cache_size=settings.HISTORY_SUMMARY_CACHE_SIZE
+)
+metrics.register_stats("rag_history_summaries", "Chat-history summary cache hits, computations and failures.",
+                       lambda: history_manager.stats)
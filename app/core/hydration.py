@@ -0,0 +1,111 @@
+from typing import List, Dict, Any, Iterable, Optional, Tuple
+import asyncio
+
+from app.utils.supabase import supabase
+from app.utils.concurrency import run_blocking
+from app.core.reference_data import reference_data
+
+
+def _unique(ids: Iterable[int]) -> List[int]:
+    return list(dict.fromkeys(ids))
+
+
+def _split_known(ids: List[int], known: Optional[Dict[int, Any]]) -> Tuple[Dict[int, Any], List[int]]:
+    """Split ids into those answered by a snapshot table and those still to query."""
+    if known is None:
+        return {}, ids
+    found = {i: known[i] for i in ids if i in known}
+    return found, [i for i in ids if i not in found]
+
+
+class Hydrator:
+    """
+    Bulk loaders that fetch the rows needed to assemble a result set. Rows are
+    served from the reference-data snapshot when it is fresh; anything it does
+    not know about is fetched with one ``in_``-filtered query per table.
+    """
+
+    @staticmethod
+    async def fetch_articles(article_ids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+        snapshot = reference_data.current()
+        articles, ids = _split_known(_unique(article_ids), snapshot.articles if snapshot else None)
+        if not ids:
+            return articles
+        response = await run_blocking(supabase.table("articles").select("*").in_("id", ids).execute)
+        articles.update({row["id"]: row for row in response.data or []})
+        return articles
+
+    @staticmethod
+    async def fetch_authors(article_ids: Iterable[int]) -> Dict[int, Any]:
+        snapshot = reference_data.current()
+        ids = _unique(article_ids)
+        if snapshot is not None:
+            # Articles without an author row are known too, so only unseen articles are queried
+            authors = {i: snapshot.article_authors[i] for i in ids if i in snapshot.article_authors}
+            ids = [i for i in ids if i not in snapshot.articles]
+        else:
+            authors = {}
+        if not ids:
+            return authors
+        response = await run_blocking(supabase.table("article_authors").select(
+            "article_id, authors(name, title, avatar)"
+        ).in_("article_id", ids).execute)
+        for row in response.data or []:
+            authors.setdefault(row["article_id"], row["authors"])
+        return authors
+
+    @staticmethod
+    async def fetch_clinic_specialties(clinic_ids: Iterable[int]) -> Dict[int, List[str]]:
+        snapshot = reference_data.current()
+        known, ids = _split_known(_unique(clinic_ids), snapshot.clinic_specialties if snapshot else None)
+        specialties: Dict[int, List[str]] = {clinic_id: list(names) for clinic_id, names in known.items()}
+        if not ids:
+            return specialties
+        response = await run_blocking(supabase.table("clinic_specialties").select(
+            "clinic_id, specialties(name)"
+        ).in_("clinic_id", ids).execute)
+        specialties.update({clinic_id: [] for clinic_id in ids})
+        for item in response.data or []:
+            if item.get("specialties") and "name" in item["specialties"]:
+                specialties[item["clinic_id"]].append(item["specialties"]["name"])
+        return specialties
+
+    @staticmethod
+    async def fetch_clinic_insurance(clinic_ids: Iterable[int]) -> Dict[int, List[str]]:
+        snapshot = reference_data.current()
+        known, ids = _split_known(_unique(clinic_ids), snapshot.clinic_insurance if snapshot else None)
+        insurance: Dict[int, List[str]] = {clinic_id: list(names) for clinic_id, names in known.items()}
+        if not ids:
+            return insurance
+        response = await run_blocking(supabase.table("clinic_insurance").select(
+            "clinic_id, insurance_providers(name)"
+        ).in_("clinic_id", ids).execute)
+        insurance.update({clinic_id: [] for clinic_id in ids})
+        for item in response.data or []:
+            if item.get("insurance_providers") and "name" in item["insurance_providers"]:
+                insurance[item["clinic_id"]].append(item["insurance_providers"]["name"])
+        return insurance
+
+    @staticmethod
+    async def fetch_clinics() -> List[Dict[str, Any]]:
+        """Every clinic row, from the snapshot when it is fresh."""
+        snapshot = reference_data.current()
+        if snapshot is not None:
+            return list(snapshot.clinics.values())
+        response = await run_blocking(supabase.table("clinics").select("*").execute)
+        return response.data or []
+
+    @staticmethod
+    async def hydrate_articles(article_ids: Iterable[int]):
+        """Articles and their authors for a result set, fetched concurrently."""
+        ids = _unique(article_ids)
+        return await asyncio.gather(Hydrator.fetch_articles(ids), Hydrator.fetch_authors(ids))
+
+    @staticmethod
+    async def hydrate_clinics(clinic_ids: Iterable[int]):
+        """Specialty and insurance names for a set of clinics, fetched concurrently."""
+        ids = _unique(clinic_ids)
+        return await asyncio.gather(
+            Hydrator.fetch_clinic_specialties(ids),
+            Hydrator.fetch_clinic_insurance(ids)
+        )
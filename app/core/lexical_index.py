@@ -0,0 +1,125 @@
+from collections import Counter
+from typing import Any, Dict, Hashable, Iterable, List, Sequence, Tuple
+import hashlib
+import heapq
+import math
+import re
+import threading
+
+_TOKEN = re.compile(r'\w+')
+
+STOPWORDS = frozenset("""
+a about after all also am an and any are as at be been but by can could did do does doing for from
+had has have having he her here him his how i if in into is it its me my no not of on or our out she
+so some than that the their them then there these they this those to too up us was we were what
+when where which who why will with would you your
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased word tokens without stopwords."""
+    return [token for token in _TOKEN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    Inverted index scored with Okapi BM25.
+
+    Postings map each term to the term frequency per document. Documents are
+    inserted, replaced and removed one at a time, keeping the collection
+    statistics current, so the index is built once and then only touched
+    for changed documents. A lock makes updates from the refresh thread safe
+    against concurrent searches.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[Hashable, int]] = {}
+        self.lengths: Dict[Hashable, int] = {}
+        self.hashes: Dict[Hashable, str] = {}
+        self.payloads: Dict[Hashable, Any] = {}
+        self.total_length = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.lengths)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.lengths
+
+    def _remove(self, key: Hashable) -> None:
+        for term in self.payloads.pop(key)[1]:
+            postings = self.postings[term]
+            del postings[key]
+            if not postings:
+                del self.postings[term]
+        self.total_length -= self.lengths.pop(key)
+        del self.hashes[key]
+
+    def upsert(self, key: Hashable, text: str, payload: Any = None) -> bool:
+        """Index ``text`` under ``key``. Returns False when it is already indexed unchanged."""
+        digest = hashlib.sha1(text.encode("utf-8")).hexdigest()
+        if self.hashes.get(key) == digest:
+            return False
+        counts = Counter(tokenize(text))
+        with self._lock:
+            if key in self.lengths:
+                self._remove(key)
+            for term, count in counts.items():
+                self.postings.setdefault(term, {})[key] = count
+            length = sum(counts.values())
+            self.lengths[key] = length
+            self.hashes[key] = digest
+            self.payloads[key] = (payload, tuple(counts))
+            self.total_length += length
+        return True
+
+    def remove(self, key: Hashable) -> None:
+        with self._lock:
+            if key in self.lengths:
+                self._remove(key)
+
+    def sync(self, documents: Dict[Hashable, Tuple[str, Any]]) -> int:
+        """
+        Make the index hold exactly ``documents`` (key -> (text, payload)).
+        Only new and changed texts are re-tokenised; returns how many were.
+        """
+        changed = sum(self.upsert(key, text, payload) for key, (text, payload) in documents.items())
+        for key in [key for key in self.lengths if key not in documents]:
+            self.remove(key)
+        return changed
+
+    def payload(self, key: Hashable) -> Any:
+        return self.payloads[key][0]
+
+    def search(self, query: str, top_k: int) -> List[Tuple[Hashable, float]]:
+        """The ``top_k`` (key, score) pairs for ``query``, best first."""
+        terms = set(tokenize(query))
+        scores: Dict[Hashable, float] = {}
+        with self._lock:
+            count = len(self.lengths)
+            if not count or not terms:
+                return []
+            average_length = self.total_length / count
+            for term in terms:
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for key, frequency in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self.lengths[key] / average_length)
+                    scores[key] = scores.get(key, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+        return heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+
+
+def reciprocal_rank_fusion(rankings: Iterable[Sequence[Hashable]], k: int) -> List[Tuple[Hashable, float]]:
+    """
+    Fuse several rankings of the same items: each item scores the sum of
+    ``1 / (k + rank)`` over the rankings it appears in. Best first.
+    """
+    scores: Dict[Hashable, float] = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, 1):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: -item[1])
@@ -1,18 +1,34 @@
-from typing import List, Dict, Any
-import openai
+from typing import List, Dict, Any, AsyncIterator, Optional
 import json
-import re
 from app.config import settings
+from app.core.context import RequestContext
+from app.core.formatter import format_text
+from app.utils.tokens import count_message_tokens, count_tokens
+from app.utils.http import openai_module, openai_timeout
+
+# Returned when the analysis cannot be obtained or parsed
+DEFAULT_QUERY_ANALYSIS = {
+    "topics": ["general mental health"],
+    "emotional_state": "unknown",
+    "seeking_clinical_help": False,
+    "risk_level": "unknown",
+    "primary_need": "information"
+}
 
 class LLM:
     @staticmethod
-    async def generate_response(
+    def build_messages(
         query: str, 
         articles: List[Dict[str, Any]], 
         clinics: List[Dict[str, Any]],
-        chat_history: List[Dict[str, str]] = None
-    ) -> str:
-        """Generate a response using the OpenAI API with context from articles and clinics."""
+        chat_history: List[Dict[str, str]] = None,
+        history_summary: Optional[str] = None
+    ) -> List[Dict[str, str]]:
+        """
+        Build the chat messages (system prompt, history and grounded user turn)
+        for a query. ``history_summary`` stands in for turns older than
+        ``chat_history``.
+        """
         if chat_history is None:
             chat_history = []
 
@@ -20,7 +36,14 @@ class LLM:
         if articles:
             article_context = "Relevant article information:\n\n"
             for i, article in enumerate(articles, 1):
-                if article.get("source_type") == "section":
+                if article.get("sections"):
+                    # Packed by ContextPacker: excerpts are already trimmed to the budget
+                    article_context += f"[Article {i}] \"{article['title']}\" (Category: {article['category']})\n"
+                    for section in article["sections"]:
+                        article_context += f"• Section: {section['title']}\n"
+                        article_context += f"• Content: {section['content']}\n"
+                    article_context += "\n"
+                elif article.get("source_type") == "section":
                     article_context += f"[Article {i}] \"{article['title']}\" (Category: {article['category']})\n"
                     article_context += f"• Section: {article['section_title']}\n"
                     article_context += f"• Content: {article['section_content'][:500]}...\n\n"
@@ -82,6 +105,11 @@ class LLM:
         """
         
         messages = [{"role": "system", "content": system_message.strip()}]
+        if history_summary:
+            messages.append({
+                "role": "system",
+                "content": f"Summary of the earlier conversation with this user: {history_summary}"
+            })
         for message in chat_history:
             messages.append({"role": message["role"], "content": message["content"]})
         user_message = f"User question: {query}"
@@ -89,16 +117,72 @@ class LLM:
             user_message += f"\n\nContext information to use in your response:\n{context}"
         
         messages.append({"role": "user", "content": user_message})
-        response = openai.ChatCompletion.create(
+        return messages
+
+    @staticmethod
+    async def generate_response(
+        query: str, 
+        articles: List[Dict[str, Any]], 
+        clinics: List[Dict[str, Any]],
+        chat_history: List[Dict[str, str]] = None,
+        history_summary: Optional[str] = None,
+        context: Optional[RequestContext] = None
+    ) -> str:
+        """
+        Generate a response using the OpenAI API with context from articles and
+        clinics. The prompt and completion tokens are recorded in ``context.usage``.
+        """
+        messages = LLM.build_messages(query, articles, clinics, chat_history, history_summary)
+        response = await openai_module().ChatCompletion.acreate(
             model=settings.OPENAI_CHAT_MODEL,
             messages=messages,
             temperature=0.7,
-            max_tokens=1000
+            max_tokens=1000,
+            request_timeout=openai_timeout(settings.OPENAI_CHAT_TIMEOUT_SECONDS)
         )
+        if context is not None:
+            usage = response.get("usage") or {}
+            context.usage["prompt_tokens"] = usage.get("prompt_tokens") or count_message_tokens(messages)
         raw_response = response.choices[0].message['content']
+        if context is not None:
+            context.usage["completion_tokens"] = usage.get("completion_tokens") or count_tokens(raw_response)
         formatted_response = LLM.format_response(raw_response)
         
         return formatted_response
+
+    @staticmethod
+    async def stream_response(
+        query: str, 
+        articles: List[Dict[str, Any]], 
+        clinics: List[Dict[str, Any]],
+        chat_history: List[Dict[str, str]] = None,
+        history_summary: Optional[str] = None,
+        context: Optional[RequestContext] = None
+    ) -> AsyncIterator[str]:
+        """
+        Stream the raw (unformatted) response text as the model produces it.
+        Prompt and completion tokens are counted into ``context.usage``.
+        """
+        messages = LLM.build_messages(query, articles, clinics, chat_history, history_summary)
+        if context is not None:
+            # Streamed completions carry no usage block, so the prompt is counted locally
+            context.usage["prompt_tokens"] = count_message_tokens(messages)
+        stream = await openai_module().ChatCompletion.acreate(
+            model=settings.OPENAI_CHAT_MODEL,
+            messages=messages,
+            temperature=0.7,
+            max_tokens=1000,
+            stream=True,
+            request_timeout=openai_timeout(settings.OPENAI_CHAT_TIMEOUT_SECONDS)
+        )
+        completion = []
+        async for chunk in stream:
+            delta = chunk.choices[0].get("delta", {}).get("content")
+            if delta:
+                completion.append(delta)
+                yield delta
+        if context is not None:
+            context.usage["completion_tokens"] = count_tokens("".join(completion))
     
     @staticmethod
     def format_response(text: str) -> str:
@@ -107,29 +191,7 @@ class LLM:
         This makes the text look cleaner and more structured in the frontend.
         This section was written by Claude AI as I was too lazy to write it.
         """
-        # Replace dash or asterisk bullets with proper Unicode bullets
-        text = re.sub(r'(?m)^[-*] ', '• ', text)
-        
-        # Ensure consistent spacing after bullets
-        text = re.sub(r'(?m)^(•)(?!\s)', r'\1 ', text)
-        
-        # Format clinic and article references with proper spacing and styling
-        text = re.sub(r'(?m)^(\d+)\.\s*\*?\*?\[Clinic (\d+)\]\*?\*?:?\s*', r'\1. **[Clinic \2]**: ', text)
-        text = re.sub(r'(?m)^(\d+)\.\s*\*?\*?\[Article (\d+)\]\*?\*?:?\s*', r'\1. **[Article \2]**: ', text)
-        
-        # Ensure clinic bullet points are properly indented
-        text = re.sub(r'(?m)^((\d+)\. \*\*\[Clinic \d+\]\*\*:.+\n)(?=•)', r'\1   ', text)
-        
-        # Make sure section headings are properly formatted
-        text = re.sub(r'(?m)^([A-Z][A-Za-z\s]+):\s*$', r'**\1:**', text)
-        
-        # Ensure proper spacing between clinics
-        text = re.sub(r'(?m)(•\s.+)\n(?=\d+\.\s+\*\*\[Clinic)', r'\1\n\n', text)
-        
-        # Ensure proper spacing after paragraphs before new sections
-        text = re.sub(r'(?m)([^•].+)\n(?=\*\*[A-Z][a-zA-Z ]+:\*\*)', r'\1\n\n', text)
-        
-        return text
+        return format_text(text)
 
     @staticmethod
     async def analyze_mental_health_query(query: str) -> Dict[str, Any]:
@@ -157,22 +219,47 @@ class LLM:
         appropriately cautious with concerning language.
         """
         
-        response = openai.ChatCompletion.create(
+        response = await openai_module().ChatCompletion.acreate(
             model=settings.OPENAI_CHAT_MODEL,
             messages=[
                 {"role": "system", "content": system_message},
                 {"role": "user", "content": query}
             ],
-            temperature=0.3
+            temperature=0.3,
+            request_timeout=openai_timeout(settings.ANALYSIS_TIMEOUT_SECONDS)
         )
         
         try:
             return json.loads(response.choices[0].message['content'])
         except Exception as e:
-            return {
-                "topics": ["general mental health"],
-                "emotional_state": "unknown",
-                "seeking_clinical_help": False,
-                "risk_level": "unknown",
-                "primary_need": "information"
-            }
+            return dict(DEFAULT_QUERY_ANALYSIS)
+
+    @staticmethod
+    async def summarize_conversation(
+        previous_summary: Optional[str],
+        messages: List[Dict[str, str]]
+    ) -> str:
+        """
+        Fold ``messages`` into the running summary of a conversation. Uses the
+        smaller summary model, since the result only needs to carry context.
+        """
+        system_message = """
+        You maintain a running summary of a conversation between a user and a mental
+        health support assistant. Update the summary with the new messages. Keep the
+        user's situation, feelings, concerns, any risk indicators, and the advice or
+        resources already given. Write in the third person, at most one paragraph.
+        """
+        transcript = "\n".join(f"{message['role']}: {message['content']}" for message in messages)
+        user_message = f"Current summary: {previous_summary or '(none)'}\n\nNew messages:\n{transcript}"
+
+        response = await openai_module().ChatCompletion.acreate(
+            model=settings.HISTORY_SUMMARY_MODEL,
+            messages=[
+                {"role": "system", "content": system_message.strip()},
+                {"role": "user", "content": user_message}
+            ],
+            temperature=0.2,
+            max_tokens=settings.HISTORY_SUMMARY_MAX_TOKENS,
+            request_timeout=openai_timeout(settings.OPENAI_CHAT_TIMEOUT_SECONDS)
+        )
+        return response.choices[0].message['content'].strip()
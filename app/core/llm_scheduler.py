@@ -0,0 +1,146 @@
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, List, Optional
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+
+from app.config import settings
+from app.core.context import RequestContext
+from app.utils.metrics import metrics, llm_queue_wait_seconds, llm_shed_total
+
+logger = logging.getLogger(__name__)
+
+# Queue order by the query analysis' risk level; anything else shares the last place
+RISK_PRIORITIES = {"high": 0, "medium": 1}
+DEFAULT_PRIORITY = 2
+PRIORITY_NAMES = {0: "high", 1: "medium", 2: "normal"}
+
+
+class LLMOverloadedError(Exception):
+    """No completion slot became free within the queue deadline, or the queue was full."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+@dataclass(order=True)
+class _Waiter:
+    priority: int
+    sequence: int
+    future: asyncio.Future = field(compare=False)
+
+
+class CompletionScheduler:
+    """
+    Admission control for answer completions. At most ``max_concurrent``
+    run at once; further requests wait in a priority queue (high-risk
+    conversations first, then arrival order) and a finishing completion
+    hands its slot straight to the next waiter. A request that waits longer
+    than ``deadline`` seconds, or arrives to a full queue, fails fast with
+    LLMOverloadedError instead of adding to a backlog the model cannot
+    drain.
+    """
+
+    def __init__(self, max_concurrent: int, max_queue: int, deadline: float):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.deadline = deadline
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.stats: Dict[str, int] = {
+            "active": 0,
+            "queued": 0,
+            "admitted": 0,
+            "waited": 0,
+            "shed_deadline": 0,
+            "shed_queue_full": 0,
+        }
+
+    @staticmethod
+    def priority(risk_level: Optional[str]) -> int:
+        return RISK_PRIORITIES.get(risk_level, DEFAULT_PRIORITY)
+
+    def _bind(self) -> None:
+        """The queue belongs to one event loop; start afresh under a new loop."""
+        loop = asyncio.get_running_loop()
+        if loop is self._loop:
+            return
+        self._loop = loop
+        self._queue: List[_Waiter] = []
+        self._sequence = itertools.count()
+        self.stats["active"] = self.stats["queued"] = 0
+
+    def _shed(self, reason: str, message: str) -> LLMOverloadedError:
+        self.stats[f"shed_{reason}"] += 1
+        llm_shed_total.inc(reason=reason)
+        logger.warning(f"Shedding a request: {message}")
+        return LLMOverloadedError(message, retry_after=self.deadline)
+
+    async def acquire(self, priority: int) -> float:
+        """Wait for a completion slot; returns the seconds spent waiting."""
+        self._bind()
+        started = time.perf_counter()
+        if self.stats["active"] < self.max_concurrent and not self.stats["queued"]:
+            self.stats["active"] += 1
+        else:
+            if self.stats["queued"] >= self.max_queue:
+                raise self._shed("queue_full", f"{self.stats['queued']} requests already waiting for the model")
+            waiter = _Waiter(priority, next(self._sequence), self._loop.create_future())
+            heapq.heappush(self._queue, waiter)
+            self.stats["queued"] += 1
+            self.stats["waited"] += 1
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter.future), self.deadline)
+            except asyncio.TimeoutError:
+                if not waiter.future.done():
+                    waiter.future.cancel()
+                    self.stats["queued"] -= 1
+                    raise self._shed("deadline", f"no completion slot within {self.deadline:.0f}s")
+                # The slot was handed over just as the deadline passed; keep it
+            except asyncio.CancelledError:
+                if waiter.future.done():
+                    # The slot was handed over to a caller that has gone; pass it on
+                    self.release()
+                else:
+                    waiter.future.cancel()
+                    self.stats["queued"] -= 1
+                raise
+        waited = time.perf_counter() - started
+        self.stats["admitted"] += 1
+        llm_queue_wait_seconds.observe(waited, priority=PRIORITY_NAMES[priority])
+        return waited
+
+    def release(self) -> None:
+        """Hand the slot to the most urgent waiter, or free it."""
+        while self._queue:
+            waiter = heapq.heappop(self._queue)
+            if not waiter.future.done():
+                self.stats["queued"] -= 1
+                waiter.future.set_result(None)
+                return
+        self.stats["active"] -= 1
+
+    @asynccontextmanager
+    async def slot(self, risk_level: Optional[str], context: Optional[RequestContext] = None) -> AsyncIterator[None]:
+        """Hold a completion slot for the ``with`` block; the wait is recorded as the ``llm_queue`` stage."""
+        waited = await self.acquire(self.priority(risk_level))
+        if context is not None:
+            context.timings["llm_queue"] = waited
+        try:
+            yield
+        finally:
+            self.release()
+
+
+completion_scheduler = CompletionScheduler(
+    max_concurrent=settings.LLM_MAX_CONCURRENT_COMPLETIONS,
+    max_queue=settings.LLM_MAX_QUEUE,
+    deadline=settings.LLM_QUEUE_DEADLINE_SECONDS
+)
+metrics.register_stats(
+    "rag_llm_scheduler", "Answer completions running and queued, admitted, and shed by reason.",
+    lambda: completion_scheduler.stats
+)
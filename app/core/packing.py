@@ -0,0 +1,218 @@
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+import re
+
+import numpy as np
+
+from app.core.context import RequestContext
+from app.core.vector_index import article_index, content_hash
+from app.utils.tokens import count_tokens
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+_WORD = re.compile(r'\w+')
+
+
+@dataclass
+class _Section:
+    article: Dict[str, Any]
+    title: str
+    excerpt: str
+    tokens: int
+    relevance: float
+    vector: Optional[np.ndarray]
+
+
+class ContextPacker:
+    """
+    Selects the retrieved content that goes into the prompt.
+
+    Candidate sections are deduplicated by content and trimmed to whole sentences, then
+    chosen greedily: the most relevant section first, then whichever section
+    adds the most maximal-marginal-relevance per token until the budget is
+    spent. Sections of the same article are merged under one article entry,
+    so a second section of an article costs no extra header. Redundancy is
+    measured with the section embeddings held by the local article index,
+    or word overlap for sections it does not know.
+    """
+
+    ARTICLE_HEADER = '[Article {number}] "{title}" (Category: {category})\n'
+    SECTION_TEMPLATE = "• Section: {title}\n• Content: {content}\n"
+
+    def __init__(self, budget: int, section_max_tokens: int, mmr_lambda: float,
+                 max_articles: int, max_clinics: int):
+        self.budget = budget
+        self.section_max_tokens = section_max_tokens
+        self.mmr_lambda = mmr_lambda
+        self.max_articles = max_articles
+        self.max_clinics = max_clinics
+
+    def excerpt(self, text: str) -> Tuple[str, int]:
+        """``text`` cut to whole sentences within the per-section token cap, with its token count."""
+        tokens = count_tokens(text)
+        if tokens <= self.section_max_tokens:
+            return text, tokens
+        excerpt = ""
+        for sentence in _SENTENCE_END.split(text):
+            candidate = f"{excerpt} {sentence}" if excerpt else sentence
+            if count_tokens(candidate) > self.section_max_tokens:
+                break
+            excerpt = candidate
+        if not excerpt:
+            # A single overlong sentence: fall back to a proportional character cut
+            excerpt = text[:len(text) * self.section_max_tokens // tokens]
+        excerpt += "..."
+        return excerpt, count_tokens(excerpt)
+
+    @staticmethod
+    def redundancy(sections: List[_Section]) -> np.ndarray:
+        """Pairwise similarity of the candidate sections."""
+        count = len(sections)
+        if all(section.vector is not None for section in sections):
+            vectors = np.vstack([section.vector for section in sections]) if count else np.zeros((0, 0))
+            return vectors @ vectors.T
+        words = [set(_WORD.findall(section.excerpt.lower())) for section in sections]
+        similarity = np.eye(count, dtype=np.float32)
+        for i in range(count):
+            for j in range(i + 1, count):
+                if sections[i].vector is not None and sections[j].vector is not None:
+                    value = float(sections[i].vector @ sections[j].vector)
+                else:
+                    union = len(words[i] | words[j])
+                    value = len(words[i] & words[j]) / union if union else 0.0
+                similarity[i, j] = similarity[j, i] = value
+        return similarity
+
+    def _candidates(self, articles: List[Dict[str, Any]]) -> List[_Section]:
+        sections = []
+        seen = set()
+        # The same text can be indexed under several articles; keep its most relevant copy
+        for article in sorted(articles, key=lambda a: -float(a.get("similarity") or 0.0)):
+            text = article.get("section_content") or article.get("content") or ""
+            key = content_hash(text)
+            if not text or key in seen:
+                continue
+            seen.add(key)
+            title = article.get("section_title") or article.get("content_type", "content").capitalize()
+            excerpt, tokens = self.excerpt(text)
+            sections.append(_Section(
+                article=article,
+                title=title,
+                excerpt=excerpt,
+                tokens=tokens + count_tokens(self.SECTION_TEMPLATE.format(title=title, content="")),
+                relevance=float(article.get("similarity") or 0.0),
+                vector=article_index.section_vector(article["id"], title)
+            ))
+        return sections
+
+    def pack_articles(self, articles: List[Dict[str, Any]], budget: int) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Pack candidate article sections into ``budget`` tokens. Returns one
+        entry per article, most relevant first, each carrying its chosen
+        ``sections``, and the tokens used.
+        """
+        sections = self._candidates(articles)
+        if not sections:
+            return [], 0
+        similarity = self.redundancy(sections)
+        relevance = np.array([section.relevance for section in sections], dtype=np.float32)
+        header_tokens = [
+            count_tokens(self.ARTICLE_HEADER.format(
+                number=len(sections), title=section.article["title"], category=section.article["category"]
+            ))
+            for section in sections
+        ]
+
+        chosen: Dict[int, List[int]] = {}
+        max_similarity = np.full(len(sections), -np.inf, dtype=np.float32)
+        available = set(range(len(sections)))
+        remaining = budget
+        while available:
+            best, best_value = None, -np.inf
+            for i in available:
+                article_id = sections[i].article["id"]
+                is_new = article_id not in chosen
+                if is_new and len(chosen) >= self.max_articles:
+                    continue
+                cost = sections[i].tokens + (header_tokens[i] if is_new else 0)
+                if cost > remaining:
+                    continue
+                penalty = max(float(max_similarity[i]), 0.0)
+                gain = self.mmr_lambda * relevance[i] - (1 - self.mmr_lambda) * penalty
+                # The first pick is the most relevant section, later ones the best gain per token
+                value = gain if not chosen else gain / cost
+                if gain > 0 and value > best_value:
+                    best, best_value = i, value
+            if best is None:
+                break
+            article_id = sections[best].article["id"]
+            remaining -= sections[best].tokens + (0 if article_id in chosen else header_tokens[best])
+            chosen.setdefault(article_id, []).append(best)
+            max_similarity = np.maximum(max_similarity, similarity[best])
+            available.discard(best)
+
+        packed = []
+        for indices in chosen.values():
+            indices.sort(key=lambda i: -sections[i].relevance)
+            lead = sections[indices[0]]
+            packed.append({
+                **lead.article,
+                "section_title": lead.title,
+                "similarity": lead.relevance,
+                "sections": [
+                    {"title": sections[i].title, "content": sections[i].excerpt, "similarity": sections[i].relevance}
+                    for i in indices
+                ]
+            })
+        packed.sort(key=lambda article: -article["similarity"])
+        return packed, budget - remaining
+
+    def pack_clinics(self, clinics: List[Dict[str, Any]], budget: int) -> Tuple[List[Dict[str, Any]], int]:
+        """Distinct clinics, most relevant first, as many as fit in ``budget`` tokens."""
+        packed, used, seen = [], 0, set()
+        for clinic in sorted(clinics, key=lambda c: -float(c.get("similarity") or 0.0)):
+            if clinic["clinic_id"] in seen or len(packed) >= self.max_clinics:
+                continue
+            description, _ = self.excerpt(clinic.get("description") or "")
+            clinic = {**clinic, "description": description}
+            tokens = count_tokens(" ".join(str(value) for value in (
+                clinic["name"], description, clinic.get("location"),
+                ", ".join(clinic.get("specialties", [])), ", ".join(clinic.get("insurance_accepted", []))
+            ))) + 40  # labels and bullets of the clinic block
+            if used + tokens > budget:
+                continue
+            seen.add(clinic["clinic_id"])
+            packed.append(clinic)
+            used += tokens
+        return packed, used
+
+    def pack(
+        self,
+        articles: List[Dict[str, Any]],
+        clinics: List[Dict[str, Any]],
+        context: Optional[RequestContext] = None
+    ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Pack clinics first (they are only retrieved when asked for), then articles into what is left."""
+        packed_clinics, clinic_tokens = self.pack_clinics(clinics, self.budget)
+        packed_articles, article_tokens = self.pack_articles(articles, self.budget - clinic_tokens)
+        sections = sum(len(article["sections"]) for article in packed_articles)
+        logger.info(
+            f"Context packed: {sections} sections from {len(packed_articles)} articles "
+            f"(of {len(articles)} candidates) and {len(packed_clinics)} clinics "
+            f"in {article_tokens + clinic_tokens} tokens"
+        )
+        if context is not None:
+            context.usage["context_tokens"] = article_tokens + clinic_tokens
+        return packed_articles, packed_clinics
+
+
+context_packer = ContextPacker(
+    budget=settings.CONTEXT_TOKEN_BUDGET,
+    section_max_tokens=settings.CONTEXT_SECTION_MAX_TOKENS,
+    mmr_lambda=settings.CONTEXT_MMR_LAMBDA,
+    max_articles=settings.MAX_ARTICLE_RESULTS,
+    max_clinics=settings.MAX_CLINIC_RESULTS
+)
@@ -0,0 +1,236 @@
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import logging
+import random
+import re
+import time
+
+import numpy as np
+
+from app.core.context import RequestContext
+from app.core.llm import LLM
+from app.utils.embeddings import aget_embeddings
+from app.utils.metrics import metrics
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _phrases(*phrases: str) -> re.Pattern:
+    """Compile phrases into one case-insensitive, word-bounded alternation."""
+    return re.compile(r"\b(?:" + "|".join(phrases) + r")\b", re.IGNORECASE)
+
+
+class QueryAnalyzer:
+    """
+    Two-tier query analysis. The local tier answers in milliseconds from
+    compiled keyword matchers plus nearest-centroid classification of the
+    query embedding against labelled prototype phrases. The query escalates to
+    LLM.analyze_mental_health_query when a risk phrase is present or the
+    local classification is not confident enough.
+    """
+
+    TOPICS = {
+        "anxiety": _phrases(r"anxi\w*", r"panic\w*", r"worr\w*", r"nervous", r"on edge"),
+        "depression": _phrases(r"depress\w*", r"hopeless\w*", r"empty", r"numb", r"no motivation"),
+        "stress": _phrases(r"stress\w*", r"overwhelm\w*", r"pressure", r"burn(?:ed|t)? ?out"),
+        "sleep": _phrases(r"sleep\w*", r"insomnia", r"nightmares?", r"tired", r"exhausted"),
+        "grief": _phrases(r"grie\w*", r"loss", r"lost (?:my|a)", r"passed away", r"mourning"),
+        "relationships": _phrases(r"relationships?", r"partner", r"breakup", r"divorce", r"lonel\w*", r"friends?"),
+        "trauma": _phrases(r"trauma\w*", r"ptsd", r"abuse\w*", r"flashbacks?"),
+        "substance use": _phrases(r"addict\w*", r"alcohol", r"drinking", r"drugs?", r"relapse\w*"),
+        "self-esteem": _phrases(r"self[- ]esteem", r"worthless", r"confidence", r"hate myself"),
+        "anger": _phrases(r"anger", r"angry", r"rage", r"irritab\w*"),
+    }
+
+    EMOTIONS = {
+        "anxious": _phrases(r"anxious", r"scared", r"afraid", r"panick\w*", r"nervous", r"worried"),
+        "sad": _phrases(r"sad", r"down", r"depressed", r"crying", r"heartbroken"),
+        "overwhelmed": _phrases(r"overwhelm\w*", r"stressed", r"can't cope", r"too much"),
+        "lonely": _phrases(r"lonely", r"alone", r"isolated"),
+        "angry": _phrases(r"angry", r"furious", r"frustrated", r"irritated"),
+        "exhausted": _phrases(r"exhausted", r"tired", r"drained", r"burn(?:ed|t)? ?out"),
+    }
+
+    # Any of these always escalates to the LLM so risk is judged by the full model
+    RISK = _phrases(
+        r"suicid\w*", r"kill (?:myself|me)", r"end (?:my|it) (?:life|all)", r"want to die",
+        r"don'?t want to (?:live|be here)", r"self[- ]harm\w*", r"hurt(?:ing)? myself", r"cutting",
+        r"overdose", r"no reason to live", r"better off (?:dead|without me)", r"can'?t go on"
+    )
+
+    CLINICAL = _phrases(
+        r"therapists?", r"psychiatrists?", r"psychologists?", r"counsell?ors?", r"clinics?",
+        r"appointments?", r"doctors?", r"specialists?", r"insurance", r"medication", r"prescri\w*",
+        r"diagnos\w*", r"treatment", r"providers?"
+    )
+
+    PROTOTYPES = {
+        "information": [
+            "What is anxiety and what causes it?",
+            "What are the symptoms of depression?",
+            "How does stress affect the body?",
+            "Can you explain what panic attacks are?",
+            "Is it normal to feel this way after a loss?",
+        ],
+        "support": [
+            "I feel so alone and I don't know what to do",
+            "I've been really sad lately and need someone to talk to",
+            "Everything feels overwhelming right now",
+            "I'm struggling to get through the day",
+            "I just need to vent about how hard things are",
+        ],
+        "resources": [
+            "What are some techniques to manage anxiety?",
+            "Can you recommend articles about coping with stress?",
+            "How can I improve my sleep?",
+            "What exercises help with depression?",
+            "Give me tips for dealing with grief",
+        ],
+        "clinical": [
+            "I need to find a therapist near me",
+            "Can you recommend a psychiatrist who takes my insurance?",
+            "How do I book an appointment with a counselor?",
+            "Are there clinics that treat PTSD?",
+            "I think I need professional help and medication",
+        ],
+    }
+
+    def __init__(self):
+        self._labels: List[str] = list(self.PROTOTYPES)
+        self._centroids: Optional[np.ndarray] = None
+        self._retry_at = 0.0
+        self._lock = asyncio.Lock()
+        self._shadow_tasks = set()
+        self.stats: Dict[str, int] = {
+            "local": 0,
+            "llm": 0,
+            "escalated_risk": 0,
+            "escalated_low_confidence": 0,
+            "escalated_no_centroids": 0,
+            "compared": 0,
+            "agree_primary_need": 0,
+            "agree_clinical": 0,
+        }
+
+    async def load_centroids(self) -> None:
+        """
+        Embed the prototype phrases (cached after the first run) and build one
+        centroid per label. After a failure no attempt is made for
+        ``ANALYZER_CENTROID_RETRY_SECONDS``.
+        """
+        if time.monotonic() < self._retry_at:
+            return
+        async with self._lock:
+            if self._centroids is not None or time.monotonic() < self._retry_at:
+                return
+            phrases = [phrase for label in self._labels for phrase in self.PROTOTYPES[label]]
+            vectors = np.asarray(await aget_embeddings(phrases), dtype=np.float32)
+            if not np.any(vectors):
+                self._retry_at = time.monotonic() + settings.ANALYZER_CENTROID_RETRY_SECONDS
+                logger.warning("Prototype embeddings unavailable, local analysis disabled for now")
+                return
+            centroids = []
+            offset = 0
+            for label in self._labels:
+                count = len(self.PROTOTYPES[label])
+                centroid = vectors[offset:offset + count].mean(axis=0)
+                centroids.append(centroid / (np.linalg.norm(centroid) or 1.0))
+                offset += count
+            self._centroids = np.vstack(centroids)
+
+    def classify(self, query_embedding) -> Tuple[Optional[str], float]:
+        """Nearest-centroid primary need and its margin over the runner-up."""
+        if self._centroids is None:
+            return None, 0.0
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return None, 0.0
+        scores = self._centroids @ (query / norm)
+        order = np.argsort(-scores)
+        return self._labels[order[0]], float(scores[order[0]] - scores[order[1]])
+
+    def analyze_local(self, query: str, query_embedding) -> Tuple[Dict[str, Any], Optional[str]]:
+        """
+        Local analysis of the query. Returns the analysis and the reason it
+        should be escalated to the LLM, or None when the local answer stands.
+        """
+        topics = [topic for topic, pattern in self.TOPICS.items() if pattern.search(query)]
+        emotions = [emotion for emotion, pattern in self.EMOTIONS.items() if pattern.search(query)]
+        clinical_terms = bool(self.CLINICAL.search(query))
+        primary_need, margin = self.classify(query_embedding)
+
+        if self.RISK.search(query):
+            reason = "risk"
+        elif primary_need is None:
+            # No centroids yet: keywords alone can only vouch for clinical intent
+            reason = None if clinical_terms else "no_centroids"
+        elif margin < settings.ANALYZER_MIN_MARGIN:
+            reason = "low_confidence"
+        else:
+            reason = None
+        if primary_need is None:
+            primary_need = "clinical" if clinical_terms else "information"
+
+        analysis = {
+            "topics": topics or ["general mental health"],
+            "emotional_state": ", ".join(emotions) if emotions else "unknown",
+            "seeking_clinical_help": clinical_terms or primary_need == "clinical",
+            # Missing a risk phrase is no evidence of no risk, so the local tier
+            # never claims "none": its answers are not cached or deprioritised
+            "risk_level": "high" if reason == "risk" else "unknown",
+            "primary_need": primary_need,
+            "confidence": round(margin, 4),
+        }
+        return analysis, reason
+
+    def _record_agreement(self, local: Dict[str, Any], remote: Dict[str, Any]) -> None:
+        self.stats["compared"] += 1
+        if local["primary_need"] == remote.get("primary_need"):
+            self.stats["agree_primary_need"] += 1
+        if local["seeking_clinical_help"] == bool(remote.get("seeking_clinical_help", False)):
+            self.stats["agree_clinical"] += 1
+
+    async def _shadow_compare(self, query: str, local: Dict[str, Any]) -> None:
+        try:
+            self._record_agreement(local, await LLM.analyze_mental_health_query(query))
+        except Exception as e:
+            logger.debug(f"Shadow analysis failed: {str(e)}")
+
+    async def analyze(self, query: str, context: RequestContext) -> Dict[str, Any]:
+        """Analyse the query, answering locally when possible and escalating otherwise."""
+        if settings.ANALYZER_MODE == "llm":
+            self.stats["llm"] += 1
+            analysis = await LLM.analyze_mental_health_query(query)
+            analysis["analysis_tier"] = "llm"
+            return analysis
+
+        if self._centroids is None:
+            await self.load_centroids()
+        local, reason = self.analyze_local(query, await context.embed_query())
+
+        if reason is None or settings.ANALYZER_MODE == "local":
+            self.stats["local"] += 1
+            local["analysis_tier"] = "local"
+            if random.random() < settings.ANALYZER_SHADOW_RATE:
+                # Sample the LLM in the background to measure agreement with the local tier
+                task = asyncio.create_task(self._shadow_compare(query, dict(local)))
+                self._shadow_tasks.add(task)
+                task.add_done_callback(self._shadow_tasks.discard)
+            logger.info(f"Query analysed locally (need={local['primary_need']}, margin={local['confidence']})")
+            return local
+
+        self.stats["llm"] += 1
+        self.stats[f"escalated_{reason}"] += 1
+        analysis = await LLM.analyze_mental_health_query(query)
+        self._record_agreement(local, analysis)
+        analysis["analysis_tier"] = "llm"
+        analysis["escalation_reason"] = reason
+        logger.info(f"Query analysis escalated to LLM ({reason})")
+        return analysis
+
+
+query_analyzer = QueryAnalyzer()
+metrics.register_stats("rag_query_analysis", "Query analyses answered locally or by the LLM, and why they escalated.",
+                       lambda: query_analyzer.stats)
@@ -1,66 +1,331 @@
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, Optional, AsyncIterator
+from app.core.context import RequestContext
+from app.core.scheduler import StageScheduler
 from app.core.vector_store import VectorStore
-from app.core.llm import LLM
+from app.core.llm import LLM, DEFAULT_QUERY_ANALYSIS
+from app.core.formatter import ResponseFormatter
+from app.core.query_analyzer import query_analyzer
+from app.core.answer_cache import answer_cache, CachedAnswer
+from app.core.history import history_manager, PreparedHistory
+from app.core.packing import context_packer
+from app.core.singleflight import singleflight, SingleFlight
+from app.core.llm_scheduler import completion_scheduler, LLMOverloadedError
+from app.config import settings
+import asyncio
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
+ERROR_RESPONSE = (
+    "I apologize, but I encountered an error while processing your request. "
+    "Please try again with a different question or rephrase your current one."
+)
+
+OVERLOADED_RESPONSE = (
+    "I'm receiving an unusually high number of messages right now and couldn't answer in time. "
+    "Please try again in a moment. If you are in crisis, please contact your local emergency number "
+    "or a crisis line right away."
+)
+
+# Answers are only cached when the analysis found no elevated risk
+CACHEABLE_RISK_LEVELS = ("none", "low")
+
 class RAG:
+    CLINIC_KEYWORDS = [
+        "therapist", "clinic", "doctor", "professional", "psychiatrist", 
+        "psychologist", "counselor", "therapy", "appointment", "provider",
+        "specialist", "mental health services", "treatment center",
+        "insurance", "healthcare", "practitioner", "consultation"
+    ]
+
+    @staticmethod
+    def matches_clinic_keywords(query: str) -> bool:
+        query = query.lower()
+        return any(keyword in query for keyword in RAG.CLINIC_KEYWORDS)
+
+    @staticmethod
+    def analysis_wants_clinics(query_analysis: Dict[str, Any]) -> bool:
+        return bool(query_analysis.get("seeking_clinical_help", False)) or \
+            query_analysis.get("primary_need") == "clinical"
+
+    @staticmethod
+    def needs_clinics(keyword_match: bool, query_analysis: Optional[Dict[str, Any]]) -> bool:
+        """Whether to search clinics; ``query_analysis`` is None when the analysis failed."""
+        if query_analysis is None:
+            # Degrade to the keyword decision alone
+            return keyword_match
+        if settings.CLINIC_KEYWORDS_AUTHORITATIVE:
+            return keyword_match or RAG.analysis_wants_clinics(query_analysis)
+        return RAG.analysis_wants_clinics(query_analysis)
+
+    @staticmethod
+    async def retrieve(
+        query: str,
+        context: RequestContext
+    ) -> Tuple[Dict[str, Any], List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        Run query analysis and retrieval, returning the analysis, articles and clinics.
+
+        The query analysis (local fast path, escalating to the LLM when unsure)
+        runs concurrently with retrieval, and clinic search
+        starts speculatively when the query mentions clinic keywords. The query
+        is embedded once and shared by every search. Article sections are
+        over-fetched and packed, with the clinics, into the context token budget.
+        """
+        scheduler = StageScheduler(context)
+        try:
+            scheduler.start(
+                "analysis", query_analyzer.analyze(query, context),
+                timeout=settings.ANALYSIS_TIMEOUT_SECONDS
+            )
+            query_embedding = await context.embed_query()
+            logger.info(f"Query embedded in {context.timings.get('embedding', 0.0) * 1000:.1f} ms")
+            scheduler.start(
+                "articles", VectorStore.search_articles(
+                    query, top_k=settings.CONTEXT_CANDIDATES, query_embedding=query_embedding
+                ),
+                timeout=settings.RETRIEVAL_TIMEOUT_SECONDS
+            )
+
+            keyword_match = RAG.matches_clinic_keywords(query)
+            if keyword_match:
+                scheduler.start(
+                    "clinics", VectorStore.search_clinics(query, query_embedding=query_embedding),
+                    timeout=settings.RETRIEVAL_TIMEOUT_SECONDS
+                )
+
+            query_analysis = await scheduler.result("analysis", default=None)
+            is_clinic_related = RAG.needs_clinics(keyword_match, query_analysis)
+            if query_analysis is None:
+                query_analysis = dict(DEFAULT_QUERY_ANALYSIS)
+
+            if is_clinic_related:
+                logger.info("Query appears to be clinic-related, retrieving clinic information")
+                if not scheduler.started("clinics"):
+                    scheduler.start(
+                        "clinics", VectorStore.search_clinics(query, query_embedding=query_embedding),
+                        timeout=settings.RETRIEVAL_TIMEOUT_SECONDS
+                    )
+            else:
+                logger.info("Query does not appear to be clinic-related, skipping clinic search")
+                scheduler.cancel("clinics")
+
+            articles = await scheduler.result("articles", default=[])
+            clinics = await scheduler.result("clinics", default=[])
+            articles, clinics = context_packer.pack(articles, clinics, context)
+            logger.info(f"Articles found: {len(articles)}, clinics found: {len(clinics)}")
+            return query_analysis, articles, clinics
+        finally:
+            scheduler.cancel_all()
+
+    @staticmethod
+    async def retrieve_with_history(
+        query: str,
+        chat_history: List[Dict[str, str]],
+        context: RequestContext
+    ) -> Tuple[Dict[str, Any], List[Dict[str, Any]], List[Dict[str, Any]], PreparedHistory]:
+        """Run retrieval and trim the chat history to its token budget concurrently."""
+        (query_analysis, articles, clinics), history = await asyncio.gather(
+            RAG.retrieve(query, context),
+            history_manager.prepare(chat_history, context)
+        )
+        return query_analysis, articles, clinics, history
+
+    @staticmethod
+    def risk_level(query: str, query_analysis: Optional[Dict[str, Any]]) -> Optional[str]:
+        """The risk level that orders the completion queue; a risk phrase always counts as high."""
+        if query_analyzer.RISK.search(query):
+            return "high"
+        return (query_analysis or {}).get("risk_level")
+
+    @staticmethod
+    def log_usage(context: RequestContext) -> None:
+        usage = context.usage
+        logger.info(
+            f"Prompt tokens sent: {usage.get('prompt_tokens')} "
+            f"(history {usage.get('history_tokens', 0)}, "
+            f"{usage.get('summarized_messages', 0)} older messages summarised)"
+        )
+
+    @staticmethod
+    async def lookup_cached_answer(
+        query: str,
+        chat_history: List[Dict[str, str]],
+        context: RequestContext
+    ) -> Optional[CachedAnswer]:
+        """
+        Serve first-turn queries from the semantic answer cache. Follow-up turns
+        and queries containing risk phrases always run the full pipeline.
+        """
+        if not settings.ANSWER_CACHE_ENABLED or chat_history:
+            return None
+        if query_analyzer.RISK.search(query):
+            answer_cache.record_bypass()
+            return None
+        hit = answer_cache.lookup(await context.embed_query())
+        if hit is None:
+            return None
+        answer, similarity = hit
+        logger.info(f"Answer cache hit (similarity {similarity:.3f}) for query similar to: {answer.query!r}")
+        return answer
+
+    @staticmethod
+    def remember_answer(
+        query: str,
+        chat_history: List[Dict[str, str]],
+        context: RequestContext,
+        query_analysis: Dict[str, Any],
+        answer: CachedAnswer
+    ) -> None:
+        """Cache a first-turn answer unless the analysis flagged any elevated risk."""
+        if not settings.ANSWER_CACHE_ENABLED or chat_history or context.query_embedding is None:
+            return
+        if query_analysis.get("risk_level") not in CACHEABLE_RISK_LEVELS or query_analyzer.RISK.search(query):
+            return
+        answer_cache.store(context.query_embedding, answer)
+
     @staticmethod
     async def process_query(
         query: str, 
-        chat_history: List[Dict[str, str]] = None
+        chat_history: List[Dict[str, str]] = None,
+        context: Optional[RequestContext] = None
     ) -> Tuple[str, List[Dict[str, Any]], List[Dict[str, Any]]]:
         """
         Process a user query through the RAG system and return:
         1. The generated response
         2. Relevant articles
         3. Relevant clinics
+
+        First-turn queries close to a recently answered one are served from
+        the semantic answer cache, and concurrent identical requests share one
+        run. Pass ``context`` to inspect the per-stage timings and token usage
+        afterwards.
         """
         if chat_history is None:
             chat_history = []
-        
+        if context is None:
+            context = RequestContext(query=query)
+        if settings.SINGLEFLIGHT_ENABLED:
+            return await singleflight.do(
+                SingleFlight.key(query, chat_history), context,
+                lambda: RAG.answer_query(query, chat_history, context)
+            )
+        return await RAG.answer_query(query, chat_history, context)
+
+    @staticmethod
+    async def answer_query(
+        query: str,
+        chat_history: List[Dict[str, str]],
+        context: RequestContext
+    ) -> Tuple[str, List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Run the pipeline for one request; see process_query."""
         try:
-            query_analysis = await LLM.analyze_mental_health_query(query)
-            articles = await VectorStore.search_articles(query)
-            is_clinic_related = False
-            if query_analysis.get("seeking_clinical_help", False) or \
-               query_analysis.get("primary_need") == "clinical":
-                is_clinic_related = True
-
-            clinic_keywords = [
-                "therapist", "clinic", "doctor", "professional", "psychiatrist", 
-                "psychologist", "counselor", "therapy", "appointment", "provider",
-                "specialist", "mental health services", "treatment center",
-                "insurance", "healthcare", "practitioner", "consultation"
-            ]
-            
-            if not is_clinic_related:
-                for keyword in clinic_keywords:
-                    if keyword in query.lower():
-                        is_clinic_related = True
-                        break
-            clinics = []
-            if is_clinic_related:
-                print("Query appears to be clinic-related, retrieving clinic information")
-                clinics = await VectorStore.search_clinics(query)
-            else:
-                print("Query does not appear to be clinic-related, skipping clinic search")
+            cached = await RAG.lookup_cached_answer(query, chat_history, context)
+            if cached is not None:
+                context.outcome = "cached"
+                return cached.response, cached.articles, cached.clinics
 
-            response = await LLM.generate_response(
-                query=query,
-                articles=articles,
-                clinics=clinics,
-                chat_history=chat_history
+            started = time.perf_counter()
+            query_analysis, articles, clinics, history = await RAG.retrieve_with_history(
+                query, chat_history, context
+            )
+            context.timings["retrieval"] = time.perf_counter() - started
+            async with completion_scheduler.slot(RAG.risk_level(query, query_analysis), context):
+                started = time.perf_counter()
+                response = await LLM.generate_response(
+                    query=query,
+                    articles=articles,
+                    clinics=clinics,
+                    chat_history=history.messages,
+                    history_summary=history.summary,
+                    context=context
+                )
+                context.timings["generation"] = time.perf_counter() - started
+            RAG.log_usage(context)
+            RAG.remember_answer(
+                query, chat_history, context, query_analysis,
+                CachedAnswer(query=query, response=response, articles=articles, clinics=clinics)
             )
-            print(f"Articles found: {len(articles)}")
-            print(f"Clinics found: {len(clinics)}")
             return response, articles, clinics
-            
+
+        except LLMOverloadedError:
+            # Surfaced to the endpoint as a 503
+            raise
         except Exception as e:
             logger.error(f"Error in RAG processing: {str(e)}")
-            error_response = (
-                "I apologize, but I encountered an error while processing your request. "
-                "Please try again with a different question or rephrase your current one."
+            context.outcome = "error"
+            return ERROR_RESPONSE, [], []
+
+    @staticmethod
+    async def stream_query(
+        query: str,
+        chat_history: List[Dict[str, str]] = None,
+        context: Optional[RequestContext] = None
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Streaming variant of process_query yielding ``(event, data)`` pairs:
+        ``resources`` once retrieval finishes, ``token`` for each formatted
+        chunk of the answer, then ``done`` with the complete formatted response
+        (or ``error`` if the pipeline failed).
+        """
+        if chat_history is None:
+            chat_history = []
+        if context is None:
+            context = RequestContext(query=query)
+
+        try:
+            cached = await RAG.lookup_cached_answer(query, chat_history, context)
+            if cached is not None:
+                context.outcome = "cached"
+                yield "resources", {"articles": cached.articles, "clinics": cached.clinics}
+                yield "token", {"text": cached.response}
+                yield "done", {"response": cached.response}
+                return
+
+            started = time.perf_counter()
+            query_analysis, articles, clinics, history = await RAG.retrieve_with_history(
+                query, chat_history, context
             )
-            return error_response, [], []
+            context.timings["retrieval"] = time.perf_counter() - started
+            yield "resources", {"articles": articles, "clinics": clinics}
+
+            # The incremental formatter emits exactly what LLM.format_response
+            # produces for the full text, so the streamed text is the response
+            formatter = ResponseFormatter()
+            streamed = []
+            async with completion_scheduler.slot(RAG.risk_level(query, query_analysis), context):
+                started = time.perf_counter()
+                async for delta in LLM.stream_response(
+                    query=query,
+                    articles=articles,
+                    clinics=clinics,
+                    chat_history=history.messages,
+                    history_summary=history.summary,
+                    context=context
+                ):
+                    text = formatter.feed(delta)
+                    if text:
+                        streamed.append(text)
+                        yield "token", {"text": text}
+            text = formatter.close()
+            if text:
+                streamed.append(text)
+                yield "token", {"text": text}
+
+            context.timings["generation"] = time.perf_counter() - started
+            response = "".join(streamed)
+            RAG.log_usage(context)
+            RAG.remember_answer(
+                query, chat_history, context, query_analysis,
+                CachedAnswer(query=query, response=response, articles=articles, clinics=clinics)
+            )
+            yield "done", {"response": response, "usage": dict(context.usage)}
+
+        except LLMOverloadedError:
+            context.outcome = "shed"
+            yield "error", {"response": OVERLOADED_RESPONSE, "overloaded": True}
+        except Exception as e:
+            logger.error(f"Error in RAG streaming: {str(e)}")
+            context.outcome = "error"
+            yield "error", {"response": ERROR_RESPONSE}
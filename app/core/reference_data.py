@@ -0,0 +1,210 @@
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import logging
+import sys
+import time
+
+from app.utils.supabase import supabase
+from app.utils.concurrency import run_blocking
+from app.utils.embeddings import aget_embeddings
+from app.core.lexical_index import BM25Index
+from app.core.vector_index import VectorIndex, content_hash
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _intern(value: Any) -> Any:
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def clinic_documents(
+    clinics: List[Dict[str, Any]],
+    specialties: Dict[int, Any],
+    insurance: Dict[int, Any]
+) -> Dict[int, Tuple[str, Dict[str, Any]]]:
+    """
+    Clinic id -> (searchable text, result row) for the clinic BM25 index. The
+    text covers the name, description, specialties and insurers.
+    """
+    documents = {}
+    for clinic in clinics:
+        clinic_specialties = list(specialties.get(clinic["id"], ()))
+        clinic_insurance = list(insurance.get(clinic["id"], ()))
+        text = " ".join([clinic["name"], clinic.get("description") or ""] + clinic_specialties + clinic_insurance)
+        documents[clinic["id"]] = (text, {
+            "clinic_id": clinic["id"],
+            "name": clinic["name"],
+            "description": clinic.get("description", ""),
+            "location": clinic.get("location", ""),
+            "rating": clinic.get("rating", 0),
+            "accepting_new": clinic.get("accepting_new", False),
+            "specialties": clinic_specialties,
+            "insurance_accepted": clinic_insurance
+        })
+    return documents
+
+
+@dataclass(frozen=True)
+class ReferenceSnapshot:
+    """Immutable, id-indexed copy of the slowly changing reference tables."""
+    clinics: Dict[int, Dict[str, Any]]
+    clinic_specialties: Dict[int, Tuple[str, ...]]
+    clinic_insurance: Dict[int, Tuple[str, ...]]
+    articles: Dict[int, Dict[str, Any]]
+    article_authors: Dict[int, Any]
+    loaded_at: float
+
+
+class ReferenceData:
+    """
+    In-memory snapshot of clinics, specialty and insurance names, article
+    metadata and authors. The snapshot is built at startup and refreshed in the
+    background; a snapshot older than the TTL is never served, so a stuck
+    refresh degrades to querying Supabase rather than serving stale data.
+    Each refresh also brings the clinic BM25 index up to date.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.snapshot: Optional[ReferenceSnapshot] = None
+        self.clinic_index = BM25Index(k1=settings.BM25_K1, b=settings.BM25_B)
+        self._clinic_vectors = VectorIndex.empty(settings.EMBEDDING_DIM)
+        self._clinic_vectors_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+        self._vectors_lock = asyncio.Lock()
+        self._pending_refresh: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def build_sync() -> ReferenceSnapshot:
+        clinics_response = supabase.bulk.table("clinics").select("*").execute()
+        specialties_response = supabase.bulk.table("clinic_specialties").select(
+            "clinic_id, specialties(name)"
+        ).execute()
+        insurance_response = supabase.bulk.table("clinic_insurance").select(
+            "clinic_id, insurance_providers(name)"
+        ).execute()
+        articles_response = supabase.bulk.table("articles").select("*").execute()
+        authors_response = supabase.bulk.table("article_authors").select(
+            "article_id, authors(name, title, avatar)"
+        ).execute()
+
+        clinics = {
+            row["id"]: {key: _intern(value) for key, value in row.items()}
+            for row in clinics_response.data or []
+        }
+
+        specialties: Dict[int, List[str]] = {clinic_id: [] for clinic_id in clinics}
+        for item in specialties_response.data or []:
+            if item.get("specialties") and "name" in item["specialties"]:
+                specialties.setdefault(item["clinic_id"], []).append(_intern(item["specialties"]["name"]))
+
+        insurance: Dict[int, List[str]] = {clinic_id: [] for clinic_id in clinics}
+        for item in insurance_response.data or []:
+            if item.get("insurance_providers") and "name" in item["insurance_providers"]:
+                insurance.setdefault(item["clinic_id"], []).append(_intern(item["insurance_providers"]["name"]))
+
+        articles = {
+            row["id"]: {key: _intern(value) for key, value in row.items()}
+            for row in articles_response.data or []
+        }
+        authors: Dict[int, Any] = {}
+        for row in authors_response.data or []:
+            authors.setdefault(row["article_id"], row["authors"])
+
+        return ReferenceSnapshot(
+            clinics=clinics,
+            clinic_specialties={clinic_id: tuple(names) for clinic_id, names in specialties.items()},
+            clinic_insurance={clinic_id: tuple(names) for clinic_id, names in insurance.items()},
+            articles=articles,
+            article_authors=authors,
+            loaded_at=time.time()
+        )
+
+    def current(self) -> Optional[ReferenceSnapshot]:
+        """The snapshot if it is within its TTL, otherwise None."""
+        snapshot = self.snapshot
+        if snapshot is None or time.time() - snapshot.loaded_at > self.ttl:
+            return None
+        return snapshot
+
+    async def refresh(self) -> None:
+        async with self._lock:
+            started = time.perf_counter()
+            snapshot = await run_blocking(self.build_sync)
+            reindexed = await run_blocking(self.clinic_index.sync, clinic_documents(
+                list(snapshot.clinics.values()), snapshot.clinic_specialties, snapshot.clinic_insurance
+            ))
+            self.snapshot = snapshot
+            logger.info(
+                f"Reference data refreshed: {len(snapshot.clinics)} clinics ({reindexed} re-indexed), "
+                f"{len(snapshot.articles)} articles in {time.perf_counter() - started:.2f}s"
+            )
+
+    async def clinic_vectors(self) -> VectorIndex:
+        """
+        Dense index of the clinic documents (the text the ingestion embeds),
+        for scoring many queries against all clinics at once. It is built on
+        first use and brought up to date whenever a newer snapshot is loaded;
+        only clinics whose text changed are re-embedded. Payloads are result
+        rows shaped like the ``search_clinics`` RPC after hydration.
+        """
+        snapshot = self.current()
+        if snapshot is None:
+            await self.refresh()
+            snapshot = self.snapshot
+        if snapshot is None or snapshot.loaded_at == self._clinic_vectors_at:
+            return self._clinic_vectors
+        async with self._vectors_lock:
+            if snapshot.loaded_at == self._clinic_vectors_at:
+                return self._clinic_vectors
+            documents = clinic_documents(
+                list(snapshot.clinics.values()), snapshot.clinic_specialties, snapshot.clinic_insurance
+            )
+            index = self._clinic_vectors
+            changed = []
+            for clinic_id, (text, row) in documents.items():
+                key, digest = str(clinic_id), content_hash(text)
+                position = index.key_to_row.get(key)
+                if position is None or index.hashes[position] != digest:
+                    changed.append((key, clinic_id, digest, row, text))
+            removed = [key for key in index.keys if int(key) not in documents]
+            vectors = await aget_embeddings([entry[4] for entry in changed]) if changed else []
+            # Clinics whose embedding failed (zero vectors) are retried on the next snapshot
+            entries = [entry[:4] + (vector,) for entry, vector in zip(changed, vectors) if any(vector)]
+            if entries or removed:
+                index = index.updated(entries, removed)
+            self._clinic_vectors = index
+            self._clinic_vectors_at = snapshot.loaded_at if len(entries) == len(changed) else None
+            return index
+
+    def invalidate(self) -> None:
+        """
+        Drop the snapshot after the underlying tables changed. Lookups go to
+        Supabase until the rebuild that is scheduled here completes.
+        """
+        self.snapshot = None
+        self.schedule_refresh()
+
+    def schedule_refresh(self) -> None:
+        """Start a background rebuild unless one is already running."""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if self._pending_refresh is None or self._pending_refresh.done():
+            self._pending_refresh = loop.create_task(self.refresh())
+
+    async def run_refresh_loop(self, interval: float, initial_delay: float = 0.0) -> None:
+        """Build the snapshot after ``initial_delay`` seconds, then rebuild it every ``interval`` seconds."""
+        await asyncio.sleep(initial_delay)
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Reference data refresh failed: {str(e)}")
+            await asyncio.sleep(interval)
+
+
+reference_data = ReferenceData(ttl=settings.REFERENCE_DATA_TTL_SECONDS)
@@ -0,0 +1,62 @@
+from typing import Any, Awaitable, Dict, Optional
+import asyncio
+import logging
+import time
+
+from app.core.context import RequestContext
+
+logger = logging.getLogger(__name__)
+
+
+class StageScheduler:
+    """
+    Runs the stages of one request as concurrent tasks. Each stage gets its
+    own timeout and a default to degrade to, and its wall time is recorded in
+    the request context. Stages that are no longer needed can be cancelled.
+    """
+
+    def __init__(self, context: RequestContext):
+        self.context = context
+        self.tasks: Dict[str, asyncio.Task] = {}
+
+    async def _run(self, name: str, awaitable: Awaitable[Any], timeout: Optional[float]) -> Any:
+        started = time.perf_counter()
+        try:
+            return await asyncio.wait_for(awaitable, timeout)
+        finally:
+            self.context.timings[name] = time.perf_counter() - started
+
+    def start(self, name: str, awaitable: Awaitable[Any], timeout: Optional[float] = None) -> asyncio.Task:
+        """Schedule a stage immediately; its result is collected with ``result``."""
+        task = asyncio.create_task(self._run(name, awaitable, timeout))
+        self.tasks[name] = task
+        return task
+
+    def started(self, name: str) -> bool:
+        return name in self.tasks
+
+    async def result(self, name: str, default: Any = None) -> Any:
+        """Wait for a stage, returning ``default`` if it timed out, failed or was never started."""
+        task = self.tasks.get(name)
+        if task is None:
+            return default
+        try:
+            return await task
+        except asyncio.TimeoutError:
+            logger.warning(f"Stage '{name}' timed out, continuing without it")
+        except asyncio.CancelledError:
+            if not task.cancelled():
+                raise
+        except Exception as e:
+            logger.error(f"Stage '{name}' failed: {str(e)}")
+        return default
+
+    def cancel(self, name: str) -> None:
+        """Discard a speculative stage whose result is no longer needed."""
+        task = self.tasks.pop(name, None)
+        if task is not None and not task.done():
+            task.cancel()
+
+    def cancel_all(self) -> None:
+        for name in list(self.tasks):
+            self.cancel(name)
@@ -0,0 +1,108 @@
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import asyncio
+import hashlib
+import json
+import logging
+
+from app.core.context import RequestContext
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _Flight:
+    task: asyncio.Task
+    context: RequestContext
+    waiters: int = 0
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent requests: the first caller for a key
+    (the leader) starts the computation as its own task and later callers
+    await the same task, so every caller gets the one result. The task is
+    shielded from its callers: a caller that disconnects only stops waiting,
+    and the computation is cancelled once no caller is left. Followers get
+    the leader's stage timings and token usage in their own context.
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, _Flight] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.stats: Dict[str, int] = {
+            "leaders": 0,
+            "coalesced": 0,
+            "leaders_cancelled": 0,
+            "abandoned": 0,
+            "in_flight": 0,
+        }
+
+    @staticmethod
+    def key(query: str, chat_history: List[Dict[str, str]]) -> str:
+        """Case- and whitespace-insensitive query, plus a digest of the history it follows."""
+        history = hashlib.sha1(
+            json.dumps([[m.get("role"), m.get("content")] for m in chat_history]).encode("utf-8")
+        ).hexdigest()
+        return " ".join(query.split()).casefold() + "\0" + history
+
+    def _forget(self, key: str, flight: _Flight) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+            self.stats["in_flight"] = len(self._flights)
+
+    async def do(self, key: str, context: RequestContext, run: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Return the result of ``run()`` for ``key``, sharing a computation that
+        is already in flight. ``run`` is only called by the leader, and must
+        record into ``context``.
+        """
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # Tasks belong to one event loop
+            self._loop = loop
+            self._flights = {}
+
+        flight = self._flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _Flight(task=loop.create_task(run()), context=context)
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+            self.stats["leaders"] += 1
+            self.stats["in_flight"] = len(self._flights)
+        else:
+            self.stats["coalesced"] += 1
+
+        flight.waiters += 1
+        try:
+            result = await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            flight.waiters -= 1
+            if leader:
+                self.stats["leaders_cancelled"] += 1
+            if flight.waiters == 0 and not flight.task.done():
+                # Nobody is waiting for the answer any more
+                logger.info("Cancelling a coalesced request that every caller abandoned")
+                self._forget(key, flight)
+                flight.task.cancel()
+                self.stats["abandoned"] += 1
+            raise
+        flight.waiters -= 1
+
+        if not leader:
+            shared = flight.context
+            context.query_embedding = shared.query_embedding
+            context.timings.update(shared.timings)
+            context.usage.update(shared.usage)
+            context.outcome = "coalesced" if shared.outcome in ("ok", "cached") else shared.outcome
+        return result
+
+
+singleflight = SingleFlight()
+metrics.register_stats(
+    "rag_singleflight",
+    "Chat requests that led a computation, were coalesced into one in flight, or were cancelled.",
+    lambda: singleflight.stats
+)
@@ -0,0 +1,630 @@
+from typing import List, Dict, Any, Optional, Iterable, Tuple
+import asyncio
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+
+import numpy as np
+
+from app.utils.supabase import supabase
+from app.utils.concurrency import run_blocking
+from app.utils.embeddings import get_embeddings, parse_embedding_from_postgres
+from app.core.lexical_index import BM25Index
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def content_hash(text: str) -> str:
+    """Stable hash used to detect changed index entries."""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class VectorIndex:
+    """
+    Immutable in-process vector index.
+
+    Rows live in one contiguous, L2-normalised float32 matrix ordered by group
+    (e.g. article id), alongside parallel key/hash/payload arrays. Scoring a
+    query is a single matrix-vector product; updates build a new index so that
+    readers never observe a half-written one.
+    """
+
+    def __init__(
+        self,
+        dim: int,
+        keys: List[str],
+        groups: np.ndarray,
+        hashes: List[str],
+        payloads: List[Any],
+        matrix: np.ndarray
+    ):
+        self.dim = dim
+        self.keys = keys
+        self.groups = groups
+        self.hashes = hashes
+        self.payloads = payloads
+        self.matrix = matrix
+        self.key_to_row = {key: row for row, key in enumerate(keys)}
+
+    @classmethod
+    def empty(cls, dim: int) -> "VectorIndex":
+        return cls(dim, [], np.zeros(0, dtype=np.int64), [], [], np.zeros((0, dim), dtype=np.float32))
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def vector(self, row: int) -> np.ndarray:
+        """The normalised embedding of one row."""
+        return self.matrix[row]
+
+    def rows(self, rows) -> np.ndarray:
+        """The normalised embeddings of several rows, as float32."""
+        return self.matrix[rows]
+
+    @staticmethod
+    def normalize(vectors: np.ndarray) -> np.ndarray:
+        """L2-normalise rows in float32; zero rows stay zero."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def updated(
+        self,
+        entries: Iterable[Tuple[str, int, str, Any, Any]],
+        removed: Iterable[str] = ()
+    ) -> "VectorIndex":
+        """
+        Return a new index with ``entries`` (key, group, hash, payload, vector)
+        inserted or replaced and ``removed`` keys dropped. Unchanged rows are
+        copied without re-normalising.
+        """
+        entries = list(entries)
+        dropped = set(removed) | {entry[0] for entry in entries}
+        keep = [row for row, key in enumerate(self.keys) if key not in dropped]
+
+        keys = [self.keys[row] for row in keep] + [entry[0] for entry in entries]
+        groups = np.concatenate((
+            self.groups[keep],
+            np.array([entry[1] for entry in entries], dtype=np.int64)
+        ))
+        hashes = [self.hashes[row] for row in keep] + [entry[2] for entry in entries]
+        payloads = [self.payloads[row] for row in keep] + [entry[3] for entry in entries]
+        if entries:
+            new_rows = self.normalize(np.vstack([entry[4] for entry in entries]))
+        else:
+            new_rows = np.zeros((0, self.dim), dtype=np.float32)
+        matrix = np.concatenate((self.rows(keep), new_rows))
+
+        order = np.argsort(groups, kind="stable")
+        return VectorIndex(
+            self.dim,
+            [keys[row] for row in order],
+            groups[order],
+            [hashes[row] for row in order],
+            [payloads[row] for row in order],
+            np.ascontiguousarray(matrix[order])
+        )
+
+    def score(self, query_embedding, shortlist: Optional[int] = None) -> np.ndarray:
+        """
+        Cosine similarity of the query against every row. ``shortlist`` is the
+        number of rows the caller will choose from; approximate indexes use it
+        to rescore their best candidates exactly.
+        """
+        query = self.normalize(np.asarray(query_embedding, dtype=np.float32))
+        return self.matrix @ query
+
+    def score_many(self, query_embeddings, shortlist: Optional[int] = None) -> np.ndarray:
+        """
+        Cosine similarities of several queries at once, one row per query: a
+        single matrix-matrix product instead of a matrix-vector product each.
+        """
+        queries = self.normalize(np.asarray(query_embeddings, dtype=np.float32).reshape(-1, self.dim))
+        return queries @ self.matrix.T
+
+    def save(self, path: str, dtype: str = "int8", rescore: bool = True, extra: Any = None) -> str:
+        """
+        Write the index to a new version directory under ``path`` and make it
+        current. Vectors are stored as int8 with a float32 scale per row, or
+        as float16; with ``rescore`` the float32 rows are kept too, for exact
+        rescoring of candidates. ``extra`` is JSON stored alongside.
+        Returns the version written.
+        """
+        version = f"{time.time():.6f}-{os.getpid()}"
+        directory = os.path.join(path, version)
+        os.makedirs(directory)
+        matrix = np.ascontiguousarray(self.rows(np.arange(len(self))), dtype=np.float32)
+        if dtype == "int8":
+            scales = np.abs(matrix).max(axis=1) / 127 if len(matrix) else np.zeros(0, dtype=np.float32)
+            scales[scales == 0] = 1.0
+            np.round(matrix / scales[:, None]).astype(np.int8).tofile(os.path.join(directory, "vectors.bin"))
+            scales.astype(np.float32).tofile(os.path.join(directory, "scales.bin"))
+        elif dtype == "float16":
+            matrix.astype(np.float16).tofile(os.path.join(directory, "vectors.bin"))
+        else:
+            raise ValueError(f"unsupported embedding dtype {dtype}")
+        if rescore:
+            matrix.tofile(os.path.join(directory, "rescore.bin"))
+        with open(os.path.join(directory, "meta.json"), "w", encoding="utf-8") as handle:
+            json.dump({
+                "dim": self.dim,
+                "count": len(self),
+                "dtype": dtype,
+                "rescore": rescore,
+                "keys": self.keys,
+                "groups": self.groups.tolist(),
+                "hashes": self.hashes,
+                "payloads": self.payloads,
+                "extra": extra,
+            }, handle, default=str)
+
+        # Readers follow the CURRENT pointer, which is swapped atomically. Older
+        # versions are removed; processes that still map them keep their pages.
+        pointer = os.path.join(path, f"CURRENT.{version}")
+        with open(pointer, "w", encoding="utf-8") as handle:
+            handle.write(version)
+        os.replace(pointer, os.path.join(path, "CURRENT"))
+        for name in os.listdir(path):
+            if name not in (version, "CURRENT", "lock") and os.path.isdir(os.path.join(path, name)):
+                shutil.rmtree(os.path.join(path, name), ignore_errors=True)
+        return version
+
+
+class QuantizedVectorIndex(VectorIndex):
+    """
+    Read-only index over vectors stored by ``VectorIndex.save``, opened with
+    ``numpy.memmap`` so that every worker shares one page-cached copy.
+
+    Scores are computed from the int8 (or float16) codes block by block. When
+    the float32 rows were stored, the best ``shortlist`` rows are rescored
+    exactly, so the top results match the float32 index; rows outside the
+    shortlist score ``-inf``.
+    """
+
+    # Small blocks keep the decoded float32 rows in cache
+    BLOCK_ROWS = 256
+
+    def __init__(self, dim, keys, groups, hashes, payloads, codes, scales, exact, version: str):
+        super().__init__(dim, keys, groups, hashes, payloads, matrix=None)
+        self.codes = codes
+        self.scales = scales
+        self.exact = exact
+        self.version = version
+
+    @staticmethod
+    def current_version(path: str) -> Optional[str]:
+        try:
+            with open(os.path.join(path, "CURRENT"), encoding="utf-8") as handle:
+                return handle.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    @classmethod
+    def open(cls, path: str, version: Optional[str] = None) -> Tuple["QuantizedVectorIndex", Any]:
+        """Map the current (or given) version under ``path``. Returns the index and its ``extra``."""
+        version = version or cls.current_version(path)
+        if version is None:
+            raise FileNotFoundError(f"no embedding index under {path}")
+        directory = os.path.join(path, version)
+        with open(os.path.join(directory, "meta.json"), encoding="utf-8") as handle:
+            meta = json.load(handle)
+        shape = (meta["count"], meta["dim"])
+
+        def mapped(name: str, dtype, shape):
+            if not shape[0]:
+                return np.zeros(shape, dtype=dtype)
+            return np.memmap(os.path.join(directory, name), dtype=dtype, mode="r", shape=shape)
+
+        codes = mapped("vectors.bin", np.int8 if meta["dtype"] == "int8" else np.float16, shape)
+        scales = mapped("scales.bin", np.float32, (meta["count"],)) if meta["dtype"] == "int8" else None
+        exact = mapped("rescore.bin", np.float32, shape) if meta["rescore"] else None
+        index = cls(
+            meta["dim"], meta["keys"], np.asarray(meta["groups"], dtype=np.int64), meta["hashes"],
+            [tuple(payload) if isinstance(payload, list) else payload for payload in meta["payloads"]],
+            codes, scales, exact, version
+        )
+        return index, meta["extra"]
+
+    def _decode(self, rows) -> np.ndarray:
+        vectors = np.asarray(self.codes[rows], dtype=np.float32)
+        if self.scales is not None:
+            vectors *= np.asarray(self.scales[rows])[..., None]
+        return self.normalize(vectors)
+
+    def vector(self, row: int) -> np.ndarray:
+        return np.asarray(self.exact[row]) if self.exact is not None else self._decode(row)
+
+    def rows(self, rows) -> np.ndarray:
+        return np.asarray(self.exact[rows]) if self.exact is not None else self._decode(rows)
+
+    def score(self, query_embedding, shortlist: Optional[int] = None) -> np.ndarray:
+        query = self.normalize(np.asarray(query_embedding, dtype=np.float32))
+        count = len(self)
+        scores = np.empty(count, dtype=np.float32)
+        block = np.empty((self.BLOCK_ROWS, self.dim), dtype=np.float32)
+        for start in range(0, count, self.BLOCK_ROWS):
+            end = min(start + self.BLOCK_ROWS, count)
+            decoded = block[:end - start]
+            decoded[...] = self.codes[start:end]
+            np.matmul(decoded, query, out=scores[start:end])
+        if self.scales is not None:
+            scores *= self.scales
+        if self.exact is None or shortlist is None or shortlist >= count:
+            return scores
+        candidates = np.sort(np.argpartition(-scores, shortlist - 1)[:shortlist])
+        rescored = np.full(count, -np.inf, dtype=np.float32)
+        rescored[candidates] = self.exact[candidates] @ query
+        return rescored
+
+    def score_many(self, query_embeddings, shortlist: Optional[int] = None) -> np.ndarray:
+        queries = self.normalize(np.asarray(query_embeddings, dtype=np.float32).reshape(-1, self.dim))
+        count = len(self)
+        # Rows by queries, so every block's product is written contiguously
+        scores = np.empty((count, len(queries)), dtype=np.float32)
+        block = np.empty((self.BLOCK_ROWS, self.dim), dtype=np.float32)
+        for start in range(0, count, self.BLOCK_ROWS):
+            end = min(start + self.BLOCK_ROWS, count)
+            decoded = block[:end - start]
+            decoded[...] = self.codes[start:end]
+            np.matmul(decoded, queries.T, out=scores[start:end])
+        if self.scales is not None:
+            scores *= self.scales[:, None]
+        if self.exact is None or shortlist is None or shortlist >= count:
+            return scores.T
+        candidates = np.argpartition(-scores, shortlist - 1, axis=0)[:shortlist].T
+        # The union of every query's candidates is read from the float32 file once
+        union = np.unique(candidates)
+        exact = self.exact[union] @ queries.T
+        rescored = np.full((len(queries), count), -np.inf, dtype=np.float32)
+        for i, rows in enumerate(candidates):
+            rescored[i, rows] = exact[np.searchsorted(union, rows), i]
+        return rescored
+
+    def updated(self, entries, removed=()) -> VectorIndex:
+        """Updates produce an in-memory float32 index, to be saved again."""
+        matrix = self.rows(np.arange(len(self))) if len(self) else np.zeros((0, self.dim), dtype=np.float32)
+        base = VectorIndex(self.dim, self.keys, self.groups, self.hashes, self.payloads, matrix)
+        return base.updated(entries, removed)
+
+
+class ArticleIndex:
+    """
+    Local index of article titles, introductions and sections used when the
+    ``search_article_sections`` RPC is unavailable. It is loaded once at
+    startup and refreshed incrementally: only new or changed texts are
+    embedded, and sections reuse the embeddings the ingestion stored. It
+    also keeps the BM25 index of introductions and sections that lexical
+    search runs against, whichever vector path serves a query.
+
+    With a storage ``path`` the vectors live on disk in quantized form and
+    are memory-mapped, so all workers share them. One worker at a time
+    refreshes the stored index; a worker that finds a version written within
+    the last half refresh interval maps it instead of refreshing again.
+    """
+
+    # Queries scored per matrix-matrix product; bounds the score matrix to
+    # QUERY_BLOCK x rows floats
+    QUERY_BLOCK = 64
+    # Section ids per request when reading stored embeddings
+    EMBEDDING_FETCH_BATCH = 200
+
+    def __init__(self, path: str = settings.VECTOR_INDEX_PATH):
+        self.path = path
+        self.index: VectorIndex = VectorIndex.empty(settings.EMBEDDING_DIM)
+        self.lexical = BM25Index(k1=settings.BM25_K1, b=settings.BM25_B)
+        self.articles: Dict[int, Dict[str, Any]] = {}
+        self.section_keys: Dict[Tuple[int, str], str] = {}
+        self._layout: Tuple[Optional[VectorIndex], Any] = (None, None)
+        self.loaded = False
+        self.last_refresh: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def _fetch_corpus() -> Tuple[List[Dict[str, Any]], Dict[int, Dict[str, Any]], Dict[int, List[Dict[str, Any]]], Dict[int, Any]]:
+        articles_response = supabase.bulk.table("articles").select("*").execute()
+        content_response = supabase.bulk.table("article_content").select("*").execute()
+        sections_response = supabase.bulk.table("article_sections").select("id, article_id, title, content").execute()
+        authors_response = supabase.bulk.table("article_authors").select(
+            "article_id, authors(name, title, avatar)"
+        ).execute()
+
+        contents = {row["article_id"]: row for row in content_response.data or []}
+        sections: Dict[int, List[Dict[str, Any]]] = {}
+        for row in sections_response.data or []:
+            sections.setdefault(row["article_id"], []).append(row)
+        authors = {row["article_id"]: row["authors"] for row in authors_response.data or []}
+        return articles_response.data or [], contents, sections, authors
+
+    @classmethod
+    def _fetch_section_embeddings(cls, section_ids: List[int]) -> Dict[int, List[float]]:
+        """The embeddings the ingestion stored for ``section_ids``, for the sections that have one."""
+        embeddings = {}
+        for start in range(0, len(section_ids), cls.EMBEDDING_FETCH_BATCH):
+            response = supabase.bulk.table("article_sections").select("id, embedding").in_(
+                "id", section_ids[start:start + cls.EMBEDDING_FETCH_BATCH]
+            ).execute()
+            for row in response.data or []:
+                embedding = parse_embedding_from_postgres(row.get("embedding"))
+                if embedding is not None and len(embedding) == settings.EMBEDDING_DIM:
+                    embeddings[row["id"]] = embedding
+        return embeddings
+
+    def refresh_sync(self) -> int:
+        """Synchronise the index with Supabase. Returns the number of updated rows."""
+        if not self.path:
+            return self._refresh_from_source()[0]
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, "lock"), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                version = QuantizedVectorIndex.current_version(self.path)
+                if version is not None and version != getattr(self.index, "version", None):
+                    self._open(version)
+                    if time.time() - float(version.split("-")[0]) < settings.VECTOR_INDEX_REFRESH_SECONDS / 2:
+                        return 0
+                changed, removed = self._refresh_from_source()
+                if changed or removed or version is None:
+                    self._open(self.index.save(
+                        self.path,
+                        dtype=settings.VECTOR_INDEX_DTYPE,
+                        rescore=settings.VECTOR_INDEX_RESCORE,
+                        extra={
+                            "articles": self.articles,
+                            "section_keys": [[article_id, title, key] for (article_id, title), key in self.section_keys.items()]
+                        }
+                    ))
+                return changed
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _open(self, version: str) -> None:
+        """Switch to the stored index ``version``."""
+        index, extra = QuantizedVectorIndex.open(self.path, version)
+        articles = {int(article_id): meta for article_id, meta in extra["articles"].items()}
+        self.lexical.sync(self._lexical_documents(index, articles))
+        self.index = index
+        self.articles = articles
+        self.section_keys = {(article_id, title): key for article_id, title, key in extra["section_keys"]}
+        self.loaded = True
+        self.last_refresh = time.time()
+
+    @staticmethod
+    def _lexical_documents(index: VectorIndex, articles: Dict[int, Dict[str, Any]]) -> Dict[str, Tuple[str, Any]]:
+        documents = {}
+        for key, group, (kind, section) in zip(index.keys, index.groups, index.payloads):
+            article_id = int(group)
+            if kind == "section":
+                documents[key] = (section["title"] + " " + section["content"], (article_id, section))
+            elif kind == "introduction" and article_id in articles:
+                documents[key] = (articles[article_id]["introduction"] or "", (article_id, None))
+        return documents
+
+    def _refresh_from_source(self) -> Tuple[int, int]:
+        """Refresh from Supabase, embedding changed texts. Returns the changed and removed row counts."""
+        articles, contents, sections, authors = self._fetch_corpus()
+
+        metadata: Dict[int, Dict[str, Any]] = {}
+        wanted: Dict[str, Tuple[int, str, Any, str]] = {}
+        section_keys: Dict[Tuple[int, str], str] = {}
+        for article in articles:
+            content = contents.get(article["id"])
+            if not content:
+                continue
+            article_id = article["id"]
+            metadata[article_id] = {
+                "article": article,
+                "introduction": content["introduction"],
+                "author": authors.get(article_id)
+            }
+            wanted[f"title:{article_id}"] = (article_id, "title", None, article["title"])
+            wanted[f"intro:{article_id}"] = (article_id, "introduction", None, content["introduction"])
+            section_keys[(article_id, "Introduction")] = f"intro:{article_id}"
+            for section in sections.get(article_id, []):
+                text = section["title"] + " " + section["content"]
+                wanted[f"section:{article_id}:{section['id']}"] = (article_id, "section", section, text)
+                section_keys.setdefault((article_id, section["title"]), f"section:{article_id}:{section['id']}")
+
+        current = self.index
+        changed = []
+        for key, (article_id, kind, section, text) in wanted.items():
+            digest = content_hash(text or "")
+            row = current.key_to_row.get(key)
+            if row is None or current.hashes[row] != digest:
+                changed.append((key, article_id, digest, (kind, section), text))
+        removed = [key for key in current.keys if key not in wanted]
+
+        # Sections the ingestion embedded (over the same text) reuse its stored vectors
+        section_ids = [section["id"] for _, _, _, (kind, section), _ in changed if kind == "section"]
+        stored = self._fetch_section_embeddings(section_ids) if section_ids else {}
+        vectors = [
+            stored.get(section["id"]) if kind == "section" else None
+            for _, _, _, (kind, section), _ in changed
+        ]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            for i, vector in zip(missing, get_embeddings([changed[i][4] for i in missing])):
+                vectors[i] = vector
+        # Texts whose embedding failed come back as zero vectors; leave them out
+        # (keeping any previous row) so the next refresh retries them
+        embedded = [
+            entry[:4] + (vector,) for entry, vector in zip(changed, vectors)
+            if any(vector) or not entry[4]
+        ]
+        if len(embedded) < len(changed):
+            logger.warning(f"Embedding failed for {len(changed) - len(embedded)} index rows, retrying on the next refresh")
+        changed = embedded
+        index = current.updated(changed, removed) if changed or removed else current
+        self.lexical.sync(self._lexical_documents(index, metadata))
+        self.index = index
+        self.articles = metadata
+        self.section_keys = section_keys
+        self.loaded = True
+        self.last_refresh = time.time()
+        return len(changed), len(removed)
+
+    async def refresh(self) -> None:
+        async with self._lock:
+            started = time.perf_counter()
+            changed = await run_blocking(self.refresh_sync)
+            logger.info(
+                f"Article index refreshed: {len(self.index)} rows, {changed} updated "
+                f"in {time.perf_counter() - started:.2f}s"
+            )
+
+    async def ensure_loaded(self) -> None:
+        if not self.loaded:
+            await self.refresh()
+
+    async def run_refresh_loop(self, interval: float, initial_delay: float = 0.0) -> None:
+        """Load the index after ``initial_delay`` seconds, then keep it up to date every ``interval`` seconds."""
+        await asyncio.sleep(initial_delay)
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Article index refresh failed: {str(e)}")
+            await asyncio.sleep(interval)
+
+    def section_vector(self, article_id: int, section_title: str) -> Optional[np.ndarray]:
+        """The indexed (normalised) embedding of an article section, if it is known."""
+        index = self.index
+        row = index.key_to_row.get(self.section_keys.get((article_id, section_title)))
+        return None if row is None else index.vector(row)
+
+    def search_sections(self, query_embedding, top_k: int) -> List[Dict[str, Any]]:
+        """
+        Return the ``top_k`` sections and introductions, possibly several per
+        article, shaped like the rows of the ``search_article_sections`` RPC
+        after hydration.
+        """
+        index = self.index
+        if not len(index):
+            return []
+        scores = index.score(query_embedding, shortlist=top_k * settings.VECTOR_INDEX_RESCORE_FACTOR)
+        return self._top_sections(index, scores, self._section_layout(index), top_k)
+
+    def search_sections_many(self, query_embeddings, top_k: int) -> List[List[Dict[str, Any]]]:
+        """
+        ``search_sections`` for several queries, scored together as one
+        matrix-matrix product per block of ``QUERY_BLOCK`` queries.
+        """
+        index = self.index
+        queries = np.asarray(query_embeddings, dtype=np.float32).reshape(-1, settings.EMBEDDING_DIM)
+        if not len(index):
+            return [[] for _ in queries]
+        layout = self._section_layout(index)
+        results = []
+        for start in range(0, len(queries), self.QUERY_BLOCK):
+            scores = index.score_many(
+                queries[start:start + self.QUERY_BLOCK], shortlist=top_k * settings.VECTOR_INDEX_RESCORE_FACTOR
+            )
+            results.extend(self._top_sections(index, query_scores, layout, top_k) for query_scores in scores)
+        return results
+
+    def _section_layout(self, index: VectorIndex) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Rows holding sections and introductions (titles are not returned as
+        context), where each article's rows start among them, and each
+        article's title row (-1 if it has none). Built once per index.
+        """
+        if self._layout[0] is not index:
+            rows = np.array([
+                row for row, (kind, _) in enumerate(index.payloads) if kind != "title"
+            ], dtype=np.int64)
+            groups = index.groups[rows]
+            starts = np.flatnonzero(np.diff(groups, prepend=-1)) if len(rows) else np.zeros(0, dtype=np.int64)
+            title_rows = np.array([
+                index.key_to_row.get(f"title:{int(group)}", -1) for group in groups[starts]
+            ], dtype=np.int64)
+            self._layout = (index, (rows, starts, title_rows))
+        return self._layout[1]
+
+    @staticmethod
+    def _article_scores(scores: np.ndarray, layout: Tuple[np.ndarray, np.ndarray, np.ndarray]) -> np.ndarray:
+        """
+        Scores of the section and introduction rows, where an article whose
+        title matches better than all of its rows has its best row raised to
+        the title's score. Articles thus rank by the best of their title,
+        introduction and sections, as in the original fallback search.
+        """
+        rows, starts, title_rows = layout
+        candidate_scores = scores[rows]
+        best = np.maximum.reduceat(candidate_scores, starts)
+        titles = np.where(title_rows >= 0, scores[np.maximum(title_rows, 0)], -np.inf)
+        raised = np.flatnonzero(titles > best)
+        if len(raised):
+            lengths = np.diff(np.append(starts, len(rows)))
+            # First row of each article holding its best score
+            is_best = candidate_scores == np.repeat(best, lengths)
+            positions = np.flatnonzero(is_best)
+            _, first = np.unique(np.repeat(np.arange(len(starts)), lengths)[positions], return_index=True)
+            candidate_scores[positions[first][raised]] = titles[raised]
+        return candidate_scores
+
+    def _top_sections(self, index: VectorIndex, scores: np.ndarray,
+                      layout: Tuple[np.ndarray, np.ndarray, np.ndarray], top_k: int) -> List[Dict[str, Any]]:
+        candidates = layout[0]
+        if not len(candidates):
+            return []
+        candidate_scores = self._article_scores(scores, layout)
+        top_k = min(top_k, len(candidates))
+        best = np.argpartition(-candidate_scores, top_k - 1)[:top_k]
+        best = best[np.argsort(-candidate_scores[best])]
+        best = best[np.isfinite(candidate_scores[best])]
+
+        results = []
+        for position in best:
+            row = candidates[position]
+            _, section = index.payloads[row]
+            result = self._section_row(int(index.groups[row]), section, float(candidate_scores[position]))
+            if result is not None:
+                results.append(result)
+        return results
+
+    def search_lexical(self, query: str, query_embedding, top_k: int) -> List[Dict[str, Any]]:
+        """
+        Return the ``top_k`` sections and introductions by BM25, in the same
+        shape as ``search_sections``. ``similarity`` is still the cosine
+        similarity to the query, so lexical and vector hits compare.
+        """
+        hits = self.lexical.search(query, top_k)
+        if not hits:
+            return []
+        index = self.index
+        query_vector = VectorIndex.normalize(np.asarray(query_embedding, dtype=np.float32))
+        results = []
+        for key, _ in hits:
+            article_id, section = self.lexical.payload(key)
+            row = index.key_to_row.get(key)
+            similarity = float(index.vector(row) @ query_vector) if row is not None else None
+            result = self._section_row(article_id, section, similarity)
+            if result is not None:
+                results.append(result)
+        return results
+
+    def _section_row(self, article_id: int, section: Optional[Dict[str, Any]],
+                     similarity: Optional[float]) -> Optional[Dict[str, Any]]:
+        meta = self.articles.get(article_id)
+        if meta is None:
+            return None
+        article = meta["article"]
+        return {
+            "id": article_id,
+            "title": article["title"],
+            "category": article["category"],
+            "section_title": section["title"] if section else "Introduction",
+            "section_content": section["content"] if section else meta["introduction"],
+            "author": meta["author"],
+            "similarity": similarity,
+            "source_type": "section",
+            "read_time": article.get("read_time", "5 min")
+        }
+
+
+article_index = ArticleIndex()
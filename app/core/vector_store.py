@@ -1,281 +1,385 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable, Hashable
+import numpy as np
 from app.utils.supabase import supabase
-from app.utils.embeddings import get_embedding, format_embedding_for_postgres, cosine_similarity
+from app.utils.concurrency import run_blocking
+from app.utils.embeddings import aget_embedding, format_embedding_for_postgres
+from app.core.vector_index import article_index
+from app.core.lexical_index import BM25Index, reciprocal_rank_fusion
+from app.core.reference_data import reference_data
+from app.core.hydration import Hydrator
+from app.utils.metrics import fallbacks_total, stage_seconds
 from app.config import settings
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
 
 class VectorStore:
     @staticmethod
-    async def search_articles(query: str, top_k: int = settings.MAX_ARTICLE_RESULTS) -> List[Dict[str, Any]]:
-        """Search for relevant articles using vector similarity."""
+    async def search_articles(
+        query: str,
+        top_k: int = settings.MAX_ARTICLE_RESULTS,
+        query_embedding: Optional[List[float]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Search for relevant article sections using vector similarity, fused
+        with BM25 hits so exact terms (medication names, providers) are not
+        missed. Several sections of one article may be returned; ContextPacker
+        merges them. Pass ``query_embedding`` to reuse a vector already
+        computed for this request.
+        """
         try:
-            query_embedding = get_embedding(query)
+            if query_embedding is None:
+                query_embedding = await aget_embedding(query)
             embedding_str = format_embedding_for_postgres(query_embedding)
-            query = f"""
-            SELECT * FROM search_article_sections('{embedding_str}', {settings.SIMILARITY_THRESHOLD}, {top_k});
-            """
             
+            fallback_reason = "empty"
             try:
-                sections_response = supabase.rpc(
-                    "search_article_sections", 
-                    {
-                        "query_embedding": embedding_str,
-                        "match_threshold": settings.SIMILARITY_THRESHOLD,
-                        "match_count": top_k
-                    }
-                ).execute()
-                sections_data = sections_response.data if sections_response else []
-                results = []
-                
-                for section in sections_data:
-                    article_id = section["article_id"]
-                    article_response = supabase.table("articles").select("*").eq("id", article_id).single().execute()
-                    if not article_response.data:
-                        continue
-
-                    article = article_response.data
-                    author_response = supabase.table("article_authors").select(
-                        "authors(name, title, avatar)"
-                    ).eq("article_id", article_id).single().execute()
-                    
-                    author = author_response.data["authors"] if author_response.data else None
-                    
-                    results.append({
-                        "id": article_id,
-                        "title": article["title"],
-                        "category": article["category"], 
-                        "section_title": section["section_title"],
-                        "section_content": section["section_content"],
-                        "author": author,
-                        "similarity": section["similarity"],
-                        "source_type": "section",
-                        "read_time": article["read_time"]
-                    })
-                
-                if results:
-                    return results
+                with stage_seconds.time(stage="articles_rpc"):
+                    sections_data = await VectorStore.article_rpc(embedding_str, top_k)
+                with stage_seconds.time(stage="articles_hydration"):
+                    articles, authors = await Hydrator.hydrate_articles(
+                        section["article_id"] for section in sections_data
+                    )
+                results = VectorStore.article_rows(sections_data, articles, authors)
                 
             except Exception as e:
-                print(f"pgvector search failed: {str(e)}")
-            print("Falling back to manual similarity search")
-            return await VectorStore.search_articles_fallback(query, top_k)
+                results = []
+                fallback_reason = "error"
+                logger.warning(f"pgvector search failed: {str(e)}")
+            if not results:
+                logger.info("Falling back to manual similarity search")
+                fallbacks_total.inc(search="articles", reason=fallback_reason)
+                with stage_seconds.time(stage="articles_fallback"):
+                    results = await VectorStore.search_articles_fallback(query, top_k, query_embedding)
+            if settings.LEXICAL_SEARCH_ENABLED:
+                results = VectorStore.fuse(
+                    results,
+                    article_index.search_lexical(query, query_embedding, top_k),
+                    key=lambda row: (row["id"], row["section_title"]),
+                    top_k=top_k
+                )
+            return results
             
         except Exception as e:
-            print(f"Error searching articles: {str(e)}")
+            logger.error(f"Error searching articles: {str(e)}")
             return []
     
     @staticmethod
-    async def search_clinics(query: str, top_k: int = settings.MAX_CLINIC_RESULTS) -> List[Dict[str, Any]]:
-        """Search for relevant clinics using vector similarity."""
+    async def search_clinics(
+        query: str,
+        top_k: int = settings.MAX_CLINIC_RESULTS,
+        query_embedding: Optional[List[float]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Search for relevant clinics using vector similarity, fused with BM25
+        hits over clinic names, descriptions, specialties and insurers.
+        Pass ``query_embedding`` to reuse a vector already computed for this request.
+        """
         try:
-            query_embedding = get_embedding(query)
+            if query_embedding is None:
+                query_embedding = await aget_embedding(query)
             embedding_str = format_embedding_for_postgres(query_embedding)
+            fallback_reason = "empty"
             try:
-                clinics_response = supabase.rpc(
-                    "search_clinics",
-                    {
-                        "query_embedding": embedding_str,
-                        "match_threshold": settings.SIMILARITY_THRESHOLD,
-                        "match_count": top_k
-                    }
-                ).execute()
-                
-                clinics_data = clinics_response.data if clinics_response else []
+                with stage_seconds.time(stage="clinics_rpc"):
+                    clinics_data = await VectorStore.clinic_rpc(embedding_str, top_k)
                 
                 if clinics_data:
-                    enhanced_clinics = []
-                    for clinic in clinics_data:
-                        clinic_id = clinic["clinic_id"]
-                        specialties_response = supabase.table("clinic_specialties").select(
-                            "specialties(name)"
-                        ).eq("clinic_id", clinic_id).execute()
-                        
-                        specialties = [
-                            item["specialties"]["name"] 
-                            for item in specialties_response.data
-                        ] if specialties_response.data else []
-
-                        insurance_response = supabase.table("clinic_insurance").select(
-                            "insurance_providers(name)"
-                        ).eq("clinic_id", clinic_id).execute()
-                        
-                        insurance = [
-                            item["insurance_providers"]["name"] 
-                            for item in insurance_response.data
-                        ] if insurance_response.data else []
-                        
-                        enhanced_clinics.append({
-                            **clinic,
-                            "specialties": specialties,
-                            "insurance_accepted": insurance
-                        })
-                    
-                    return enhanced_clinics
+                    with stage_seconds.time(stage="clinics_hydration"):
+                        specialties, insurance = await Hydrator.hydrate_clinics(
+                            clinic["clinic_id"] for clinic in clinics_data
+                        )
+                    enhanced_clinics = VectorStore.clinic_rows(clinics_data, specialties, insurance)
+                    return await VectorStore.fuse_lexical_clinics(query, enhanced_clinics, top_k)
                     
             except Exception as e:
-                print(f"pgvector clinic search failed: {str(e)}")
-            return await VectorStore.search_clinics_fallback(query, top_k)
+                fallback_reason = "error"
+                logger.warning(f"pgvector clinic search failed: {str(e)}")
+            fallbacks_total.inc(search="clinics", reason=fallback_reason)
+            with stage_seconds.time(stage="clinics_fallback"):
+                return await VectorStore.search_clinics_fallback(query, top_k)
             
         except Exception as e:
-            print(f"Error searching clinics: {str(e)}")
+            logger.error(f"Error searching clinics: {str(e)}")
             return []
 
     @staticmethod
-    async def search_articles_fallback(query: str, top_k: int = 3) -> List[Dict[str, Any]]:
-        """Fallback search for articles when vector search fails."""
-        try:
-            articles_response = supabase.table("articles").select("*").execute()
-            articles = articles_response.data if articles_response.data else []
-            query_embedding = get_embedding(query)
-            scored_articles = []
-            for article in articles:
-                content_response = supabase.table("article_content").select("*").eq("article_id", article["id"]).single().execute()
-                if not content_response.data:
-                    continue
-                
-                content = content_response.data
-                sections_response = supabase.table("article_sections").select("*").eq("article_id", article["id"]).execute()
-                sections = sections_response.data if sections_response.data else []
-    
-                author_response = supabase.table("article_authors").select(
-                    "authors(name, title, avatar)"
-                ).eq("article_id", article["id"]).single().execute()
-                author = author_response.data["authors"] if author_response.data else None
-                title_sim = cosine_similarity(
-                    get_embedding(article["title"]), 
-                    query_embedding
+    async def article_rpc(embedding_str: str, top_k: int) -> List[Dict[str, Any]]:
+        """Rows of the ``search_article_sections`` RPC for one query embedding."""
+        sections_response = await run_blocking(supabase.rpc(
+            "search_article_sections", 
+            {
+                "query_embedding": embedding_str,
+                "match_threshold": settings.SIMILARITY_THRESHOLD,
+                "match_count": top_k
+            }
+        ).execute)
+        return sections_response.data if sections_response else []
+
+    @staticmethod
+    def article_rows(
+        sections_data: List[Dict[str, Any]],
+        articles: Dict[int, Dict[str, Any]],
+        authors: Dict[int, Any]
+    ) -> List[Dict[str, Any]]:
+        """Join RPC section rows with their hydrated articles and authors."""
+        results = []
+        for section in sections_data:
+            article_id = section["article_id"]
+            article = articles.get(article_id)
+            if not article:
+                continue
+            
+            results.append({
+                "id": article_id,
+                "title": article["title"],
+                "category": article["category"], 
+                "section_title": section["section_title"],
+                "section_content": section["section_content"],
+                "author": authors.get(article_id),
+                "similarity": section["similarity"],
+                "source_type": "section",
+                "read_time": article["read_time"]
+            })
+        return results
+
+    @staticmethod
+    async def clinic_rpc(embedding_str: str, top_k: int) -> List[Dict[str, Any]]:
+        """Rows of the ``search_clinics`` RPC for one query embedding."""
+        clinics_response = await run_blocking(supabase.rpc(
+            "search_clinics",
+            {
+                "query_embedding": embedding_str,
+                "match_threshold": settings.SIMILARITY_THRESHOLD,
+                "match_count": top_k
+            }
+        ).execute)
+        return clinics_response.data if clinics_response else []
+
+    @staticmethod
+    def clinic_rows(
+        clinics_data: List[Dict[str, Any]],
+        specialties: Dict[int, List[str]],
+        insurance: Dict[int, List[str]]
+    ) -> List[Dict[str, Any]]:
+        """Add the hydrated specialty and insurance names to RPC clinic rows."""
+        return [
+            {
+                **clinic,
+                "specialties": specialties.get(clinic["clinic_id"], []),
+                "insurance_accepted": insurance.get(clinic["clinic_id"], [])
+            }
+            for clinic in clinics_data
+        ]
+
+    @staticmethod
+    async def fuse_lexical_clinics(query: str, clinics: List[Dict[str, Any]], top_k: int) -> List[Dict[str, Any]]:
+        if not settings.LEXICAL_SEARCH_ENABLED:
+            return clinics
+        # BM25 scores are not cosine similarities; only their rank order is fused
+        index = VectorStore.clinic_index()
+        if not len(index):
+            return clinics
+        lexical = VectorStore.lexical_clinics(index, query, top_k)
+        return VectorStore.fuse(
+            clinics,
+            [{**clinic, "similarity": None} for clinic in lexical],
+            key=lambda row: row["clinic_id"],
+            top_k=top_k
+        )
+
+    @staticmethod
+    async def search_articles_batch(
+        queries: List[str],
+        query_embeddings: List[List[float]],
+        top_k: int = settings.MAX_ARTICLE_RESULTS
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        ``search_articles`` for many queries, returning one result list per
+        query. With ``BATCH_LOCAL_SCORING`` all queries are scored against the
+        local index together, as matrix-matrix products. Otherwise every query
+        runs the RPC (concurrently) and the union of their hits is hydrated
+        once; queries the RPC finds nothing for are scored locally, together.
+        """
+        results: List[List[Dict[str, Any]]] = [[] for _ in queries]
+        if not settings.BATCH_LOCAL_SCORING:
+            with stage_seconds.time(stage="articles_rpc"):
+                responses = await asyncio.gather(*(
+                    VectorStore.article_rpc(format_embedding_for_postgres(embedding), top_k)
+                    for embedding in query_embeddings
+                ), return_exceptions=True)
+            for response in responses:
+                if isinstance(response, Exception):
+                    logger.warning(f"pgvector search failed: {str(response)}")
+            sections = [[] if isinstance(response, Exception) else response for response in responses]
+            with stage_seconds.time(stage="articles_hydration"):
+                articles, authors = await Hydrator.hydrate_articles(
+                    section["article_id"] for rows in sections for section in rows
                 )
-                intro_sim = cosine_similarity(
-                    get_embedding(content["introduction"]), 
-                    query_embedding
+            results = [VectorStore.article_rows(rows, articles, authors) for rows in sections]
+            for response, rows in zip(responses, results):
+                if not rows:
+                    fallbacks_total.inc(search="articles", reason="error" if isinstance(response, Exception) else "empty")
+
+        missing = [i for i, rows in enumerate(results) if not rows]
+        if missing:
+            await article_index.ensure_loaded()
+            with stage_seconds.time(stage="articles_batch_scoring"):
+                found = await run_blocking(
+                    article_index.search_sections_many, [query_embeddings[i] for i in missing], top_k
                 )
-                best_section = None
-                best_section_sim = 0
-                
-                for section in sections:
-                    section_sim = cosine_similarity(
-                        get_embedding(section["title"] + " " + section["content"]),
-                        query_embedding
-                    )
-                    if section_sim > best_section_sim:
-                        best_section_sim = section_sim
-                        best_section = section
-                max_sim = max(title_sim, intro_sim, best_section_sim)
-                
-                scored_articles.append({
-                    "id": article["id"],
-                    "title": article["title"],
-                    "category": article["category"],
-                    "section_title": best_section["title"] if best_section else "Introduction",
-                    "section_content": best_section["content"] if best_section else content["introduction"],
-                    "author": author,
-                    "similarity": max_sim,
-                    "source_type": "section" if best_section else "article_content",
-                    "read_time": article.get("read_time", "5 min") 
-                })
-            
-            scored_articles.sort(key=lambda x: x["similarity"], reverse=True)
-            return scored_articles[:top_k]
+            for i, rows in zip(missing, found):
+                results[i] = rows
+        if settings.LEXICAL_SEARCH_ENABLED:
+            results = [
+                VectorStore.fuse(
+                    rows,
+                    article_index.search_lexical(query, embedding, top_k),
+                    key=lambda row: (row["id"], row["section_title"]),
+                    top_k=top_k
+                )
+                for query, embedding, rows in zip(queries, query_embeddings, results)
+            ]
+        return results
+
+    @staticmethod
+    async def search_clinics_batch(
+        queries: List[str],
+        query_embeddings: List[List[float]],
+        top_k: int = settings.MAX_CLINIC_RESULTS
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        ``search_clinics`` for many queries. With ``BATCH_LOCAL_SCORING`` the
+        queries are scored together against the dense clinic index of the
+        reference data; otherwise the RPCs run concurrently and the union of
+        their clinics is hydrated once. Queries without vector hits fall back
+        to BM25, as in ``search_clinics``.
+        """
+        results: List[List[Dict[str, Any]]] = [[] for _ in queries]
+        if not queries:
+            return results
+        if settings.BATCH_LOCAL_SCORING:
+            index = await reference_data.clinic_vectors()
+            if len(index):
+                with stage_seconds.time(stage="clinics_batch_scoring"):
+                    scores = await run_blocking(index.score_many, query_embeddings)
+                count = min(top_k, len(index))
+                for i, query_scores in enumerate(scores):
+                    best = np.argpartition(-query_scores, count - 1)[:count]
+                    best = best[np.argsort(-query_scores[best])]
+                    results[i] = [{**index.payloads[row], "similarity": float(query_scores[row])} for row in best]
+        else:
+            with stage_seconds.time(stage="clinics_rpc"):
+                responses = await asyncio.gather(*(
+                    VectorStore.clinic_rpc(format_embedding_for_postgres(embedding), top_k)
+                    for embedding in query_embeddings
+                ), return_exceptions=True)
+            clinics = [[] if isinstance(response, Exception) else response for response in responses]
+            with stage_seconds.time(stage="clinics_hydration"):
+                specialties, insurance = await Hydrator.hydrate_clinics(
+                    clinic["clinic_id"] for rows in clinics for clinic in rows
+                )
+            results = [VectorStore.clinic_rows(rows, specialties, insurance) for rows in clinics]
+            for response, rows in zip(responses, results):
+                if not rows:
+                    fallbacks_total.inc(search="clinics", reason="error" if isinstance(response, Exception) else "empty")
+
+        for i, query in enumerate(queries):
+            if results[i]:
+                results[i] = await VectorStore.fuse_lexical_clinics(query, results[i], top_k)
+            else:
+                results[i] = await VectorStore.search_clinics_fallback(query, top_k)
+        return results
+
+    @staticmethod
+    async def search_articles_fallback(
+        query: str,
+        top_k: int = 3,
+        query_embedding: Optional[List[float]] = None
+    ) -> List[Dict[str, Any]]:
+        """Fallback search for articles when vector search fails, served from the local index."""
+        try:
+            await article_index.ensure_loaded()
+            if query_embedding is None:
+                query_embedding = await aget_embedding(query)
+            return article_index.search_sections(query_embedding, top_k)
             
         except Exception as e:
-            print(f"Error in fallback search: {str(e)}")
+            logger.error(f"Error in fallback search: {str(e)}")
             return []
 
     @staticmethod
     async def search_clinics_fallback(query: str, top_k: int = 3) -> List[Dict[str, Any]]:
-        """Fallback search for clinics when vector search fails."""
-        import re
-        
+        """Fallback search for clinics when vector search fails, ranked by BM25."""
         try:
-            # Get all clinics
-            clinics_response = supabase.table("clinics").select("*").execute()
-            clinics = clinics_response.data if clinics_response.data else []
-            
-            if not clinics:
-                print("No clinics found in database")
+            index = VectorStore.clinic_index()
+            if not len(index):
+                logger.warning("Clinic index not built yet")
                 return []
-            
-            keywords = set(re.findall(r'\w+', query.lower()))
-            keywords_list = list(keywords)
-    
-            scored_clinics = []
-            for clinic in clinics:
-                clinic_text = f"{clinic['name']} {clinic.get('description', '')}".lower()
-                clinic_keywords = set(re.findall(r'\w+', clinic_text))
-                matches = len(keywords.intersection(clinic_keywords))
-                specialties_response = supabase.table("clinic_specialties").select(
-                    "specialties(name)"
-                ).eq("clinic_id", clinic["id"]).execute()
-                
-                specialties = []
-                if specialties_response.data:
-                    for item in specialties_response.data:
-                        if "specialties" in item and "name" in item["specialties"]:
-                            specialties.append(item["specialties"]["name"])
-                
-                for specialty in specialties:
-                    if any(kw in specialty.lower() for kw in keywords_list):
-                        matches += 2  
-                insurance_response = supabase.table("clinic_insurance").select(
-                    "insurance_providers(name)"
-                ).eq("clinic_id", clinic["id"]).execute()
-                
-                insurance = []
-                if insurance_response.data:
-                    for item in insurance_response.data:
-                        if "insurance_providers" in item and "name" in item["insurance_providers"]:
-                            insurance.append(item["insurance_providers"]["name"])
-                if matches > 0 or "therapist" in query.lower() or "clinic" in query.lower():
-                    scored_clinics.append({
-                        "clinic_id": clinic["id"],
-                        "name": clinic["name"],
-                        "description": clinic.get("description", ""),
-                        "location": clinic.get("location", ""),
-                        "rating": clinic.get("rating", 0),
-                        "accepting_new": clinic.get("accepting_new", False),
-                        "specialties": specialties,
-                        "insurance_accepted": insurance,
-                        "similarity": 0.5 + (0.1 * matches)  # Simple scoring
-                    })
-            scored_clinics.sort(key=lambda x: x["similarity"], reverse=True)
+
+            scored_clinics = VectorStore.lexical_clinics(index, query, top_k)
             if not scored_clinics and ("therapist" in query.lower() or "clinic" in query.lower()):
-                for clinic in clinics[:min(top_k, len(clinics))]:
-                    specialties_response = supabase.table("clinic_specialties").select(
-                        "specialties(name)"
-                    ).eq("clinic_id", clinic["id"]).execute()
-                    
-                    specialties = []
-                    if specialties_response.data:
-                        for item in specialties_response.data:
-                            if "specialties" in item and "name" in item["specialties"]:
-                                specialties.append(item["specialties"]["name"])
-                    
-                    insurance_response = supabase.table("clinic_insurance").select(
-                        "insurance_providers(name)"
-                    ).eq("clinic_id", clinic["id"]).execute()
-                    
-                    insurance = []
-                    if insurance_response.data:
-                        for item in insurance_response.data:
-                            if "insurance_providers" in item and "name" in item["insurance_providers"]:
-                                insurance.append(item["insurance_providers"]["name"])
-                    
-                    scored_clinics.append({
-                        "clinic_id": clinic["id"],
-                        "name": clinic["name"],
-                        "description": clinic.get("description", ""),
-                        "location": clinic.get("location", ""),
-                        "rating": clinic.get("rating", 0),
-                        "accepting_new": clinic.get("accepting_new", False),
-                        "specialties": specialties,
-                        "insurance_accepted": insurance,
-                        "similarity": 0.5  
-                    })
-            
-            return scored_clinics[:top_k]
+                scored_clinics = [
+                    {**index.payload(key), "similarity": 0.5}
+                    for key in list(index.lengths)[:top_k]
+                ]
+            return scored_clinics
             
         except Exception as e:
-            print(f"Error in clinics fallback search: {str(e)}")
+            logger.error(f"Error in clinics fallback search: {str(e)}")
             return []
+
+    @staticmethod
+    def clinic_index() -> BM25Index:
+        """
+        The clinic BM25 index as the reference-data refresh last built it.
+        It is never built during a request: without a fresh snapshot a
+        background refresh is started, and the last index (empty before the
+        first snapshot) is served meanwhile.
+        """
+        if reference_data.current() is None:
+            reference_data.schedule_refresh()
+        return reference_data.clinic_index
+
+    @staticmethod
+    def lexical_clinics(index: BM25Index, query: str, top_k: int) -> List[Dict[str, Any]]:
+        """
+        The ``top_k`` clinics by BM25. ``similarity`` runs from 0.5 to 1.0,
+        relative to the best lexical match.
+        """
+        hits = index.search(query, top_k)
+        if not hits:
+            return []
+        best = hits[0][1]
+        return [{**index.payload(key), "similarity": 0.5 + 0.5 * score / best} for key, score in hits]
+
+    @staticmethod
+    def fuse(
+        vector_results: List[Dict[str, Any]],
+        lexical_results: List[Dict[str, Any]],
+        key: Callable[[Dict[str, Any]], Hashable],
+        top_k: int
+    ) -> List[Dict[str, Any]]:
+        """
+        Reciprocal-rank fusion of vector and lexical results. Rows found by
+        both keep the vector row; rows found only lexically and without a
+        cosine similarity of their own take the lowest vector similarity.
+        """
+        if not lexical_results:
+            return vector_results[:top_k]
+        vector_keys = [key(row) for row in vector_results]
+        rows = {key(row): row for row in lexical_results}
+        rows.update(zip(vector_keys, vector_results))
+        floor = min(
+            (row["similarity"] for row in vector_results if row.get("similarity") is not None),
+            default=settings.SIMILARITY_THRESHOLD
+        )
+        fused = reciprocal_rank_fusion([vector_keys, [key(row) for row in lexical_results]], settings.RRF_K)
+        results = []
+        for row_key, _ in fused[:top_k]:
+            row = rows[row_key]
+            if row.get("similarity") is None:
+                row = {**row, "similarity": floor}
+            results.append(row)
+        return results
@@ -0,0 +1,136 @@
+from typing import Any, Awaitable, Callable, Dict, List
+import asyncio
+import logging
+import time
+
+from app.config import settings
+from app.core.formatter import ResponseFormatter, parse_response
+from app.core.query_analyzer import query_analyzer
+from app.core.reference_data import reference_data
+from app.core.vector_index import article_index
+from app.utils.concurrency import run_blocking
+from app.utils.embedding_cache import embedding_cache
+from app.utils.http import openai_module, openai_transport
+from app.utils.metrics import metrics
+from app.utils.supabase import supabase
+from app.utils.tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# Exercises every formatter pattern once
+SAMPLE_RESPONSE = (
+    "**Understanding Anxiety:** It is common.\n\n"
+    "Recommendations:\n• Try slow breathing\n\n"
+    "1. **[Clinic 1]**: Downtown Clinic\n• Accepts insurance\n\n"
+    "See [Article 2] for more."
+)
+
+
+class Warmup:
+    """
+    The startup phase. Importing the app only defines things: the OpenAI
+    and Supabase clients, the tokenizer and the indexes are all created on
+    first use. The warm-up makes that first use happen before traffic does.
+    It opens the connection pools, loads the reference data, article index
+    and query-analysis centroids, opens the embedding cache, loads the
+    tokenizer and runs the formatter once. A step that fails or times out
+    is logged and reported. ``ready`` turns true once the critical steps
+    have succeeded, retrying them every ``WARMUP_RETRY_SECONDS`` until they
+    do; the other steps are served through their usual fallback.
+    """
+
+    # Without these the instance cannot answer, so it must not take traffic
+    CRITICAL_STEPS = ("connections", "reference_data", "article_index")
+
+    def __init__(self):
+        self.timings: Dict[str, float] = {}
+        self.errors: Dict[str, str] = {}
+        self.ready = False
+
+    def record(self, phase: str, seconds: float) -> None:
+        self.timings[phase] = seconds
+
+    async def _step(self, name: str, run: Callable[[], Awaitable[Any]]) -> None:
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(run(), settings.WARMUP_TIMEOUT_SECONDS)
+            self.errors.pop(name, None)
+        except Exception as e:
+            self.errors[name] = str(e) or type(e).__name__
+            logger.warning(f"Warm-up step '{name}' failed: {self.errors[name]}")
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    @staticmethod
+    async def _connections() -> None:
+        # Import the clients off the event loop, then open the pools
+        await run_blocking(openai_module)
+        await openai_transport.open()
+        await run_blocking(supabase.open)
+
+    @staticmethod
+    async def _formatter() -> None:
+        parse_response(SAMPLE_RESPONSE)
+        formatter = ResponseFormatter()
+        formatter.feed(SAMPLE_RESPONSE)
+        formatter.close()
+
+    def _failed_critical(self) -> List[str]:
+        return [name for name in self.CRITICAL_STEPS if name in self.errors]
+
+    async def run(self) -> None:
+        started = time.perf_counter()
+        self.ready = False
+        self.errors = {}
+        critical = {
+            "connections": self._connections,
+            "reference_data": reference_data.refresh,
+            "article_index": article_index.ensure_loaded,
+        }
+        await self._step("connections", critical["connections"])
+        await asyncio.gather(
+            self._step("reference_data", critical["reference_data"]),
+            self._step("article_index", critical["article_index"]),
+            self._step("query_analyzer", query_analyzer.load_centroids),
+            self._step("embedding_cache", lambda: run_blocking(
+                embedding_cache.get, settings.OPENAI_EMBEDDING_MODEL, "warm-up"
+            )),
+            self._step("tokenizer", lambda: run_blocking(count_tokens, "warm-up")),
+            self._step("formatter", self._formatter),
+        )
+        if settings.BATCH_LOCAL_SCORING:
+            # Needs the reference data loaded above
+            await self._step("clinic_vectors", reference_data.clinic_vectors)
+        while self._failed_critical():
+            logger.warning(
+                f"Not ready: warm-up steps {', '.join(self._failed_critical())} failed, "
+                f"retrying in {settings.WARMUP_RETRY_SECONDS:.0f}s"
+            )
+            await asyncio.sleep(settings.WARMUP_RETRY_SECONDS)
+            # Connections first: the other steps need them
+            for name in self._failed_critical():
+                await self._step(name, critical[name])
+        self.record("warmup", time.perf_counter() - started)
+        self.ready = True
+
+        total = self.timings.get("import", 0.0) + self.timings["warmup"]
+        breakdown = ", ".join(f"{phase} {seconds * 1000:.0f} ms" for phase, seconds in self.timings.items())
+        logger.info(f"Ready after {total:.2f}s: {breakdown}")
+        if total > settings.STARTUP_BUDGET_SECONDS:
+            logger.warning(f"Startup took {total:.2f}s, over the {settings.STARTUP_BUDGET_SECONDS:.0f}s budget")
+
+    def report(self) -> Dict[str, Any]:
+        total = self.timings.get("import", 0.0) + self.timings.get("warmup", 0.0)
+        return {
+            "status": "ready" if self.ready else "starting",
+            "startup_ms": {phase: round(seconds * 1000, 1) for phase, seconds in self.timings.items()},
+            "within_budget": total <= settings.STARTUP_BUDGET_SECONDS,
+            "errors": dict(self.errors),
+        }
+
+
+warmup = Warmup()
+metrics.register_stats(
+    "rag_startup", "Seconds spent importing the app and in each warm-up step, and whether it is ready.",
+    lambda: {**warmup.timings, "ready": int(warmup.ready)}
+)
@@ -0,0 +1,384 @@
+"""
+Ingest articles and clinics into Supabase together with the embeddings that
+the ``search_article_sections`` and ``search_clinics`` RPCs search.
+
+Articles are Markdown files with a front-matter block, an introduction and
+one ``## `` heading per section:
+
+    ---
+    id: 12
+    title: Understanding Anxiety
+    category: anxiety
+    read_time: 6 min
+    ---
+    Introduction paragraphs...
+
+    ## Breathing exercises
+    Section text...
+
+Sections longer than ``INGEST_CHUNK_MAX_TOKENS`` are split at paragraph
+boundaries. Each chunk is hashed, and only new or changed chunks are
+embedded (in large batches) and upserted (in batches, with bounded
+concurrency). The hashes of written chunks are recorded in a local state
+file after every batch, so an interrupted run resumes where it stopped.
+
+    python -m app.ingest content/articles --clinics
+"""
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import sys
+import time
+
+from app.utils.http import openai_transport
+from app.utils.supabase import supabase
+from app.utils.concurrency import run_blocking
+from app.utils.embeddings import aget_embeddings, format_embedding_for_postgres
+from app.utils.tokens import count_tokens
+from app.core.hydration import Hydrator
+from app.core.reference_data import clinic_documents
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Rows are upserted on their natural key; sections are keyed by their position
+# in the article, so re-ingesting an article updates its rows in place and the
+# database assigns section ids
+CONFLICT_COLUMNS = {
+    "article_content": "article_id",
+    "article_sections": "article_id,position",
+}
+
+_FRONT_MATTER = re.compile(r'\A---\s*\n(.*?)\n---\s*\n', re.DOTALL)
+_SECTION_HEADING = re.compile(r'^##\s+(.+?)\s*$', re.MULTILINE)
+
+
+def digest(value: Any) -> str:
+    text = value if isinstance(value, str) else json.dumps(value, sort_keys=True, default=str)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class Chunk:
+    """One row to write; ``text`` is embedded into its ``embedding`` column unless it is None."""
+    key: str
+    table: str
+    row: Dict[str, Any]
+    text: Optional[str] = None
+    digest: str = ""
+
+    def __post_init__(self):
+        if not self.digest:
+            self.digest = digest(self.text if self.text is not None else self.row)
+
+
+@dataclass
+class Document:
+    """A parsed article: its metadata rows and section chunks."""
+    article_id: int
+    rows: List[Chunk]
+    sections: List[Chunk]
+
+
+@dataclass
+class IngestReport:
+    chunks: int = 0
+    embedded: int = 0
+    written: int = 0
+    skipped: int = 0
+    deleted: int = 0
+    failed: int = 0
+    tokens: int = 0
+    seconds: float = 0.0
+    errors: List[str] = field(default_factory=list)
+
+    def summary(self) -> str:
+        seconds = max(self.seconds, 1e-9)
+        return (
+            f"{self.chunks} chunks: {self.embedded} embedded, {self.skipped} unchanged, "
+            f"{self.deleted} deleted, {self.failed} failed in {self.seconds:.2f}s "
+            f"({self.embedded / seconds:.1f} chunks/s, {self.tokens / seconds:.0f} tokens/s)"
+        )
+
+
+class IngestState:
+    """Content hashes of the chunks written so far, in a local SQLite file."""
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            " key TEXT PRIMARY KEY,"
+            " digest TEXT NOT NULL,"
+            " updated REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def digests(self) -> Dict[str, str]:
+        return dict(self._conn.execute("SELECT key, digest FROM chunks"))
+
+    def record(self, chunks: Iterable[Chunk]) -> None:
+        now = time.time()
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO chunks (key, digest, updated) VALUES (?, ?, ?)",
+            [(chunk.key, chunk.digest, now) for chunk in chunks]
+        )
+        self._conn.commit()
+
+    def forget(self, keys: Iterable[str]) -> None:
+        self._conn.executemany("DELETE FROM chunks WHERE key = ?", [(key,) for key in keys])
+        self._conn.commit()
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+def split_section(title: str, content: str, max_tokens: int) -> List[Tuple[str, str]]:
+    """A section as (title, content) chunks of at most ``max_tokens``, split between paragraphs."""
+    if count_tokens(content) <= max_tokens:
+        return [(title, content)]
+    parts, current = [], ""
+    for paragraph in (p.strip() for p in content.split("\n\n")):
+        if not paragraph:
+            continue
+        candidate = f"{current}\n\n{paragraph}" if current else paragraph
+        if current and count_tokens(candidate) > max_tokens:
+            parts.append(current)
+            current = paragraph
+        else:
+            current = candidate
+    if current:
+        parts.append(current)
+    return [(title if i == 0 else f"{title} (part {i + 1})", part) for i, part in enumerate(parts)]
+
+
+def parse_article(text: str, max_tokens: int) -> Document:
+    """Parse one Markdown article into its rows."""
+    match = _FRONT_MATTER.match(text)
+    if not match:
+        raise ValueError("missing front matter")
+    meta = {}
+    for line in match.group(1).splitlines():
+        if ":" in line:
+            key, value = line.split(":", 1)
+            meta[key.strip()] = value.strip()
+    article_id = int(meta["id"])
+    body = text[match.end():]
+
+    headings = list(_SECTION_HEADING.finditer(body))
+    introduction = body[:headings[0].start() if headings else len(body)].strip()
+    article = {
+        "id": article_id,
+        "title": meta["title"],
+        "category": meta.get("category", "general"),
+        "read_time": meta.get("read_time", "5 min"),
+    }
+    rows = [
+        Chunk(f"article:{article_id}", "articles", article),
+        Chunk(f"content:{article_id}", "article_content", {"article_id": article_id, "introduction": introduction}),
+    ]
+
+    sections = []
+    for i, heading in enumerate(headings):
+        end = headings[i + 1].start() if i + 1 < len(headings) else len(body)
+        for title, content in split_section(heading.group(1), body[heading.end():end].strip(), max_tokens):
+            position = len(sections) + 1
+            sections.append(Chunk(
+                key=f"section:{article_id}:{position}",
+                table="article_sections",
+                row={"article_id": article_id, "position": position, "title": title, "content": content},
+                # Embedded as the local article index embeds sections, so the two share cache entries
+                text=f"{title} {content}"
+            ))
+    return Document(article_id=article_id, rows=rows, sections=sections)
+
+
+def load_articles(paths: List[str], max_tokens: int) -> List[Document]:
+    """Parse every ``.md`` file under ``paths``."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files += [os.path.join(root, name) for name in sorted(names) if name.endswith(".md")]
+        else:
+            files.append(path)
+    documents = []
+    for file in sorted(files):
+        with open(file, encoding="utf-8") as handle:
+            try:
+                documents.append(parse_article(handle.read(), max_tokens))
+            except (KeyError, ValueError) as e:
+                raise ValueError(f"{file}: {str(e)}") from e
+    return documents
+
+
+async def load_clinics() -> List[Chunk]:
+    """Clinic rows, embedded over their name, description, specialties and insurers."""
+    clinics = await Hydrator.fetch_clinics()
+    specialties, insurance = await Hydrator.hydrate_clinics(clinic["id"] for clinic in clinics)
+    texts = clinic_documents(clinics, specialties, insurance)
+    return [
+        Chunk(
+            key=f"clinic:{clinic['id']}",
+            table="clinics",
+            row={column: value for column, value in clinic.items() if column != "embedding"},
+            text=texts[clinic["id"]][0]
+        )
+        for clinic in clinics
+    ]
+
+
+class Ingestor:
+    """Writes chunks whose content changed, embedding them on the way."""
+
+    def __init__(self, state: IngestState, batch_size: int, max_concurrent_writes: int, force: bool = False):
+        self.state = state
+        self.batch_size = batch_size
+        self.force = force
+        self.report = IngestReport()
+        self._known = state.digests()
+        self._writes = asyncio.Semaphore(max_concurrent_writes)
+
+    def changed(self, chunks: List[Chunk]) -> List[Chunk]:
+        self.report.chunks += len(chunks)
+        changed = [chunk for chunk in chunks if self.force or self._known.get(chunk.key) != chunk.digest]
+        self.report.skipped += len(chunks) - len(changed)
+        return changed
+
+    async def _write_batch(self, table: str, chunks: List[Chunk]) -> None:
+        async with self._writes:
+            rows = [dict(chunk.row) for chunk in chunks]
+            texts = [chunk.text for chunk in chunks if chunk.text is not None]
+            if texts:
+                embeddings = await aget_embeddings(texts)
+                # Failed embedding batches come back as zero vectors; they must not be written
+                if any(not any(embedding) for embedding in embeddings):
+                    raise RuntimeError("embedding request failed")
+                for row, embedding in zip(rows, embeddings):
+                    row["embedding"] = format_embedding_for_postgres(embedding)
+            conflict = CONFLICT_COLUMNS.get(table, "id")
+            await run_blocking(supabase.bulk.table(table).upsert(rows, on_conflict=conflict).execute)
+            self.state.record(chunks)
+            self.report.written += len(chunks)
+            self.report.embedded += len(texts)
+            self.report.tokens += sum(count_tokens(text) for text in texts)
+
+    async def write(self, table: str, chunks: List[Chunk]) -> None:
+        """Upsert ``chunks`` into ``table`` in concurrent batches; a failed batch is retried on the next run."""
+        batches = [chunks[i:i + self.batch_size] for i in range(0, len(chunks), self.batch_size)]
+        results = await asyncio.gather(
+            *(self._write_batch(table, batch) for batch in batches), return_exceptions=True
+        )
+        for batch, result in zip(batches, results):
+            if isinstance(result, Exception):
+                self.report.failed += len(batch)
+                self.report.errors.append(f"{table}: {str(result)}")
+                logger.error(f"Writing {len(batch)} rows to {table} failed: {str(result)}")
+
+    async def _delete_sections_after(self, article_id: int, count: int) -> int:
+        async with self._writes:
+            response = await run_blocking(
+                supabase.bulk.table("article_sections").delete()
+                .eq("article_id", article_id).gt("position", count).execute
+            )
+            return len(response.data or [])
+
+    async def delete_stale(self, documents: List[Document]) -> None:
+        """
+        Delete the sections of the ingested articles past their last position.
+
+        Articles this state has not ingested before are cleaned as well, which
+        removes rows written by hand before the article was first ingested.
+        """
+        current = {chunk.key for document in documents for chunk in document.sections}
+        known_sections: Dict[int, List[str]] = {}
+        for key in self._known:
+            if key.startswith("section:"):
+                known_sections.setdefault(int(key.split(":")[1]), []).append(key)
+        stale, articles = [], []
+        for document in documents:
+            known = known_sections.get(document.article_id, [])
+            removed = [key for key in known if key not in current]
+            if self.force or not known or removed:
+                articles.append(document)
+            stale += removed
+        if not articles:
+            return
+        deleted = await asyncio.gather(
+            *(self._delete_sections_after(document.article_id, len(document.sections)) for document in articles)
+        )
+        self.state.forget(stale)
+        self.report.deleted += sum(deleted)
+
+
+async def ingest(
+    paths: List[str],
+    clinics: bool = False,
+    force: bool = False,
+    state_path: str = settings.INGEST_STATE_PATH
+) -> IngestReport:
+    started = time.perf_counter()
+    state = IngestState(state_path)
+    ingestor = Ingestor(
+        state,
+        batch_size=settings.INGEST_BATCH_SIZE,
+        max_concurrent_writes=settings.INGEST_MAX_CONCURRENT_WRITES,
+        force=force
+    )
+    try:
+        documents = load_articles(paths, settings.INGEST_CHUNK_MAX_TOKENS)
+        # Parents before children: sections reference articles
+        for table in ("articles", "article_content"):
+            await ingestor.write(table, ingestor.changed([
+                chunk for document in documents for chunk in document.rows if chunk.table == table
+            ]))
+        await ingestor.write("article_sections", ingestor.changed([
+            chunk for document in documents for chunk in document.sections
+        ]))
+        await ingestor.delete_stale(documents)
+        if clinics:
+            await ingestor.write("clinics", ingestor.changed(await load_clinics()))
+    finally:
+        state.close()
+    ingestor.report.seconds = time.perf_counter() - started
+    return ingestor.report
+
+
+async def run(args: argparse.Namespace) -> IngestReport:
+    """Ingest over pooled connections, closed when the run ends."""
+    await openai_transport.open()
+    try:
+        return await ingest(args.paths, clinics=args.clinics, force=args.force, state_path=args.state)
+    finally:
+        await openai_transport.close()
+        supabase.close()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="*", help="Markdown article files or directories")
+    parser.add_argument("--clinics", action="store_true", help="also embed the clinics table")
+    parser.add_argument("--force", action="store_true", help="re-embed and rewrite every chunk")
+    parser.add_argument("--state", default=settings.INGEST_STATE_PATH, help="state file used to skip unchanged chunks")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    report = asyncio.run(run(args))
+    print(report.summary())
+    for error in report.errors:
+        print(f"error: {error}")
+    return 1 if report.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
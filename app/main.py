@@ -1,15 +1,49 @@
+import time
+_import_started = time.perf_counter()
+
+import asyncio
 import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.routes import router
 from app.config import settings
+from app.core.vector_index import article_index
+from app.core.reference_data import reference_data
+from app.utils.http import openai_transport
+from app.utils.supabase import supabase
+from app.core.warmup import warmup
 
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 )
 
-app = FastAPI(title=settings.APP_NAME)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up in the background: /api/health answers at once, /api/ready once
+    # the pools are open and the indexes and caches are loaded. The refresh
+    # loops take over keeping the index and reference data fresh.
+    background_tasks = [
+        asyncio.create_task(warmup.run()),
+        asyncio.create_task(article_index.run_refresh_loop(
+            settings.VECTOR_INDEX_REFRESH_SECONDS, initial_delay=settings.VECTOR_INDEX_REFRESH_SECONDS
+        )),
+        asyncio.create_task(reference_data.run_refresh_loop(
+            settings.REFERENCE_DATA_REFRESH_SECONDS, initial_delay=settings.REFERENCE_DATA_REFRESH_SECONDS
+        )),
+    ]
+    try:
+        yield
+    finally:
+        for task in background_tasks:
+            task.cancel()
+        await asyncio.gather(*background_tasks, return_exceptions=True)
+        # Pooled keep-alive connections for OpenAI and Supabase
+        await openai_transport.close()
+        supabase.close()
+
+app = FastAPI(title=settings.APP_NAME, lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -21,6 +55,8 @@ app.add_middleware(
 
 app.include_router(router, prefix="/api")
 
+warmup.record("import", time.perf_counter() - _import_started)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
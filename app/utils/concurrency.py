@@ -0,0 +1,18 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from app.config import settings
+
+# Shared, bounded pool for client libraries that only offer blocking calls
+# (the Supabase client). Its size caps how many such calls are in flight.
+io_executor = ThreadPoolExecutor(
+    max_workers=settings.IO_THREADPOOL_SIZE,
+    thread_name_prefix="blocking-io"
+)
+
+async def run_blocking(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Run a blocking callable on the I/O pool without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(io_executor, functools.partial(func, *args, **kwargs))
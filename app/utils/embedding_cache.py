@@ -0,0 +1,203 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+from app.config import settings
+from app.utils.metrics import metrics
+
+
+class EmbeddingCache:
+    """
+    Two-tier cache for embeddings: an in-process LRU in front of an on-disk
+    SQLite store. Entries are content-addressed by the embedding model name and
+    a SHA-256 of the exact text sent to the API, so the same text embedded by
+    any worker or after a restart is only paid for once.
+    """
+
+    # Amortise disk eviction: only trim the store every N writes.
+    _EVICT_EVERY = 256
+    # Disk hits refresh their last-access time in batches of this many,
+    # rather than with a write per hit.
+    _TOUCH_EVERY = 256
+    # Keys per disk lookup query (bounded by SQLite's variable limit).
+    _QUERY_BATCH = 500
+
+    def __init__(self, memory_size: int, path: Optional[str], max_disk_entries: int):
+        self.memory_size = memory_size
+        self.path = path
+        self.max_disk_entries = max_disk_entries
+
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._writes_since_evict = 0
+        self._touched: Dict[str, float] = {}
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        """Content address for a (model, text) pair."""
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{model}:{digest}"
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        if self._conn is not None or not self.path:
+            return self._conn
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY,"
+            " vector BLOB NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_access ON embeddings (last_access)")
+        self._conn = conn
+        return conn
+
+    def _remember(self, key: str, vector: np.ndarray) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, model: str, text: str) -> Optional[np.ndarray]:
+        """Return the cached float32 vector for ``text`` or None on a miss."""
+        return self.get_many(model, [text]).get(text)
+
+    def get_memory(self, model: str, text: str) -> Optional[np.ndarray]:
+        """
+        The vector for ``text`` if the in-process tier holds it. Never touches
+        the disk, and a miss is not counted: the caller looks the text up in
+        full later.
+        """
+        key = self.make_key(model, text)
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+            return vector
+
+    def get_many(self, model: str, texts: Iterable[str]) -> Dict[str, np.ndarray]:
+        """Cached float32 vectors by text; the texts not in memory are read from disk together."""
+        keys = {self.make_key(model, text): text for text in texts}
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            missing = []
+            for key, text in keys.items():
+                vector = self._memory.get(key)
+                if vector is None:
+                    missing.append(key)
+                    continue
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                found[text] = vector
+
+            conn = self._connect() if missing else None
+            if conn is not None:
+                now = time.time()
+                for start in range(0, len(missing), self._QUERY_BATCH):
+                    batch = missing[start:start + self._QUERY_BATCH]
+                    rows = conn.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})", batch
+                    ).fetchall()
+                    for key, blob in rows:
+                        vector = np.frombuffer(blob, dtype=np.float32)
+                        self._remember(key, vector)
+                        self._touched[key] = now
+                        self.disk_hits += 1
+                        found[keys[key]] = vector
+                if len(self._touched) >= self._TOUCH_EVERY:
+                    self._flush_touched(conn)
+                    conn.commit()
+
+            self.misses += len(keys) - len(found)
+        return found
+
+    def _flush_touched(self, conn: sqlite3.Connection) -> None:
+        """Write the pending last-access times (the caller commits)."""
+        if self._touched:
+            conn.executemany(
+                "UPDATE embeddings SET last_access = ? WHERE key = ?",
+                [(accessed, key) for key, accessed in self._touched.items()]
+            )
+            self._touched.clear()
+
+    def put(self, model: str, text: str, embedding) -> np.ndarray:
+        """Store an embedding in both tiers and return it as a float32 array."""
+        key = self.make_key(model, text)
+        vector = np.asarray(embedding, dtype=np.float32)
+        with self._lock:
+            self._remember(key, vector)
+            conn = self._connect()
+            if conn is not None:
+                conn.execute(
+                    "INSERT OR REPLACE INTO embeddings (key, vector, last_access) VALUES (?, ?, ?)",
+                    (key, vector.tobytes(), time.time())
+                )
+                self._flush_touched(conn)
+                conn.commit()
+                self._writes_since_evict += 1
+                if self._writes_since_evict >= self._EVICT_EVERY:
+                    self._evict_disk(conn)
+        return vector
+
+    def _evict_disk(self, conn: sqlite3.Connection) -> None:
+        self._writes_since_evict = 0
+        # Eviction picks the least recently used, so pending accesses count
+        self._flush_touched(conn)
+        (count,) = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        excess = count - self.max_disk_entries
+        if excess > 0:
+            conn.execute(
+                "DELETE FROM embeddings WHERE key IN ("
+                " SELECT key FROM embeddings ORDER BY last_access ASC LIMIT ?)",
+                (excess,)
+            )
+            conn.commit()
+            self.evictions += excess
+
+    def clear(self) -> None:
+        """Drop every cached embedding from both tiers."""
+        with self._lock:
+            self._memory.clear()
+            self._touched.clear()
+            conn = self._connect()
+            if conn is not None:
+                conn.execute("DELETE FROM embeddings")
+                conn.commit()
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "memory_entries": len(self._memory),
+            "hit_ratio": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+        }
+
+
+embedding_cache = EmbeddingCache(
+    memory_size=settings.EMBEDDING_CACHE_MEMORY_SIZE,
+    path=settings.EMBEDDING_CACHE_PATH,
+    max_disk_entries=settings.EMBEDDING_CACHE_MAX_DISK_ENTRIES
+)
+metrics.register_stats("rag_embedding_cache", "Embedding cache hits by tier, misses and entries.", embedding_cache.stats)
@@ -1,34 +1,277 @@
-import openai
+import asyncio
+import time
 import numpy as np
-from typing import List
+from typing import Any, Dict, List, Optional, Set, Tuple
 from app.config import settings
+from app.utils.concurrency import run_blocking
+from app.utils.embedding_cache import embedding_cache
+from app.utils.http import openai_module, openai_timeout
+from app.utils.metrics import metrics, embedding_batch_size, embedding_queue_wait_seconds
 
-openai.api_key = settings.OPENAI_API_KEY
 
-def get_embedding(text: str) -> List[float]:
-    """Generate an embedding for the given text."""
-    if not text:
-        return [0] * settings.EMBEDDING_DIM
-    
+def prepare_text(text: str) -> str:
+    """Normalise text exactly as it is sent to the embedding API."""
     text = text.replace("\n", " ")
     if len(text) > 2000:
         text = text[:2000]
-    
+    return text
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (~4 characters per token for English text)."""
+    return len(text) // 4 + 1
+
+def _cache_get_many(model: str, texts: List[str]) -> Dict[str, np.ndarray]:
+    if not settings.EMBEDDING_CACHE_ENABLED or not texts:
+        return {}
     try:
-        response = openai.Embedding.create(
-            model="text-embedding-ada-002",
-            input=text
-        )
-        return response["data"][0]["embedding"]
+        return embedding_cache.get_many(model, texts)
     except Exception as e:
-        print(f"Error getting embedding: {str(e)}")
-        # Return zero vector as fallback
-        return [0] * settings.EMBEDDING_DIM
+        print(f"Error reading embedding cache: {str(e)}")
+        return {}
+
+def _cache_get_memory(model: str, text: str):
+    if not settings.EMBEDDING_CACHE_ENABLED:
+        return None
+    return embedding_cache.get_memory(model, text)
+
+def _cache_put(model: str, text: str, embedding: List[float]) -> None:
+    if not settings.EMBEDDING_CACHE_ENABLED:
+        return
+    try:
+        embedding_cache.put(model, text, embedding)
+    except Exception as e:
+        print(f"Error writing embedding cache: {str(e)}")
+
+def _split_batches(texts: List[str]) -> List[List[str]]:
+    """Split texts into request-sized batches by input count and estimated tokens."""
+    batches = []
+    batch: List[str] = []
+    batch_tokens = 0
+    for text in texts:
+        tokens = estimate_tokens(text)
+        if batch and (len(batch) >= settings.EMBEDDING_BATCH_MAX_INPUTS or
+                      batch_tokens + tokens > settings.EMBEDDING_BATCH_MAX_TOKENS):
+            batches.append(batch)
+            batch, batch_tokens = [], 0
+        batch.append(text)
+        batch_tokens += tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+def _lookup_cached(texts: List[str]) -> Tuple[List[List[float]], Dict[str, List[int]], List[str]]:
+    """
+    Resolve what the cache can answer. Returns the (zero-filled) results, the
+    input positions of every distinct prepared text, and the texts still missing.
+    """
+    model = settings.OPENAI_EMBEDDING_MODEL
+    zero = [0] * settings.EMBEDDING_DIM
+    results: List[List[float]] = [zero] * len(texts)
+
+    positions: Dict[str, List[int]] = {}
+    for i, text in enumerate(texts):
+        if text:
+            positions.setdefault(prepare_text(text), []).append(i)
+
+    cached = _cache_get_many(model, list(positions))
+    missing = []
+    for text, indices in positions.items():
+        if text not in cached:
+            missing.append(text)
+            continue
+        embedding = cached[text].tolist()
+        for i in indices:
+            results[i] = embedding
+    return results, positions, missing
+
+def _store_batch(
+    batch: List[str],
+    response: Dict[str, Any],
+    results: List[List[float]],
+    positions: Dict[str, List[int]]
+) -> None:
+    data = sorted(response["data"], key=lambda item: item["index"])
+    for text, item in zip(batch, data):
+        embedding = item["embedding"]
+        _cache_put(settings.OPENAI_EMBEDDING_MODEL, text, embedding)
+        for i in positions[text]:
+            results[i] = embedding
+
+def get_embeddings(texts: List[str]) -> List[List[float]]:
+    """
+    Generate embeddings for many texts using as few API requests as possible.
+    Results are returned in input order; identical inputs are only embedded
+    once and empty strings map to zero vectors, as in get_embedding.
+    """
+    results, positions, missing = _lookup_cached(texts)
+    for batch in _split_batches(missing):
+        try:
+            response = openai_module().Embedding.create(
+                model=settings.OPENAI_EMBEDDING_MODEL,
+                input=batch,
+                request_timeout=openai_timeout(settings.OPENAI_EMBEDDING_TIMEOUT_SECONDS)
+            )
+            _store_batch(batch, response, results, positions)
+        except Exception as e:
+            print(f"Error getting embeddings for batch of {len(batch)}: {str(e)}")
+            # Leave zero vectors as fallback
+    return results
+
+async def aget_embeddings(texts: List[str]) -> List[List[float]]:
+    """
+    Async variant of get_embeddings; batches are sent concurrently, and the
+    cache is read and written on the I/O pool, without blocking the event loop.
+    """
+    results, positions, missing = await run_blocking(_lookup_cached, texts)
+    semaphore = asyncio.Semaphore(settings.EMBEDDING_MAX_CONCURRENT_REQUESTS)
+
+    async def embed_batch(batch: List[str]) -> None:
+        try:
+            async with semaphore:
+                response = await openai_module().Embedding.acreate(
+                    model=settings.OPENAI_EMBEDDING_MODEL,
+                    input=batch,
+                    request_timeout=openai_timeout(settings.OPENAI_EMBEDDING_TIMEOUT_SECONDS)
+                )
+            await run_blocking(_store_batch, batch, response, results, positions)
+        except Exception as e:
+            print(f"Error getting embeddings for batch of {len(batch)}: {str(e)}")
+
+    await asyncio.gather(*(embed_batch(batch) for batch in _split_batches(missing)))
+    return results
+
+class EmbeddingDispatcher:
+    """
+    Micro-batches single-text embedding requests made by concurrent callers.
+    Texts are collected for up to ``window`` seconds, or until ``max_batch``
+    are waiting, and sent through ``aget_embeddings`` as one multi-input
+    request; each caller's future resolves with its own vector. Texts in the
+    cache's memory tier are answered without waiting; the rest are looked up
+    on disk once, with their batch. Once ``max_queue`` texts are queued
+    or in flight, further callers wait for room (backpressure) instead of
+    adding requests the provider would rate-limit.
+    """
+
+    def __init__(self, window: float, max_batch: int, max_queue: int):
+        self.window = window
+        self.max_batch = max_batch
+        self.max_queue = max_queue
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.stats: Dict[str, int] = {
+            "requests": 0,
+            "cache_hits": 0,
+            "batches": 0,
+            "backpressure_waits": 0,
+            "queued": 0,
+            "in_flight": 0,
+        }
+
+    def _bind(self) -> None:
+        """Queue state belongs to one event loop; start afresh under a new loop."""
+        loop = asyncio.get_running_loop()
+        if loop is self._loop:
+            return
+        self._loop = loop
+        self._slots = asyncio.Semaphore(self.max_queue)
+        self._pending: List[Tuple[str, asyncio.Future, float]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._sending: Set[asyncio.Task] = set()
+        self.stats["queued"] = self.stats["in_flight"] = 0
+
+    async def embed(self, text: str) -> List[float]:
+        self.stats["requests"] += 1
+        if not text:
+            return [0] * settings.EMBEDDING_DIM
+        cached = _cache_get_memory(settings.OPENAI_EMBEDDING_MODEL, prepare_text(text))
+        if cached is not None:
+            self.stats["cache_hits"] += 1
+            return cached.tolist()
+
+        self._bind()
+        if self._slots.locked():
+            self.stats["backpressure_waits"] += 1
+        async with self._slots:
+            future = self._loop.create_future()
+            self._pending.append((text, future, time.perf_counter()))
+            self.stats["queued"] += 1
+            if len(self._pending) >= self.max_batch:
+                self._flush()
+            elif self._timer is None:
+                self._timer = self._loop.call_later(self.window, self._flush)
+            return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        task = self._loop.create_task(self._send(batch))
+        self._sending.add(task)
+        task.add_done_callback(self._sending.discard)
+
+    async def _send(self, batch: List[Tuple[str, asyncio.Future, float]]) -> None:
+        sent = time.perf_counter()
+        for _, _, queued_at in batch:
+            embedding_queue_wait_seconds.observe(sent - queued_at)
+        embedding_batch_size.observe(len(batch))
+        self.stats["batches"] += 1
+        self.stats["queued"] -= len(batch)
+        self.stats["in_flight"] += len(batch)
+        try:
+            vectors = await aget_embeddings([text for text, _, _ in batch])
+        except Exception as e:
+            vectors = None
+            error = e
+        finally:
+            self.stats["in_flight"] -= len(batch)
+        for i, (_, future, _) in enumerate(batch):
+            if future.done():
+                # The caller was cancelled while its batch was in flight
+                continue
+            if vectors is None:
+                future.set_exception(error)
+            else:
+                future.set_result(vectors[i])
+
+
+embedding_dispatcher = EmbeddingDispatcher(
+    window=settings.EMBEDDING_DISPATCH_WINDOW_SECONDS,
+    max_batch=settings.EMBEDDING_DISPATCH_MAX_BATCH,
+    max_queue=settings.EMBEDDING_DISPATCH_MAX_QUEUE
+)
+metrics.register_stats(
+    "rag_embedding_dispatch", "Embedding dispatcher requests, batches, backpressure waits and queue depth.",
+    lambda: embedding_dispatcher.stats
+)
+
+def get_embedding(text: str) -> List[float]:
+    """Generate an embedding for the given text."""
+    return get_embeddings([text])[0]
+
+async def aget_embedding(text: str) -> List[float]:
+    """
+    Async variant of get_embedding. Concurrent calls are micro-batched into
+    shared requests by the embedding dispatcher.
+    """
+    if settings.EMBEDDING_DISPATCH_ENABLED:
+        return await embedding_dispatcher.embed(text)
+    return (await aget_embeddings([text]))[0]
 
 def format_embedding_for_postgres(embedding: List[float]) -> str:
     """Format a list of floats as a Postgres array string."""
     return str(embedding).replace('[', '{').replace(']', '}')
 
+def parse_embedding_from_postgres(value: Any) -> Optional[List[float]]:
+    """Parse an embedding column (a Postgres array or pgvector string); None if it is empty."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.strip("[]{} ")
+        value = [float(part) for part in value.split(",")] if value else []
+    return list(value) or None
+
 def cosine_similarity(vec1: List[float], vec2: List[float]) -> float:
     """Calculate cosine similarity between two vectors."""
     a = np.array(vec1)
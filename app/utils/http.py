@@ -0,0 +1,96 @@
+import importlib.util
+import logging
+from contextvars import ContextVar
+from types import ModuleType
+from typing import TYPE_CHECKING, Optional, Tuple
+
+from app.config import settings
+
+if TYPE_CHECKING:
+    import aiohttp
+    import requests
+
+logger = logging.getLogger(__name__)
+
+_openai: Optional[ModuleType] = None
+
+
+def openai_module() -> ModuleType:
+    """
+    The ``openai`` module, imported and given the API key on first use.
+    Importing it (with aiohttp, requests and numpy helpers) is the largest
+    part of importing the app, so it is deferred to the warm-up.
+    """
+    global _openai
+    if _openai is None:
+        import openai
+        openai.api_key = settings.OPENAI_API_KEY
+        _openai = openai
+    return _openai
+
+
+def http2_available() -> bool:
+    """HTTP/2 is used where the client supports it and the optional ``h2`` package is installed."""
+    return settings.HTTP2_ENABLED and importlib.util.find_spec("h2") is not None
+
+
+def openai_timeout(read: float) -> Tuple[float, float]:
+    """
+    ``request_timeout`` for an OpenAI call: (connect, total) seconds. Without
+    one, the client waits up to ten minutes for a stalled upstream.
+    """
+    return (settings.HTTP_CONNECT_TIMEOUT_SECONDS, read)
+
+
+class OpenAITransport:
+    """
+    Pooled keep-alive sessions for the OpenAI client, opened and closed by
+    the app's lifespan. Without them the client opens a new aiohttp session
+    (and connection) for every async call. The aiohttp client only speaks
+    HTTP/1.1, so reuse comes from keep-alive.
+    """
+
+    def __init__(self):
+        self.session: Optional["aiohttp.ClientSession"] = None
+        self.requests_session: Optional["requests.Session"] = None
+        self._aiosession: Optional[ContextVar] = None
+
+    async def open(self) -> None:
+        if self.session is not None:
+            return
+        import aiohttp
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        openai = openai_module()
+        connector = aiohttp.TCPConnector(
+            limit=settings.HTTP_POOL_SIZE,
+            keepalive_timeout=settings.HTTP_KEEPALIVE_SECONDS,
+            ttl_dns_cache=300
+        )
+        self.session = aiohttp.ClientSession(connector=connector)
+        self.requests_session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=settings.HTTP_POOL_SIZE)
+        self.requests_session.mount("https://", adapter)
+        self.requests_session.mount("http://", adapter)
+
+        # openai reads the session from a ContextVar. Request tasks do not run in
+        # the lifespan's context, so a value set here would not reach them; the
+        # session is installed as the variable's default instead.
+        self._aiosession = openai.aiosession
+        openai.aiosession = ContextVar("aiohttp-session", default=self.session)
+        openai.requestssession = self.requests_session
+        logger.info(f"OpenAI connection pool opened (size {settings.HTTP_POOL_SIZE})")
+
+    async def close(self) -> None:
+        if self.session is None:
+            return
+        openai = openai_module()
+        openai.aiosession = self._aiosession
+        openai.requestssession = None
+        await self.session.close()
+        self.requests_session.close()
+        self.session = self.requests_session = None
+
+
+openai_transport = OpenAITransport()
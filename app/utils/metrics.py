@@ -0,0 +1,193 @@
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+
+# Stage and request latencies in seconds: a local analysis or cache hit takes
+# milliseconds, a completion several seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Waits that are a fraction of a request, such as a batching window
+WAIT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    value = float(value)
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+class Counter:
+    """A monotonically increasing count per label combination."""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(tuple(labels[name] for name in self.labelnames), 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        lines += [f"{self.name}{_labels(self.labelnames, key)} {_number(value)}" for key, value in values]
+        return lines
+
+
+class Histogram:
+    """
+    Observations counted into fixed buckets per label combination. Observing
+    is a bisect and three additions, so it can sit on every request.
+    """
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label combination: [per-bucket counts (the last is +Inf), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(labels[name] for name in self.labelnames)
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][slot] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """Observe the duration of the ``with`` block, including when it raises."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels: str) -> int:
+        series = self._series.get(tuple(labels[name] for name in self.labelnames))
+        return series[2] if series else 0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = sorted((key, list(series[0]), series[1], series[2]) for key, series in self._series.items())
+        for key, counts, total, count in snapshot:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Process-wide metrics rendered in the Prometheus text format. Besides
+    counters and histograms updated on the request path, components that
+    already keep a ``stats`` dict (caches, the query analyzer) are registered
+    as callbacks and only read when the metrics are scraped.
+    """
+
+    # The response adds "; charset=utf-8"
+    CONTENT_TYPE = "text/plain; version=0.0.4"
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._stats: Dict[str, Tuple[str, Callable[[], Dict[str, float]]]] = {}
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._metrics.setdefault(name, Counter(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._metrics.setdefault(name, Histogram(name, help, labelnames, buckets))
+
+    def register_stats(self, name: str, help: str, read: Callable[[], Dict[str, float]]) -> None:
+        """Expose a component's stats dict as ``name{stat="<key>"}`` samples, read at scrape time."""
+        self._stats[name] = (help, read)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines += metric.render()
+        for name, (help, read) in self._stats.items():
+            try:
+                stats = read()
+            except Exception:
+                continue
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} untyped"]
+            lines += [
+                f'{name}{{stat="{_escape(key)}"}} {_number(value)}'
+                for key, value in stats.items() if isinstance(value, (int, float))
+            ]
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+request_seconds = metrics.histogram(
+    "rag_request_seconds", "End-to-end chat request latency in seconds.", ["endpoint"]
+)
+requests_total = metrics.counter(
+    "rag_requests_total", "Chat requests by endpoint and outcome.", ["endpoint", "outcome"]
+)
+stage_seconds = metrics.histogram(
+    "rag_stage_seconds", "Latency of each pipeline stage in seconds.", ["stage"]
+)
+tokens_total = metrics.counter(
+    "rag_tokens_total",
+    "Chat-model tokens by kind: prompt, completion, and the context and history shares of the prompt.",
+    ["kind"]
+)
+fallbacks_total = metrics.counter(
+    "rag_fallbacks_total", "Searches that fell back from pgvector, by search and reason.", ["search", "reason"]
+)
+embedding_batch_size = metrics.histogram(
+    "rag_embedding_dispatch_batch_size", "Texts per batch sent by the embedding dispatcher.", buckets=SIZE_BUCKETS
+)
+embedding_queue_wait_seconds = metrics.histogram(
+    "rag_embedding_dispatch_queue_wait_seconds",
+    "Time a text waited in the embedding dispatcher before its batch was sent.",
+    buckets=WAIT_BUCKETS
+)
+llm_queue_wait_seconds = metrics.histogram(
+    "rag_llm_queue_wait_seconds", "Time answer completions waited for a slot, by priority.", ["priority"]
+)
+llm_shed_total = metrics.counter(
+    "rag_llm_shed_total", "Requests answered with 503 because no completion slot was free in time, by reason.",
+    ["reason"]
+)
@@ -1,10 +1,93 @@
+import threading
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
 from app.config import settings
-from supabase import create_client, Client
+from app.utils.http import http2_available
+
+if TYPE_CHECKING:
+    import httpx
+    from postgrest import SyncPostgrestClient, SyncFilterRequestBuilder, SyncRequestBuilder
+
+
+def _postgrest_client(base_url: str, headers: Dict[str, str], timeout: "httpx.Timeout",
+                      transport: "httpx.HTTPTransport") -> "SyncPostgrestClient":
+    """A PostgREST client whose session sends through the shared connection pool."""
+    from postgrest import SyncPostgrestClient
+    from postgrest.utils import SyncClient
 
-def get_supabase_client() -> Client:
-    return create_client(
-        settings.SUPABASE_URL, 
-        settings.SUPABASE_KEY
+    client = SyncPostgrestClient(base_url, headers=headers, timeout=timeout)
+    # Replace the session it built (before any connection is made) with one on the pool
+    client.session.close()
+    client.session = SyncClient(
+        base_url=base_url, headers=client.session.headers, timeout=timeout, transport=transport
     )
+    return client
+
+
+class SupabaseClient:
+    """
+    The Supabase (PostgREST) tables and RPCs used by the app, over one pooled
+    keep-alive connection pool (HTTP/2 where available). Nothing is
+    imported or connected until the pool is opened. ``table``/``rpc``
+    serve the request path with short timeouts; ``bulk`` shares the pool
+    with longer read timeouts for full-table loads and ingestion writes.
+    The lifespan opens and closes the pool; scripts that use the client
+    outside the app get one opened on first use.
+    """
+
+    def __init__(self):
+        self._transport: Optional["httpx.HTTPTransport"] = None
+        self._query: Optional["SyncPostgrestClient"] = None
+        self._bulk: Optional["SyncPostgrestClient"] = None
+        self._lock = threading.Lock()
+
+    def open(self) -> None:
+        with self._lock:
+            if self._transport is not None:
+                return
+            import httpx
+
+            limits = httpx.Limits(
+                max_connections=settings.HTTP_POOL_SIZE,
+                max_keepalive_connections=settings.HTTP_POOL_SIZE,
+                keepalive_expiry=settings.HTTP_KEEPALIVE_SECONDS
+            )
+            transport = httpx.HTTPTransport(limits=limits, http2=http2_available(), retries=1)
+            base_url = f"{settings.SUPABASE_URL}/rest/v1"
+            headers = {"apiKey": settings.SUPABASE_KEY, "Authorization": f"Bearer {settings.SUPABASE_KEY}"}
+            connect = settings.HTTP_CONNECT_TIMEOUT_SECONDS
+            self._query = _postgrest_client(
+                base_url, headers, httpx.Timeout(settings.SUPABASE_QUERY_TIMEOUT_SECONDS, connect=connect), transport
+            )
+            self._bulk = _postgrest_client(
+                base_url, headers, httpx.Timeout(settings.SUPABASE_BULK_TIMEOUT_SECONDS, connect=connect), transport
+            )
+            self._transport = transport
+
+    def close(self) -> None:
+        with self._lock:
+            if self._transport is None:
+                return
+            self._transport.close()
+            self._transport = self._query = self._bulk = None
+
+    def _client(self) -> "SyncPostgrestClient":
+        if self._query is None:
+            self.open()
+        return self._query
+
+    def table(self, table_name: str) -> "SyncRequestBuilder":
+        return self._client().from_(table_name)
+
+    def rpc(self, fn: str, params: Dict[Any, Any]) -> "SyncFilterRequestBuilder":
+        return self._client().rpc(fn, params)
+
+    @property
+    def bulk(self) -> "SyncPostgrestClient":
+        """Client for full-table reads and batch writes; use ``supabase.bulk.table(name)``."""
+        if self._bulk is None:
+            self.open()
+        return self._bulk
+
 
-supabase = get_supabase_client()
+supabase = SupabaseClient()
@@ -0,0 +1,37 @@
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+from app.config import settings
+
+# Chat format overhead: tokens added around every message and to prime the reply
+MESSAGE_OVERHEAD_TOKENS = 3
+REPLY_PRIMER_TOKENS = 3
+
+
+@lru_cache(maxsize=8)
+def _encoding(model: str):
+    # Imported on first use (the warm-up), since loading it slows app import
+    try:
+        import tiktoken
+    except ImportError:  # Counts fall back to a character heuristic
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+@lru_cache(maxsize=16384)
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """Number of tokens in ``text`` for the chat model (cached, since history repeats every turn)."""
+    encoding = _encoding(model or settings.OPENAI_CHAT_MODEL)
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(messages: List[Dict[str, str]], model: Optional[str] = None) -> int:
+    """Prompt tokens for a list of chat messages, including the chat format overhead."""
+    return sum(
+        MESSAGE_OVERHEAD_TOKENS + count_tokens(message["content"], model) for message in messages
+    ) + REPLY_PRIMER_TOKENS
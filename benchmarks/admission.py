@@ -0,0 +1,163 @@
+"""
+Admission control for answer completions when the model slows down. The
+chat model is simulated as a provider that serves at most --capacity
+completions at a time, taking --service seconds each, and queues the rest
+in arrival order (as an overloaded API does). A burst of --requests
+concurrent POST /api/chat calls, every --high-every-th one carrying a risk
+phrase, is sent with the scheduler effectively off (no cap, no deadline)
+and on (cap = capacity, --deadline). Reports latency and completion-queue
+wait for high-risk and other requests, and how many were shed with 503.
+
+    python -m benchmarks.admission --requests 60 --capacity 4 --service 0.5 --deadline 2
+"""
+import argparse
+import asyncio
+import sys
+import time
+from contextlib import ExitStack
+from typing import Any, Dict, List
+from unittest import mock
+
+import numpy as np
+
+from benchmarks.fakes import FakeOpenAI, FakeSupabase, Latency
+
+NORMAL = "I've been feeling stressed about exams, any tips? (#{})"
+HIGH = "Everything feels hopeless and I can't go on anymore (#{})"
+
+
+class SlowProvider:
+    """Stands in for LLM.generate_response: ``capacity`` completions at a time, FIFO behind them."""
+
+    def __init__(self, capacity: int, service: float):
+        self.semaphore = asyncio.Semaphore(capacity)
+        self.service = service
+        self.in_flight = 0
+        self.peak = 0
+
+    async def generate_response(self, query: str, **kwargs) -> str:
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            async with self.semaphore:
+                await asyncio.sleep(self.service)
+        finally:
+            self.in_flight -= 1
+        return f"Here is some support for: {query}"
+
+
+def summary(values: List[float]) -> str:
+    if not values:
+        return f"{'-':>9}{'-':>9}"
+    ms = np.asarray(values) * 1000
+    return f"{np.percentile(ms, 50):>9.0f}{np.percentile(ms, 95):>9.0f}"
+
+
+async def burst(label: str, args, client) -> Dict[str, Any]:
+    from app.api import routes
+    from app.core.context import RequestContext
+
+    contexts: Dict[str, RequestContext] = {}
+
+    class RecordedContext(RequestContext):
+        def __init__(self, *a, **kw):
+            super().__init__(*a, **kw)
+            contexts[self.query] = self
+
+    async def one(number: int):
+        high = number % args.high_every == 0
+        query = (HIGH if high else NORMAL).format(f"{label}-{number}")
+        started = time.perf_counter()
+        response = await client.post("/api/chat", json={"query": query, "chat_history": []})
+        return high, query, response.status_code, time.perf_counter() - started
+
+    with mock.patch.object(routes, "RequestContext", RecordedContext):
+        results = await asyncio.gather(*(one(number) for number in range(args.requests)))
+
+    row: Dict[str, Any] = {"label": label, "shed": {"high": 0, "normal": 0}}
+    for group in ("high", "normal"):
+        answered = [r for r in results if r[0] == (group == "high") and r[2] == 200]
+        shed = [r for r in results if r[0] == (group == "high") and r[2] == 503]
+        row["shed"][group] = len(shed)
+        row[group] = [latency for _, _, _, latency in answered]
+        row[f"{group}_wait"] = [contexts[query].timings.get("llm_queue", 0.0) for _, query, _, _ in answered]
+        row[f"{group}_shed_latency"] = [latency for _, _, _, latency in shed]
+        print(f"{label:<6}{group:<8}{len(answered):>6}{len(shed):>6}{summary(row[group])}{summary(row[f'{group}_wait'])}"
+              f"{summary(row[f'{group}_shed_latency'])}")
+    row["errors"] = sum(1 for r in results if r[2] not in (200, 503))
+    return row
+
+
+async def run(args) -> int:
+    import httpx
+    from app.core.llm import LLM
+    from app.core.llm_scheduler import completion_scheduler
+    from app.core.reference_data import reference_data
+    from app.core.vector_index import article_index
+    from app.main import app
+
+    failures = []
+    rows = {}
+    async with app.router.lifespan_context(app):
+        await reference_data.refresh()
+        await article_index.ensure_loaded()
+        async with httpx.AsyncClient(app=app, base_url="http://benchmark", timeout=None) as client:
+            print(f"{'mode':<6}{'group':<8}{'ok':>6}{'503':>6}{'p50 ms':>9}{'p95 ms':>9}"
+                  f"{'wait50':>9}{'wait95':>9}{'503 p50':>9}{'503 p95':>9}")
+            for label, cap, deadline in (("off", 10 ** 6, 3600.0), ("on", args.capacity, args.deadline)):
+                provider = SlowProvider(args.capacity, args.service)
+                with ExitStack() as stack:
+                    stack.enter_context(mock.patch.object(LLM, "generate_response", provider.generate_response))
+                    stack.enter_context(mock.patch.object(completion_scheduler, "max_concurrent", cap))
+                    stack.enter_context(mock.patch.object(completion_scheduler, "deadline", deadline))
+                    rows[label] = await burst(label, args, client)
+                rows[label]["peak"] = provider.peak
+    on, off = rows["on"], rows["off"]
+    print(f"completions in flight at the provider: peak {off['peak']} without the scheduler, {on['peak']} with it")
+
+    if on["peak"] > args.capacity:
+        failures.append(f"{on['peak']} completions in flight with a cap of {args.capacity}")
+    if on["errors"] or off["errors"]:
+        failures.append("requests failed with errors other than 503")
+    if on["shed"]["high"] > 0 and on["shed"]["normal"] < args.requests - args.requests // args.high_every:
+        failures.append("high-risk requests were shed while normal ones were answered")
+    shed_latencies = on["high_shed_latency"] + on["normal_shed_latency"]
+    if shed_latencies and max(shed_latencies) > args.deadline + 1.0:
+        failures.append(f"a shed request took {max(shed_latencies):.1f}s, deadline {args.deadline:.1f}s")
+    # Completions that can start within the deadline; high-risk requests go first, so all of them fit
+    high_total = len(range(0, args.requests, args.high_every))
+    if high_total <= args.capacity * args.deadline / args.service and len(on["high"]) < high_total:
+        failures.append(f"only {len(on['high'])}/{high_total} high-risk requests were answered")
+    if off["high"] and on["high"] and np.percentile(on["high"], 95) >= np.percentile(off["high"], 95):
+        failures.append("high-risk p95 latency did not improve")
+    if failures:
+        print("FAIL: " + "; ".join(failures))
+        return 1
+    print("OK")
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=60)
+    parser.add_argument("--high-every", type=int, default=6, help="every Nth request carries a risk phrase")
+    parser.add_argument("--capacity", type=int, default=4, help="completions the slow model serves at once")
+    parser.add_argument("--service", type=float, default=0.5, help="seconds per completion")
+    parser.add_argument("--deadline", type=float, default=2.0, help="queue deadline with the scheduler on")
+    args = parser.parse_args()
+
+    import logging
+    from app.config import settings
+
+    logging.disable(logging.WARNING)
+    openai_fake = FakeOpenAI(chat_latency=Latency("0.05"), embedding_latency=Latency("0.02"))
+    supabase_fake = FakeSupabase(articles=50, sections_per_article=4, clinics=20, latency=Latency("0.005"))
+    with ExitStack() as stack:
+        for patch in openai_fake.patches() + supabase_fake.patches():
+            stack.enter_context(patch)
+        stack.enter_context(mock.patch.object(settings, "ANSWER_CACHE_ENABLED", False))
+        return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+"""
+Throughput of POST /api/chat/batch against the same queries sent as
+sequential and as concurrent POST /api/chat calls, with OpenAI and Supabase
+replaced by the fakes. Reports wall time, CPU time per query (throughput
+per core), embedding requests and Supabase calls, and checks that the batch
+retrieves the same articles as single calls.
+
+    python -m benchmarks.batch --queries 200 --chat-latency 0.05 --rpc
+"""
+import argparse
+import asyncio
+import sys
+import time
+from contextlib import ExitStack
+from unittest import mock
+
+from benchmarks.fakes import FakeOpenAI, FakeSupabase, Latency
+
+TOPICS = ["anxiety before work", "trouble sleeping", "feeling low and unmotivated", "grief after a loss",
+          "burnout at my job", "panic attacks", "finding a therapist who takes my insurance"]
+
+
+def queries(count: int):
+    return [f"Can you help with {TOPICS[i % len(TOPICS)]}? (question {i})" for i in range(count)]
+
+
+async def measure(label: str, openai_fake: FakeOpenAI, supabase_fake: FakeSupabase, send) -> dict:
+    from app.utils.embedding_cache import embedding_cache
+
+    # Every mode pays for its own embeddings
+    embedding_cache.clear()
+    embeddings, calls = openai_fake.embedding_calls, supabase_fake.calls
+    wall, cpu = time.perf_counter(), time.process_time()
+    results = await send()
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    report = {
+        "label": label, "results": results, "wall": wall, "cpu": cpu,
+        "embedding_requests": openai_fake.embedding_calls - embeddings,
+        "supabase_calls": supabase_fake.calls - calls,
+    }
+    print(f"{label:<24}{wall:>9.2f}{cpu / len(results) * 1000:>12.2f}{len(results) / cpu:>12.1f}"
+          f"{report['embedding_requests']:>12}{report['supabase_calls']:>10}")
+    return report
+
+
+async def run(args, openai_fake: FakeOpenAI, supabase_fake: FakeSupabase) -> int:
+    import httpx
+    from app.core.reference_data import reference_data
+    from app.core.vector_index import article_index
+    from app.main import app
+
+    requests = [{"query": query, "chat_history": []} for query in queries(args.queries)]
+    async with app.router.lifespan_context(app):
+        await reference_data.refresh()
+        await article_index.ensure_loaded()
+        await reference_data.clinic_vectors()
+        async with httpx.AsyncClient(app=app, base_url="http://benchmark", timeout=None) as client:
+            async def sequential():
+                return [(await client.post("/api/chat", json=request)).json() for request in requests]
+
+            async def concurrent():
+                semaphore = asyncio.Semaphore(args.concurrency)
+
+                async def one(request):
+                    async with semaphore:
+                        return (await client.post("/api/chat", json=request)).json()
+                return await asyncio.gather(*(one(request) for request in requests))
+
+            async def batch():
+                response = await client.post("/api/chat/batch", json={"requests": requests})
+                return response.json()["results"]
+
+            print(f"{'mode':<24}{'wall s':>9}{'CPU ms/q':>12}{'q/CPU-s':>12}{'embed reqs':>12}{'DB calls':>10}")
+            single = await measure("sequential /api/chat", openai_fake, supabase_fake, sequential)
+            await measure(f"{args.concurrency} concurrent /api/chat", openai_fake, supabase_fake, concurrent)
+            batched = await measure("/api/chat/batch", openai_fake, supabase_fake, batch)
+
+    failures = []
+    errors = sum(1 for result in batched["results"] if not result.get("articles"))
+    if errors:
+        failures.append(f"{errors} batch results without articles")
+    if not args.rpc:
+        # Both paths score the same local index, so they must agree
+        same = sum(
+            [article["id"] for article in a["articles"]] == [article["id"] for article in b["articles"]]
+            for a, b in zip(single["results"], batched["results"])
+        )
+        print(f"same articles as single calls: {same}/{len(requests)}")
+        if same != len(requests):
+            failures.append("batch articles differ from single calls")
+    speedup = (single["cpu"] / len(single["results"])) / (batched["cpu"] / len(batched["results"]))
+    print(f"CPU per query: batch is {speedup:.1f}x cheaper than sequential single calls")
+    if failures:
+        print("FAIL: " + "; ".join(failures))
+        return 1
+    print("OK")
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8, help="clients for the concurrent single calls")
+    parser.add_argument("--rpc", action="store_true",
+                        help="pgvector RPCs available (single calls use them); otherwise both use the local index")
+    parser.add_argument("--chat-latency", type=Latency, default=Latency("0.05"))
+    parser.add_argument("--embedding-latency", type=Latency, default=Latency("0.05"))
+    parser.add_argument("--db-latency", type=Latency, default=Latency("0.005"))
+    parser.add_argument("--articles", type=int, default=200)
+    parser.add_argument("--clinics", type=int, default=100)
+    args = parser.parse_args()
+
+    import logging
+    from app.config import settings
+
+    logging.disable(logging.WARNING)
+    openai_fake = FakeOpenAI(chat_latency=args.chat_latency, embedding_latency=args.embedding_latency)
+    supabase_fake = FakeSupabase(articles=args.articles, sections_per_article=6, clinics=args.clinics,
+                                 latency=args.db_latency, rpc_available=args.rpc)
+    with ExitStack() as stack:
+        for patch in openai_fake.patches() + supabase_fake.patches():
+            stack.enter_context(patch)
+        stack.enter_context(mock.patch.object(settings, "ANSWER_CACHE_ENABLED", False))
+        return asyncio.run(run(args, openai_fake, supabase_fake))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,57 @@
+"""
+Checks that concurrent chat requests overlap their I/O instead of queueing
+behind one another on the event loop.
+
+    python -m benchmarks.concurrency --requests 20 --chat-latency 0.2
+"""
+import argparse
+import asyncio
+import sys
+import time
+from contextlib import ExitStack
+
+from benchmarks.fakes import FakeOpenAI, FakeSupabase
+
+
+async def run(requests: int) -> float:
+    from app.core.rag import RAG
+
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        RAG.process_query(f"I need a therapist for anxiety #{i}") for i in range(requests)
+    ))
+    return time.perf_counter() - started
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--chat-latency", type=float, default=0.2)
+    parser.add_argument("--embedding-latency", type=float, default=0.05)
+    parser.add_argument("--db-latency", type=float, default=0.02)
+    args = parser.parse_args()
+
+    openai_fake = FakeOpenAI(chat_latency=args.chat_latency, embedding_latency=args.embedding_latency)
+    supabase_fake = FakeSupabase(latency=args.db_latency)
+    with ExitStack() as stack:
+        for patch in openai_fake.patches() + supabase_fake.patches():
+            stack.enter_context(patch)
+        single = asyncio.run(run(1))
+        concurrent = asyncio.run(run(args.requests))
+
+    serial_estimate = single * args.requests
+    speedup = serial_estimate / concurrent
+    print(f"one request:      {single * 1000:8.1f} ms")
+    print(f"{args.requests:3d} concurrent:   {concurrent * 1000:8.1f} ms "
+          f"(serial would be ~{serial_estimate * 1000:.0f} ms, speedup {speedup:.1f}x)")
+
+    # Requests that truly overlap finish in a small multiple of one request's time.
+    if speedup < args.requests / 2:
+        print("FAIL: requests are not overlapping")
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
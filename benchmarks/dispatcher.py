@@ -0,0 +1,115 @@
+"""
+Embedding throughput of concurrent single-text callers (as under concurrent
+chat requests) against a rate-limited provider, with and without the
+embedding dispatcher. Without it every caller sends its own request, so
+once the provider's requests-per-second limit is reached the excess calls
+fail and fall back to zero vectors; with it, callers arriving within the
+batching window share one multi-input request. Reports successful
+embeddings per second, p50/p95 latency and the dispatcher's batch sizes.
+
+    python -m benchmarks.dispatcher --clients 64 --texts 2000 --rate-limit 50
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import itertools
+import sys
+import time
+from contextlib import ExitStack
+from typing import Any, Dict, List
+from unittest import mock
+
+import numpy as np
+
+from benchmarks.fakes import FakeOpenAI, Latency
+
+TEXT_NUMBERS = itertools.count()
+
+
+async def measure(label: str, args, openai_fake: FakeOpenAI) -> Dict[str, Any]:
+    from app.utils.embeddings import aget_embedding
+
+    latencies: List[float] = []
+    succeeded = 0
+    issued = 0
+
+    async def client() -> None:
+        nonlocal succeeded, issued
+        while issued < args.texts:
+            issued += 1
+            started = time.perf_counter()
+            vector = await aget_embedding(f"How do I cope with stress at work? (text {next(TEXT_NUMBERS)})")
+            latencies.append(time.perf_counter() - started)
+            if any(vector):
+                succeeded += 1
+
+    calls, rejections = openai_fake.embedding_calls, openai_fake.embedding_rejections
+    started = time.perf_counter()
+    # Failed requests print an error each; keep the report readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        await asyncio.gather(*(client() for _ in range(args.clients)))
+    elapsed = time.perf_counter() - started
+    ms = np.asarray(latencies) * 1000
+    report = {
+        "label": label,
+        "succeeded": succeeded,
+        "rate": succeeded / elapsed,
+        "p50": float(np.percentile(ms, 50)),
+        "p95": float(np.percentile(ms, 95)),
+        "requests": openai_fake.embedding_calls - calls,
+        "rejected": openai_fake.embedding_rejections - rejections,
+    }
+    print(f"{label:<18}{succeeded:>6}/{args.texts:<6}{report['rate']:>10.1f}{report['p50']:>10.1f}"
+          f"{report['p95']:>10.1f}{report['requests']:>10}{report['rejected']:>10}")
+    return report
+
+
+async def run(args, openai_fake: FakeOpenAI) -> int:
+    from app.config import settings
+    from app.utils.embeddings import embedding_dispatcher
+    from app.utils.metrics import embedding_batch_size
+
+    print(f"{'mode':<18}{'embedded':>13}{'emb/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'requests':>10}{'rejected':>10}")
+    with mock.patch.object(settings, "EMBEDDING_DISPATCH_ENABLED", False):
+        direct = await measure("per-call requests", args, openai_fake)
+    # Let the provider's rate window clear before the second run
+    await asyncio.sleep(1.0)
+    batches = embedding_batch_size.count()
+    dispatched = await measure("dispatcher", args, openai_fake)
+    batches = embedding_batch_size.count() - batches
+    print(f"dispatcher: {batches} batches, {args.texts / max(batches, 1):.1f} texts per batch, "
+          f"{embedding_dispatcher.stats['backpressure_waits']} backpressure waits")
+
+    failures = []
+    if dispatched["succeeded"] != args.texts:
+        failures.append(f"dispatcher embedded {dispatched['succeeded']}/{args.texts} texts")
+    if dispatched["rate"] <= direct["rate"]:
+        failures.append("dispatcher did not embed more texts per second")
+    print(f"successful embeddings per second: {dispatched['rate'] / max(direct['rate'], 1e-9):.1f}x")
+    if failures:
+        print("FAIL: " + "; ".join(failures))
+        return 1
+    print("OK")
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--texts", type=int, default=2000, help="texts embedded per mode")
+    parser.add_argument("--rate-limit", type=int, default=50, help="provider embedding requests per second")
+    parser.add_argument("--embedding-latency", type=Latency, default=Latency("lognormal:0.05,0.3"))
+    args = parser.parse_args()
+
+    import logging
+    logging.disable(logging.WARNING)
+    openai_fake = FakeOpenAI(embedding_latency=args.embedding_latency, embedding_rate_limit=args.rate_limit)
+    with ExitStack() as stack:
+        for patch in openai_fake.patches():
+            stack.enter_context(patch)
+        return asyncio.run(run(args, openai_fake))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
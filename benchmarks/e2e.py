@@ -0,0 +1,229 @@
+"""
+End-to-end latency and throughput of POST /api/chat with OpenAI and
+Supabase replaced by local fakes. The FastAPI app (including its lifespan)
+is driven in-process at fixed concurrency levels, once with the pgvector
+RPCs available and once with them failing, so the local-index fallback
+serves retrieval. Reports p50/p95/p99 latency, throughput and per-stage
+timings, and writes them as JSON; pass an earlier file to --compare to see
+what changed.
+
+Latencies take a distribution spec: 0.2, uniform:0.1,0.3, normal:0.2,0.05
+or lognormal:0.2,0.5 (median, sigma).
+
+    python -m benchmarks.e2e --concurrency 1,8,32 --requests 200 \\
+        --chat-latency lognormal:0.8,0.4 --output before.json
+    python -m benchmarks.e2e --output after.json --compare before.json
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import itertools
+import json
+import logging
+import platform
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List
+from unittest import mock
+
+import numpy as np
+
+from benchmarks.fakes import FakeOpenAI, FakeSupabase, Latency
+
+QUERIES = [
+    "I have been feeling anxious before work every morning",
+    "How can I sleep better when my mind keeps racing?",
+    "I need a therapist for depression who takes my insurance",
+    "What are some ways to cope with grief after losing a parent?",
+    "I feel burnt out and can't focus, what should I do?",
+    "Can you recommend a clinic for anxiety near me?",
+]
+# Unique across levels and paths, so no cache answers a query seen in an earlier level
+QUERY_NUMBERS = itertools.count()
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    ms = np.asarray(values) * 1000
+    return {
+        "p50": round(float(np.percentile(ms, 50)), 2),
+        "p95": round(float(np.percentile(ms, 95)), 2),
+        "p99": round(float(np.percentile(ms, 99)), 2),
+        "mean": round(float(ms.mean()), 2),
+        "max": round(float(ms.max()), 2),
+    }
+
+
+async def drive(client, concurrency: int, requests: int, contexts: list) -> Dict[str, Any]:
+    """Closed loop: ``concurrency`` clients send requests back to back until ``requests`` are done."""
+    latencies, errors = [], 0
+    issued = 0
+    contexts.clear()
+
+    async def user() -> None:
+        nonlocal issued, errors
+        while issued < requests:
+            issued += 1
+            number = next(QUERY_NUMBERS)
+            query = f"{QUERIES[number % len(QUERIES)]} (#{number})"
+            started = time.perf_counter()
+            response = await client.post("/api/chat", json={"query": query, "chat_history": []})
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    stages: Dict[str, List[float]] = {}
+    for context in contexts:
+        for stage, seconds in context.timings.items():
+            stages.setdefault(stage, []).append(seconds)
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(requests / elapsed, 2),
+        "latency_ms": percentiles(latencies),
+        "stages_ms": {stage: percentiles(values) for stage, values in sorted(stages.items())},
+    }
+
+
+async def run_path(path: str, args) -> List[Dict[str, Any]]:
+    import httpx
+    from app.api import routes
+    from app.core.context import RequestContext
+    from app.core.reference_data import reference_data
+    from app.core.vector_index import article_index
+    from app.main import app
+
+    contexts: list = []
+
+    class RecordedContext(RequestContext):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            contexts.append(self)
+
+    results = []
+    with mock.patch.object(routes, "RequestContext", RecordedContext):
+        async with app.router.lifespan_context(app):
+            # Wait for the startup loads so they are not part of the measurement
+            await reference_data.refresh()
+            await article_index.ensure_loaded()
+            async with httpx.AsyncClient(app=app, base_url="http://benchmark", timeout=None) as client:
+                for concurrency in args.concurrency:
+                    requests = max(args.requests, concurrency)
+                    result = await drive(client, concurrency, requests, contexts)
+                    result["path"] = path
+                    results.append(result)
+                    latency = result["latency_ms"]
+                    print(f"{path:<9}{concurrency:>6}{result['throughput_rps']:>10.1f}{latency['p50']:>10.1f}"
+                          f"{latency['p95']:>10.1f}{latency['p99']:>10.1f}{result['errors']:>8}", file=sys.__stdout__)
+    return results
+
+
+async def run(args) -> List[Dict[str, Any]]:
+    """Every path runs on one event loop: the app's module-level singletons hold asyncio locks."""
+    from app.config import settings
+
+    results = []
+    for path in args.paths:
+        with contextlib.ExitStack() as stack:
+            for patch in fakes(path, args):
+                stack.enter_context(patch)
+            stack.enter_context(mock.patch.object(settings, "ANSWER_CACHE_ENABLED", args.answer_cache))
+            # The app prints progress for every request; keep the report readable
+            stack.enter_context(contextlib.redirect_stdout(io.StringIO()))
+            results += await run_path(path, args)
+    return results
+
+
+def fakes(path: str, args) -> list:
+
+    openai_fake = FakeOpenAI(
+        chat_latency=args.chat_latency, embedding_latency=args.embedding_latency, prompt_latency=args.prompt_latency
+    )
+    supabase_fake = FakeSupabase(
+        articles=args.articles, sections_per_article=args.sections, clinics=args.clinics,
+        latency=args.db_latency, rpc_available=(path == "pgvector")
+    )
+    return openai_fake.patches() + supabase_fake.patches()
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(results: List[Dict[str, Any]], baseline_path: str) -> None:
+    with open(baseline_path, encoding="utf-8") as handle:
+        baseline = {(row["path"], row["concurrency"]): row for row in json.load(handle)["results"]}
+    print(f"\nchange against {baseline_path} (negative latency change is better)")
+    print(f"{'path':<9}{'conc.':>6}{'rps':>10}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for row in results:
+        old = baseline.get((row["path"], row["concurrency"]))
+        if old is None:
+            continue
+
+        def change(new: float, before: float) -> str:
+            return f"{(new - before) / before * 100:+.1f}%" if before else "n/a"
+        print(f"{row['path']:<9}{row['concurrency']:>6}{change(row['throughput_rps'], old['throughput_rps']):>10}"
+              + "".join(f"{change(row['latency_ms'][p], old['latency_ms'][p]):>10}" for p in ("p50", "p95", "p99")))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", default="1,8,32",
+                        type=lambda value: [int(level) for level in value.split(",")])
+    parser.add_argument("--requests", type=int, default=100, help="requests per concurrency level")
+    parser.add_argument("--paths", default="pgvector,fallback", type=lambda value: value.split(","))
+    parser.add_argument("--chat-latency", type=Latency, default=Latency("lognormal:0.3,0.3"))
+    parser.add_argument("--embedding-latency", type=Latency, default=Latency("lognormal:0.05,0.3"))
+    parser.add_argument("--db-latency", type=Latency, default=Latency("lognormal:0.01,0.5"))
+    parser.add_argument("--prompt-latency", type=float, default=0.05, help="seconds per 1000 prompt tokens")
+    parser.add_argument("--articles", type=int, default=200)
+    parser.add_argument("--sections", type=int, default=6)
+    parser.add_argument("--clinics", type=int, default=100)
+    parser.add_argument("--answer-cache", action="store_true", help="leave the semantic answer cache on")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="results JSON of an earlier run to compare with")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    print(f"{'path':<9}{'conc.':>6}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    results = asyncio.run(run(args))
+
+    report = {
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "config": {key: value if isinstance(value, (int, float, str, list, bool, type(None))) else str(value)
+                   for key, value in vars(args).items() if key not in ("output", "compare")},
+        "results": results,
+    }
+    print("\nstage p50 / p95 ms at the highest concurrency:")
+    for row in results:
+        if row["concurrency"] == max(args.concurrency):
+            stages = ", ".join(f"{stage} {values['p50']:.0f}/{values['p95']:.0f}"
+                               for stage, values in row["stages_ms"].items())
+            print(f"  {row['path']}: {stages}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(report, handle, indent=2)
+        print(f"\nresults written to {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+    return 1 if any(row["errors"] for row in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,333 @@
+"""
+Local stand-ins for OpenAI and Supabase used by the benchmark scripts.
+Latencies are configurable so the app's I/O behaviour can be measured
+without network access or API keys.
+"""
+import asyncio
+import hashlib
+import os
+import random
+import time
+from typing import Any, Dict, List, Union
+
+import numpy as np
+
+# The app builds its clients at import time; give it syntactically valid settings.
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "local.benchmark.key")
+os.environ.setdefault("OPENAI_API_KEY", "sk-local-benchmark")
+os.environ.setdefault("EMBEDDING_CACHE_PATH", "")
+os.environ.setdefault("VECTOR_INDEX_PATH", "")
+
+from openai.openai_object import OpenAIObject
+
+EMBEDDING_DIM = 1536
+
+
+class Latency:
+    """
+    A latency distribution in seconds, parsed from a spec: ``0.2`` (fixed),
+    ``uniform:0.1,0.3``, ``normal:0.2,0.05`` (mean, std. dev.) or
+    ``lognormal:0.2,0.5`` (median, sigma; long-tailed like real APIs).
+    Samples are never negative.
+    """
+
+    def __init__(self, spec: Union[str, float] = 0.0, seed: int = None):
+        self.spec = str(spec)
+        kind, _, params = self.spec.partition(":")
+        if not params:
+            kind, params = "fixed", kind
+        self.kind = kind
+        self.params = [float(value) for value in params.split(",")]
+        self._rng = random.Random(seed)
+
+    def sample(self) -> float:
+        if self.kind == "fixed":
+            return self.params[0]
+        if self.kind == "uniform":
+            return self._rng.uniform(*self.params)
+        if self.kind == "normal":
+            return max(0.0, self._rng.gauss(*self.params))
+        if self.kind == "lognormal":
+            median, sigma = self.params
+            return median * self._rng.lognormvariate(0.0, sigma) if median else 0.0
+        raise ValueError(f"unknown latency distribution {self.spec}")
+
+    def __repr__(self) -> str:
+        return self.spec
+
+
+def delay(latency: Union[Latency, float]) -> float:
+    """One latency sample; plain numbers are fixed latencies."""
+    return latency.sample() if isinstance(latency, Latency) else latency
+
+
+def fake_vector(text: str) -> List[float]:
+    """Deterministic pseudo-embedding for a text."""
+    seed = int(hashlib.md5(text.encode("utf-8")).hexdigest()[:8], 16)
+    return np.random.default_rng(seed).standard_normal(EMBEDDING_DIM).astype(np.float32).tolist()
+
+
+class FakeOpenAI:
+    """Replacement for openai.ChatCompletion / openai.Embedding create and acreate."""
+
+    def __init__(self, chat_latency: Union[Latency, float] = 0.0, embedding_latency: Union[Latency, float] = 0.0,
+                 token_latency: Union[Latency, float] = 0.0, prompt_latency: float = 0.0,
+                 embedding_rate_limit: int = 0):
+        self.chat_latency = chat_latency
+        self.embedding_latency = embedding_latency
+        self.token_latency = token_latency
+        # Extra time to first token per 1000 prompt tokens
+        self.prompt_latency = prompt_latency
+        self.chat_calls = 0
+        self.embedding_calls = 0
+        # Embedding requests allowed per second (0: unlimited); requests over
+        # the limit fail with RateLimitError, like the real API
+        self.embedding_rate_limit = embedding_rate_limit
+        self.embedding_rejections = 0
+        self._embedding_times: List[float] = []
+        self.prompt_tokens: List[int] = []
+
+    @staticmethod
+    def _prompt_tokens(messages: List[Dict[str, str]]) -> int:
+        return sum(len(message["content"]) // 4 + 4 for message in messages) + 3
+
+    def _latency(self, messages: List[Dict[str, str]]) -> float:
+        return delay(self.chat_latency) + self.prompt_latency * self._prompt_tokens(messages) / 1000
+
+    def _chat_response(self, messages: List[Dict[str, str]]) -> OpenAIObject:
+        system = messages[0]["content"]
+        if "query analyzer" in system:
+            content = ('{"topics": ["anxiety"], "emotional_state": "worried", '
+                       '"seeking_clinical_help": false, "risk_level": "low", "primary_need": "support"}')
+        elif "running summary" in system:
+            content = "The user has been discussing anxiety and sleep problems and was given coping tips."
+        else:
+            content = ("I'm sorry you're going through this.\n\n"
+                       "**Recommendations:**\n- Try slow breathing\n- Keep a regular sleep schedule\n\n"
+                       "You're not alone.")
+        return OpenAIObject.construct_from({
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": self._prompt_tokens(messages), "completion_tokens": len(content) // 4}
+        })
+
+    def _embedding_response(self, inputs) -> Dict[str, Any]:
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        return {"data": [{"index": i, "embedding": fake_vector(text)} for i, text in enumerate(inputs)]}
+
+    def chat_create(self, **kwargs):
+        self.chat_calls += 1
+        self.prompt_tokens.append(self._prompt_tokens(kwargs["messages"]))
+        time.sleep(self._latency(kwargs["messages"]))
+        return self._chat_response(kwargs["messages"])
+
+    async def chat_acreate(self, **kwargs):
+        self.chat_calls += 1
+        self.prompt_tokens.append(self._prompt_tokens(kwargs["messages"]))
+        if kwargs.get("stream"):
+            return self._chat_stream(kwargs["messages"])
+        await asyncio.sleep(self._latency(kwargs["messages"]))
+        return self._chat_response(kwargs["messages"])
+
+    async def _chat_stream(self, messages: List[Dict[str, str]]):
+        """Yield the canned answer in small chunks; chat_latency is the time to first token."""
+        content = self._chat_response(messages).choices[0].message["content"]
+        await asyncio.sleep(self._latency(messages))
+        for start in range(0, len(content), 4):
+            await asyncio.sleep(delay(self.token_latency))
+            yield OpenAIObject.construct_from({
+                "choices": [{"index": 0, "delta": {"content": content[start:start + 4]}}]
+            })
+
+    def _check_embedding_rate(self) -> None:
+        if not self.embedding_rate_limit:
+            return
+        now = time.monotonic()
+        self._embedding_times = [t for t in self._embedding_times if now - t < 1.0]
+        if len(self._embedding_times) >= self.embedding_rate_limit:
+            self.embedding_rejections += 1
+            from openai.error import RateLimitError
+            raise RateLimitError("Rate limit reached for requests")
+        self._embedding_times.append(now)
+
+    def embedding_create(self, **kwargs):
+        self.embedding_calls += 1
+        self._check_embedding_rate()
+        time.sleep(delay(self.embedding_latency))
+        return self._embedding_response(kwargs["input"])
+
+    async def embedding_acreate(self, **kwargs):
+        self.embedding_calls += 1
+        self._check_embedding_rate()
+        await asyncio.sleep(delay(self.embedding_latency))
+        return self._embedding_response(kwargs["input"])
+
+    def patches(self):
+        from unittest import mock
+        return [
+            mock.patch("openai.ChatCompletion.create", self.chat_create),
+            mock.patch("openai.ChatCompletion.acreate", self.chat_acreate),
+            mock.patch("openai.Embedding.create", self.embedding_create),
+            mock.patch("openai.Embedding.acreate", self.embedding_acreate),
+        ]
+
+
+class _Response:
+    def __init__(self, data):
+        self.data = data
+
+
+class _Query:
+    def __init__(self, client: "FakeSupabase", rows: List[Dict[str, Any]],
+                 table: List[Dict[str, Any]] = None, delete: bool = False):
+        self.client = client
+        self.rows = rows
+        self.table = rows if table is None else table
+        self._single = False
+        self._delete = delete
+
+    def select(self, *columns, **kwargs):
+        return self
+
+    def eq(self, column, value):
+        return _Query(self.client, [row for row in self.rows if row.get(column) == value], self.table, self._delete)
+
+    def gt(self, column, value):
+        return _Query(self.client, [row for row in self.rows if row.get(column) is not None and row[column] > value], self.table, self._delete)
+
+    def in_(self, column, values):
+        values = set(values)
+        return _Query(self.client, [row for row in self.rows if row.get(column) in values], self.table, self._delete)
+
+    def delete(self, **kwargs):
+        return _Query(self.client, self.rows, self.table, delete=True)
+
+    def upsert(self, json, on_conflict: str = "", **kwargs):
+        return _Upsert(self.client, self.table, json if isinstance(json, list) else [json], on_conflict or "id")
+
+    def single(self):
+        query = _Query(self.client, self.rows)
+        query._single = True
+        return query
+
+    def execute(self):
+        self.client.calls += 1
+        time.sleep(delay(self.client.latency))
+        if self._delete:
+            doomed = {id(row) for row in self.rows}
+            self.table[:] = [row for row in self.table if id(row) not in doomed]
+            return _Response(list(self.rows))
+        if self._single:
+            return _Response(self.rows[0] if self.rows else None)
+        return _Response(list(self.rows))
+
+
+class _Upsert:
+    def __init__(self, client: "FakeSupabase", table: List[Dict[str, Any]], rows: List[Dict[str, Any]], key: str):
+        self.client = client
+        self.table = table
+        self.rows = rows
+        self.key = key
+
+    def execute(self):
+        self.client.calls += 1
+        time.sleep(delay(self.client.latency))
+        # ``key`` may name several columns, as in ``on_conflict="article_id,position"``
+        columns = self.key.split(",")
+        existing = {tuple(row.get(column) for column in columns): row for row in self.table}
+        for row in self.rows:
+            key = tuple(row[column] for column in columns)
+            if key in existing:
+                existing[key].update(row)
+            else:
+                self.table.append(dict(row))
+                existing[key] = self.table[-1]
+        return _Response(list(self.rows))
+
+
+class FakeSupabase:
+    """Blocking, in-memory Supabase client with a synthetic article/clinic corpus."""
+
+    def __init__(self, articles: int = 20, sections_per_article: int = 4, clinics: int = 10,
+                 latency: Union[Latency, float] = 0.0, rpc_available: bool = True):
+        self.latency = latency
+        self.rpc_available = rpc_available
+        self.calls = 0
+        self.tables: Dict[str, List[Dict[str, Any]]] = {
+            name: [] for name in (
+                "articles", "article_content", "article_sections", "article_authors",
+                "clinics", "clinic_specialties", "clinic_insurance"
+            )
+        }
+        topics = ["anxiety", "depression", "sleep", "stress", "grief", "burnout"]
+        section_id = 0
+        for article_id in range(1, articles + 1):
+            topic = topics[article_id % len(topics)]
+            self.tables["articles"].append({
+                "id": article_id, "title": f"Understanding {topic} ({article_id})",
+                "category": topic, "read_time": "5 min"
+            })
+            self.tables["article_content"].append({
+                "article_id": article_id, "introduction": f"An introduction to {topic}."
+            })
+            self.tables["article_authors"].append({
+                "article_id": article_id, "authors": {"name": "Dr. Example", "title": "PhD", "avatar": None}
+            })
+            for j in range(sections_per_article):
+                section_id += 1
+                self.tables["article_sections"].append({
+                    "id": section_id, "article_id": article_id, "position": j + 1,
+                    "title": f"{topic.title()} part {j + 1}",
+                    "content": f"Practical advice about {topic}, coping skills and support, part {j + 1}."
+                })
+        for clinic_id in range(1, clinics + 1):
+            topic = topics[clinic_id % len(topics)]
+            self.tables["clinics"].append({
+                "id": clinic_id, "name": f"Wellbeing Clinic {clinic_id}",
+                "description": f"Therapy and counseling for {topic}.", "location": "Springfield",
+                "rating": 4.5, "accepting_new": True
+            })
+            self.tables["clinic_specialties"].append({"clinic_id": clinic_id, "specialties": {"name": topic.title()}})
+            self.tables["clinic_insurance"].append({"clinic_id": clinic_id, "insurance_providers": {"name": "Aetna"}})
+
+    def table(self, name: str) -> _Query:
+        return _Query(self, self.tables[name])
+
+    @property
+    def bulk(self) -> "FakeSupabase":
+        return self
+
+    def rpc(self, name: str, params: Dict[str, Any]) -> _Query:
+        if not self.rpc_available:
+            raise RuntimeError(f"RPC {name} unavailable")
+        count = params.get("match_count", 3)
+        if name == "search_article_sections":
+            rows = [
+                {"article_id": s["article_id"], "section_title": s["title"],
+                 "section_content": s["content"], "similarity": 0.8}
+                for s in self.tables["article_sections"][:count]
+            ]
+        else:
+            rows = [
+                {"clinic_id": c["id"], "name": c["name"], "description": c["description"],
+                 "location": c["location"], "rating": c["rating"], "accepting_new": c["accepting_new"],
+                 "similarity": 0.8}
+                for c in self.tables["clinics"][:count]
+            ]
+        return _Query(self, rows)
+
+    def patches(self):
+        from unittest import mock
+        import app.core.vector_store
+        import app.core.vector_index
+        import app.core.hydration
+        import app.core.reference_data
+        import app.ingest
+        return [
+            mock.patch.object(app.ingest, "supabase", self),
+            mock.patch.object(app.core.vector_store, "supabase", self),
+            mock.patch.object(app.core.vector_index, "supabase", self),
+            mock.patch.object(app.core.hydration, "supabase", self),
+            mock.patch.object(app.core.reference_data, "supabase", self),
+        ]
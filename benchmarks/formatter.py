@@ -0,0 +1,276 @@
+"""
+Golden-output check and micro-benchmark for app.core.formatter.
+
+The legacy regex chains from LLM.format_response and
+routes.enhance_response_formatting are kept here as the reference. Every
+sample (a fixed corpus of realistic replies plus randomly generated ones) must
+format identically through the single-pass formatter, including when fed as
+random-sized stream chunks. The script then times both implementations.
+
+    python -m benchmarks.formatter [--fuzz 5000] [--iterations 2000]
+"""
+import argparse
+import random
+import re
+import sys
+import time
+
+from app.core.formatter import ResponseFormatter, format_text, parse_response
+
+
+def legacy_format_response(text):
+    text = re.sub(r'(?m)^[-*] ', '• ', text)
+    text = re.sub(r'(?m)^(•)(?!\s)', r'\1 ', text)
+    text = re.sub(r'(?m)^(\d+)\.\s*\*?\*?\[Clinic (\d+)\]\*?\*?:?\s*', r'\1. **[Clinic \2]**: ', text)
+    text = re.sub(r'(?m)^(\d+)\.\s*\*?\*?\[Article (\d+)\]\*?\*?:?\s*', r'\1. **[Article \2]**: ', text)
+    text = re.sub(r'(?m)^((\d+)\. \*\*\[Clinic \d+\]\*\*:.+\n)(?=•)', r'\1   ', text)
+    text = re.sub(r'(?m)^([A-Z][A-Za-z\s]+):\s*$', r'**\1:**', text)
+    text = re.sub(r'(?m)(•\s.+)\n(?=\d+\.\s+\*\*\[Clinic)', r'\1\n\n', text)
+    text = re.sub(r'(?m)([^•].+)\n(?=\*\*[A-Z][a-zA-Z ]+:\*\*)', r'\1\n\n', text)
+    return text
+
+
+def legacy_enhance_response_formatting(text):
+    text = re.sub(r'(?m)^[-*] ', '• ', text)
+    text = re.sub(r'(?m)^(•)(?!\s)', r'\1 ', text)
+    text = re.sub(r'(?m)^(\d+)\.\s*\*?\*?\[Clinic (\d+)\]\*?\*?:?\s*', r'\1. **[Clinic \2]**: ', text)
+    text = re.sub(r'(?m)^(\d+)\.\s*\*?\*?\[Article (\d+)\]\*?\*?:?\s*', r'\1. **[Article \2]**: ', text)
+    text = re.sub(r'(?m)^((\d+)\. \*\*\[Clinic \d+\]\*\*:.+\n)(?=•)', r'\1   ', text)
+    text = re.sub(r'(?m)^([A-Z][A-Za-z\s]+):\s*$', r'**\1:**', text)
+    text = re.sub(r'(?m)(•\s.+)\n(?=\d+\.\s+\*\*\[Clinic)', r'\1\n\n', text)
+
+    clinic_refs = re.findall(r'(?:\*\*\[Clinic (\d+)\]\*\*|\[Clinic (\d+)\])', text)
+    article_refs = re.findall(r'(?:\*\*\[Article (\d+)\]\*\*|\[Article (\d+)\])', text)
+    clinic_entries = []
+    clinic_entry_pattern = r'(\d+)\.\s+\*\*\[Clinic (\d+)\]\*\*:\s+(.+?)(?=\n\n\d+\.\s+\*\*\[Clinic|\n\n\*\*|\Z)'
+    for number, clinic_id, content in re.findall(clinic_entry_pattern, text, re.DOTALL):
+        bullet_items = re.findall(r'•\s+([^•]+?)(?=\n\s*•|\Z)', content, re.DOTALL)
+        clinic_entries.append({
+            "number": int(number),
+            "clinic_id": int(clinic_id),
+            "name": content.split('\n')[0].strip(),
+            "details": [item.strip() for item in bullet_items]
+        })
+    return {
+        "formatted_text": text,
+        "metadata": {
+            "clinic_references": [int(c[0] or c[1]) for c in clinic_refs if c[0] or c[1]],
+            "article_references": [int(a[0] or a[1]) for a in article_refs if a[0] or a[1]],
+            "sections": re.findall(r'\*\*([^:*]+):\*\*', text),
+            "clinic_entries": clinic_entries
+        }
+    }
+
+
+CORPUS = [
+    "",
+    "Thank you for reaching out. It sounds like you're carrying a lot right now.",
+    (
+        "I'm really sorry you're feeling this way. Anxiety can be exhausting.\n\n"
+        "Here are a few things that may help:\n"
+        "- Try box breathing for a few minutes\n"
+        "- Write down what is worrying you\n"
+        "* Take a short walk outside\n"
+        "•Limit caffeine in the afternoon\n\n"
+        "**Helpful Articles:**\n"
+        "1. [Article 12]: Understanding Anxiety\n"
+        "2. **[Article 7]** Grounding Techniques\n\n"
+        "**Clinic Recommendations:**\n"
+        "1. **[Clinic 3]**: Harbor Counseling Center\n"
+        "• Specializes in anxiety and panic disorders\n"
+        "• Accepts Aetna and Blue Cross\n"
+        "2. [Clinic 9] Riverside Wellness\n"
+        "• Offers telehealth appointments\n"
+        "• Sliding-scale fees\n\n"
+        "Remember, you don't have to go through this alone."
+    ),
+    (
+        "Coping Strategies:\n\n"
+        "- Keep a regular sleep schedule\n"
+        "- Reach out to someone you trust\n\n"
+        "When To Seek Help:   \n"
+        "If these feelings last more than two weeks, consider talking to a professional.\n"
+        "Next Steps:\n"
+    ),
+    (
+        "1. [Clinic 4]:\n"
+        "- Evening appointments available\n"
+        "- Accepts Medicaid\n"
+        "3.[Clinic 5]:   \n\n"
+        "   Northside Therapy Group\n"
+        "• CBT and DBT programs\n"
+        "1. [Article 2]:\n"
+        "2. [Clinic 8]: Lakeside Clinic\n"
+        "• Walk-ins welcome"
+    ),
+    (
+        "Some context first.\n"
+        "**Self Care:**\n"
+        "• Drink water\n"
+        "**Sleep Hygiene:**\n"
+        "•\n"
+        "**Support Options:**\n"
+        "See [Clinic 2] and [Article 5] for more, or **[Clinic 6]**."
+    ),
+    (
+        "• Bullet that ends with a marker •\n"
+        "trailing line\n"
+        "1. **[Clinic 1]**: Clinic One\n"
+        "   • indented detail\n"
+        "  • another detail\n"
+        "\n"
+        "2. **[Clinic 2]**: Clinic Two\n"
+        "• detail • with inline marker\n"
+        "\n"
+        "**Notes:**\n"
+        "A closing paragraph that belongs to the last clinic entry.\n"
+    ),
+    "•",
+    "x\n•",
+    "- \n* \n-x\n*y\n•\n\n",
+    "Tips:",
+    "Tips:\n\n\n",
+    "A\n**Tips:**",
+    "•x\n**Tips:**",
+    "1. **[Clinic 1]**: ",
+    "Intro\n1. [Clinic 1]:\n\n",
+]
+
+PIECES = [
+    "I hear you, and that sounds really hard.",
+    "Here are some ideas that might help:",
+    "Coping Strategies:",
+    "When To Reach Out:  ",
+    "**Helpful Articles:**",
+    "**Clinic Recommendations:**",
+    "**Next Steps:**",
+    "- Try a breathing exercise",
+    "* Take a short walk",
+    "•Journal for ten minutes",
+    "• Talk to someone you trust",
+    "   • Indented detail",
+    "• ends with a marker •",
+    "•",
+    "-",
+    "1. [Clinic {n}]: Clinic {n} Center",
+    "{n}. **[Clinic {n}]** Clinic {n} Wellness",
+    "{n}.[Clinic {n}]:",
+    "{n}. [Clinic {n}]  ",
+    "{n}. [Article {n}]: Article title {n}",
+    "{n}. **[Article {n}]**:",
+    "See [Clinic {n}] or **[Article {n}]** for more.",
+    "A",
+    "x",
+    "",
+    "",
+    "   ",
+    "\t",
+]
+
+
+def random_text(rng):
+    lines = [rng.choice(PIECES).format(n=rng.randint(1, 12)) for _ in range(rng.randint(1, 14))]
+    text = "\n".join(lines)
+    return text + rng.choice(["", "", "\n", "\n\n"])
+
+
+def stream(text, rng, space_headings):
+    """Format ``text`` through feed/close in random-sized chunks."""
+    formatter = ResponseFormatter(space_headings=space_headings)
+    output = []
+    position = 0
+    while position < len(text):
+        size = rng.randint(1, 12)
+        output.append(formatter.feed(text[position:position + size]))
+        position += size
+    output.append(formatter.close())
+    return "".join(output), formatter.metadata()
+
+
+def spans_lines(text):
+    """
+    True when the legacy heading substitution would match across lines, one
+    of the artefacts the single-pass formatter deliberately does not reproduce.
+    """
+    text = re.sub(r'(?m)^[-*] ', '• ', text)
+    text = re.sub(r'(?m)^(•)(?!\s)', r'\1 ', text)
+    text = re.sub(r'(?m)^(\d+)\.\s*\*?\*?\[Clinic (\d+)\]\*?\*?:?\s*', r'\1. **[Clinic \2]**: ', text)
+    text = re.sub(r'(?m)^(\d+)\.\s*\*?\*?\[Article (\d+)\]\*?\*?:?\s*', r'\1. **[Article \2]**: ', text)
+    text = re.sub(r'(?m)^((\d+)\. \*\*\[Clinic \d+\]\*\*:.+\n)(?=•)', r'\1   ', text)
+    return any("\n" in match.group(1) for match in re.finditer(r'(?m)^([A-Z][A-Za-z\s]+):\s*$', text))
+
+
+def check(text, rng):
+    """Return a list of mismatch descriptions for one sample."""
+    problems = []
+    expected_text = legacy_format_response(text)
+    if format_text(text) != expected_text:
+        problems.append("format_response")
+    streamed_text, _ = stream(text, rng, True)
+    if streamed_text != expected_text:
+        problems.append("format_response (streamed)")
+
+    expected = legacy_enhance_response_formatting(text)
+    if parse_response(text) != expected:
+        problems.append("enhance_response_formatting")
+    streamed_text, metadata = stream(text, rng, False)
+    if {"formatted_text": streamed_text, "metadata": metadata} != expected:
+        problems.append("enhance_response_formatting (streamed)")
+
+    # The API path runs both, one after the other
+    chained = legacy_enhance_response_formatting(expected_text)
+    if parse_response(format_text(text)) != chained:
+        problems.append("chat pipeline")
+    return problems
+
+
+def timeit(func, texts, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        for text in texts:
+            func(text)
+    return (time.perf_counter() - started) / (iterations * len(texts)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fuzz", type=int, default=5000, help="random samples to check")
+    parser.add_argument("--iterations", type=int, default=2000, help="timing iterations over the corpus")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    samples = CORPUS + [random_text(rng) for _ in range(args.fuzz)]
+    failures = 0
+    skipped = 0
+    for text in samples:
+        if spans_lines(text):
+            skipped += 1
+            continue
+        problems = check(text, rng)
+        if problems:
+            failures += 1
+            if failures <= 5:
+                print(f"MISMATCH in {', '.join(problems)}:\n{text!r}\n")
+    checked = len(samples) - skipped
+    print(f"golden check: {checked - failures}/{checked} samples identical "
+          f"({skipped} skipped for multi-line heading artefacts)")
+    if failures:
+        sys.exit(1)
+
+    texts = [text for text in CORPUS if len(text) > 200]
+    legacy_chain = lambda text: legacy_enhance_response_formatting(legacy_format_response(text))
+    new_chain = lambda text: parse_response(format_text(text))
+    print(f"{'':32}{'legacy':>10}{'single-pass':>14}")
+    for label, old, new in (
+        ("format_response", legacy_format_response, format_text),
+        ("enhance_response_formatting", legacy_enhance_response_formatting, parse_response),
+        ("chat pipeline", legacy_chain, new_chain),
+    ):
+        old_us = timeit(old, texts, args.iterations)
+        new_us = timeit(new, texts, args.iterations)
+        print(f"{label:32}{old_us:>8.1f}us{new_us:>12.1f}us  ({old_us / new_us:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Per-turn prompt size and latency over a long conversation, with the chat
+history sent in full versus windowed to a token budget with a rolling summary.
+The fake completion latency grows with prompt size, as real completions do.
+
+    python -m benchmarks.history --turns 80 --prompt-latency 0.05
+"""
+import argparse
+import asyncio
+import sys
+import time
+from contextlib import ExitStack
+from unittest import mock
+
+from benchmarks.fakes import FakeOpenAI, FakeSupabase
+
+USER_TURN = "I have been feeling anxious at night and I keep thinking about work and whether I am doing enough. "
+ASSISTANT_TURN = ("That sounds exhausting. Many people find that a short wind-down routine helps, such as "
+                  "writing tomorrow's tasks down, dimming screens and slow breathing for a few minutes. ") * 3
+
+
+async def converse(turns: int, manager) -> list:
+    from app.config import settings
+    from app.core.context import RequestContext
+    from app.core.rag import RAG
+
+    history = []
+    results = []
+    with mock.patch("app.core.rag.history_manager", manager), \
+            mock.patch.object(settings, "ANSWER_CACHE_ENABLED", False):
+        for turn in range(1, turns + 1):
+            query = f"{USER_TURN} (turn {turn})"
+            context = RequestContext(query=query)
+            started = time.perf_counter()
+            response, _, _ = await RAG.process_query(query, chat_history=list(history), context=context)
+            results.append((turn, time.perf_counter() - started, context.usage.get("prompt_tokens", 0)))
+            history += [{"role": "user", "content": query}, {"role": "assistant", "content": ASSISTANT_TURN}]
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=80)
+    parser.add_argument("--chat-latency", type=float, default=0.05)
+    parser.add_argument("--prompt-latency", type=float, default=0.05, help="seconds per 1000 prompt tokens")
+    args = parser.parse_args()
+
+    from app.config import settings
+    from app.core.history import ChatHistoryManager
+
+    openai_fake = FakeOpenAI(chat_latency=args.chat_latency, prompt_latency=args.prompt_latency)
+    windowed = ChatHistoryManager(
+        budget=settings.HISTORY_TOKEN_BUDGET,
+        low_watermark=settings.HISTORY_LOW_WATERMARK,
+        cache_size=settings.HISTORY_SUMMARY_CACHE_SIZE
+    )
+    unbounded = ChatHistoryManager(budget=10 ** 9, low_watermark=1.0, cache_size=1)
+    with ExitStack() as stack:
+        for patch in openai_fake.patches() + FakeSupabase().patches():
+            stack.enter_context(patch)
+        full = asyncio.run(converse(args.turns, unbounded))
+        bounded = asyncio.run(converse(args.turns, windowed))
+
+    print(f"{'turn':>6}{'full tokens':>14}{'full ms':>10}{'windowed tokens':>18}{'windowed ms':>14}")
+    checkpoints = sorted({1, 2, 5} | set(range(10, args.turns + 1, 10)) | {args.turns})
+    for turn in checkpoints:
+        _, full_latency, full_tokens = full[turn - 1]
+        _, latency, tokens = bounded[turn - 1]
+        print(f"{turn:>6}{full_tokens:>14}{full_latency * 1000:>10.0f}{tokens:>18}{latency * 1000:>14.0f}")
+    print(f"summaries computed: {windowed.stats['summaries_computed']} over {args.turns} turns "
+          f"(budget {settings.HISTORY_TOKEN_BUDGET} tokens)")
+
+    # Windowed prompts stay within the history budget plus the fixed prompt and context
+    late = [tokens for _, _, tokens in bounded[args.turns // 2:]]
+    if max(late) > 2 * min(late):
+        print("FAIL: windowed prompt size keeps growing")
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
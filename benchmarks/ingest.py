@@ -0,0 +1,122 @@
+"""
+Ingestion throughput and incremental re-indexing: a full ingest of a
+generated Markdown corpus (over hand-maintained section rows for its
+first article), a no-op re-run, a re-run after editing one article, and a
+run interrupted by failing embedding requests followed by the run that
+resumes it.
+
+    python -m benchmarks.ingest --articles 200 --sections 6 --embedding-latency 0.2
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+from contextlib import ExitStack
+from unittest import mock
+
+from benchmarks.fakes import FakeOpenAI, FakeSupabase
+
+PARAGRAPH = ("Noticing how you feel without judging it is a skill that grows with practice. "
+             "Short, regular check-ins through the day work better than long sessions once a week. ")
+
+
+def write_corpus(directory: str, articles: int, sections: int) -> None:
+    for article_id in range(1, articles + 1):
+        body = [f"---\nid: {article_id}\ntitle: Article {article_id}\ncategory: wellbeing\n---",
+                f"An introduction to article {article_id}."]
+        for j in range(1, sections + 1):
+            body.append(f"## Section {j}\n{PARAGRAPH * 2}(article {article_id}, section {j})")
+        with open(os.path.join(directory, f"{article_id:05d}.md"), "w", encoding="utf-8") as handle:
+            handle.write("\n\n".join(body) + "\n")
+
+
+def edit_article(directory: str, article_id: int) -> None:
+    """Rewrite one section and drop the last one."""
+    path = os.path.join(directory, f"{article_id:05d}.md")
+    with open(path, encoding="utf-8") as handle:
+        text = handle.read()
+    text = text.replace("(article", "(edited article", 1)
+    text = text[:text.rindex("## ")].rstrip() + "\n"
+    with open(path, "w", encoding="utf-8") as handle:
+        handle.write(text)
+
+
+def run(directory: str, state: str, label: str, openai_fake: FakeOpenAI):
+    from app.ingest import ingest
+
+    calls = openai_fake.embedding_calls
+    report = asyncio.run(ingest([directory], clinics=True, state_path=state))
+    print(f"{label:<22} {report.summary()}, {openai_fake.embedding_calls - calls} embedding requests")
+    return report
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--articles", type=int, default=200)
+    parser.add_argument("--sections", type=int, default=6)
+    parser.add_argument("--clinics", type=int, default=50)
+    parser.add_argument("--embedding-latency", type=float, default=0.2)
+    parser.add_argument("--db-latency", type=float, default=0.02)
+    args = parser.parse_args()
+
+    from app.config import settings
+
+    openai_fake = FakeOpenAI(embedding_latency=args.embedding_latency)
+    supabase_fake = FakeSupabase(articles=0, clinics=args.clinics, latency=args.db_latency)
+    failures = []
+    with tempfile.TemporaryDirectory() as directory, ExitStack() as stack:
+        for patch in openai_fake.patches() + supabase_fake.patches():
+            stack.enter_context(patch)
+        # Only the ingest state may spare embedding requests here
+        stack.enter_context(mock.patch.object(settings, "EMBEDDING_CACHE_ENABLED", False))
+        stack.enter_context(mock.patch.object(settings, "EMBEDDING_BATCH_MAX_INPUTS", 128))
+        stack.enter_context(mock.patch.object(settings, "INGEST_BATCH_SIZE", 128))
+        corpus = os.path.join(directory, "articles")
+        os.makedirs(corpus)
+        write_corpus(corpus, args.articles, args.sections)
+        state = os.path.join(directory, "state.sqlite3")
+        # Rows written by hand before the first ingest; the ingest replaces them
+        supabase_fake.tables["article_sections"] += [
+            {"id": 900 + position, "article_id": 1, "position": position, "title": "Old", "content": "Old"}
+            for position in range(1, args.sections + 3)
+        ]
+
+        full = run(corpus, state, "full ingest", openai_fake)
+        unchanged = run(corpus, state, "unchanged re-run", openai_fake)
+        edit_article(corpus, 1)
+        edited = run(corpus, state, "one article edited", openai_fake)
+        sections = len(supabase_fake.tables["article_sections"])
+        if sections != args.articles * args.sections - 1:
+            failures.append(f"expected {args.articles * args.sections - 1} section rows, found {sections}")
+
+        resume_state = os.path.join(directory, "resume.sqlite3")
+        acreate = openai_fake.embedding_acreate
+        calls = {"count": 0}
+
+        async def flaky(**kwargs):
+            calls["count"] += 1
+            if calls["count"] % 3 == 0:
+                raise RuntimeError("simulated outage")
+            return await acreate(**kwargs)
+
+        with mock.patch("openai.Embedding.acreate", flaky):
+            interrupted = run(corpus, resume_state, "interrupted run", openai_fake)
+        resumed = run(corpus, resume_state, "resumed run", openai_fake)
+
+    if full.deleted != 2:
+        failures.append(f"expected 2 hand-maintained section rows deleted, found {full.deleted}")
+    if unchanged.embedded or edited.embedded != 1 or edited.deleted != 1:
+        failures.append("unchanged chunks were re-embedded")
+    if not interrupted.failed or resumed.embedded != interrupted.failed or resumed.failed:
+        failures.append("the resumed run did not pick up exactly the failed chunks")
+    print(f"re-index after an edit: {edited.seconds:.2f}s vs full ingest {full.seconds:.2f}s")
+    if failures:
+        print("FAIL: " + "; ".join(failures))
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
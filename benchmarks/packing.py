@@ -0,0 +1,118 @@
+"""
+Article context sent to the model: the previous top-3 rows cut at 500
+characters versus the token-budgeted, MMR-diversified packing. Candidates
+include near-duplicate sections and long sections, as real retrieval does.
+The packed context must not be larger than the previous one.
+
+    python -m benchmarks.packing --candidates 12 --budget 450
+"""
+import argparse
+import random
+import sys
+
+import benchmarks.fakes  # noqa: F401  (sets the local client settings before the app is imported)
+
+SENTENCES = {
+    "anxiety": [
+        "Anxiety often shows up as racing thoughts and a tight chest.",
+        "Slow breathing with a longer exhale calms the nervous system.",
+        "Writing worries down before bed can make them feel more manageable.",
+        "Avoiding feared situations tends to make anxiety grow over time.",
+    ],
+    "sleep": [
+        "A regular wake-up time anchors the body clock.",
+        "Screens in the last hour before bed delay sleepiness.",
+        "If you cannot sleep, get up and do something calm in dim light.",
+        "Caffeine late in the day can fragment sleep even if you fall asleep easily.",
+    ],
+    "stress": [
+        "Short breaks during the day lower the build-up of stress.",
+        "Talking to someone you trust helps put problems in perspective.",
+        "Physical activity is one of the most reliable ways to reduce stress.",
+        "Breaking a large task into small steps makes it easier to start.",
+    ],
+}
+
+
+def candidates(count: int, seed: int) -> list:
+    """Retrieval rows, most similar first; every third row repeats an earlier one under a new title."""
+    rng = random.Random(seed)
+    topics = list(SENTENCES)
+    rows = []
+    for i in range(count):
+        topic = topics[i % len(topics)]
+        if i % 3 == 2 and rows:
+            content = rows[-1]["section_content"]
+        else:
+            sentences = SENTENCES[topic][:]
+            rng.shuffle(sentences)
+            content = " ".join(sentences * rng.randint(1, 6))
+        rows.append({
+            "id": i // 2 + 1,
+            "title": f"Understanding {topic}",
+            "category": topic,
+            "source_type": "section",
+            "section_title": f"{topic.title()} part {i + 1}",
+            "section_content": content,
+            "similarity": round(0.9 - 0.02 * i, 3),
+        })
+    return rows
+
+
+def describe(messages: list) -> tuple:
+    from app.utils.tokens import count_tokens
+
+    user = messages[-1]["content"]
+    context = user.split("Context information to use in your response:\n", 1)[-1]
+    sections = context.count("• Section:")
+    cut = sum(1 for line in context.splitlines()
+              if line.startswith("• Content:") and line.endswith("...") and not line[:-3].endswith((".", "!", "?")))
+    return count_tokens(context), sections, cut
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--candidates", type=int, default=12)
+    parser.add_argument("--budget", type=int, default=None, help="defaults to CONTEXT_TOKEN_BUDGET")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    from app.config import settings
+    budget = args.budget or settings.CONTEXT_TOKEN_BUDGET
+    from app.core.llm import LLM
+    from app.core.packing import ContextPacker
+
+    rows = candidates(args.candidates, args.seed)
+    packer = ContextPacker(
+        budget=budget,
+        section_max_tokens=settings.CONTEXT_SECTION_MAX_TOKENS,
+        mmr_lambda=settings.CONTEXT_MMR_LAMBDA,
+        max_articles=settings.MAX_ARTICLE_RESULTS,
+        max_clinics=settings.MAX_CLINIC_RESULTS
+    )
+    legacy = LLM.build_messages("How can I sleep better when anxious?", rows[:settings.MAX_ARTICLE_RESULTS], [])
+    articles, _ = packer.pack(rows, [])
+    packed = LLM.build_messages("How can I sleep better when anxious?", articles, [])
+
+    contents = [section["content"] for article in articles for section in article["sections"]]
+    duplicates = len(contents) - len(set(contents))
+    print(f"{'':>10}{'tokens':>10}{'sections':>10}{'mid-sentence cuts':>20}")
+    for name, messages in (("top-3/500", legacy), ("packed", packed)):
+        tokens, sections, cut = describe(messages)
+        print(f"{name:>10}{tokens:>10}{sections:>10}{cut:>20}")
+    print(f"packed: {len(articles)} articles, {duplicates} duplicate sections")
+
+    tokens, _, cut = describe(packed)
+    legacy_tokens, _, _ = describe(legacy)
+    if tokens > budget or cut or duplicates:
+        print("FAIL: packed context over budget, cut mid-sentence or repeating a section")
+        return 1
+    if tokens > legacy_tokens:
+        print(f"FAIL: packed context is larger than the previous one ({tokens} > {legacy_tokens} tokens)")
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
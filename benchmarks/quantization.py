@@ -0,0 +1,158 @@
+"""
+Recall, latency and memory of the stored, memory-mapped embedding index
+(int8 with per-row scales or float16, with and without float32 rescoring)
+against the in-memory float32 index, and the memory several worker
+processes use when they share the mapped file versus loading their own
+float32 copy.
+
+    python -m benchmarks.quantization --rows 20000 --queries 200 --workers 4
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import benchmarks.fakes  # noqa: F401  (sets the local client settings before the app is imported)
+
+DIM = 1536
+
+
+def corpus(rows: int, clusters: int, seed: int) -> np.ndarray:
+    """Clustered unit vectors with a shared offset, like text embeddings (cosines mostly 0.7-0.9)."""
+    rng = np.random.default_rng(seed)
+    common = rng.standard_normal(DIM).astype(np.float32)
+    centers = rng.standard_normal((clusters, DIM)).astype(np.float32)
+    vectors = 2.0 * common + centers[rng.integers(0, clusters, rows)] + rng.standard_normal((rows, DIM)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def top_k(scores: np.ndarray, k: int) -> set:
+    best = np.argpartition(-scores, k - 1)[:k]
+    return set(best[np.isfinite(scores[best])].tolist())
+
+
+def memory() -> dict:
+    """Resident, proportional and anonymous (private heap) memory of this process in MB (Linux)."""
+    values = {}
+    try:
+        with open("/proc/self/smaps_rollup") as handle:
+            for line in handle:
+                name, _, rest = line.partition(":")
+                if name in ("Rss", "Pss", "Anonymous"):
+                    values[name] = int(rest.split()[0]) / 1024
+    except OSError:
+        pass
+    return values
+
+
+def worker(mode: str, path: str, rows: int, queries: np.ndarray, results) -> None:
+    from app.core.vector_index import QuantizedVectorIndex, VectorIndex
+
+    started = time.perf_counter()
+    if mode == "float32":
+        matrix = np.fromfile(os.path.join(path, "float32.bin"), dtype=np.float32).reshape(rows, DIM)
+        index = VectorIndex(DIM, [str(i) for i in range(rows)], np.zeros(rows, dtype=np.int64),
+                            [""] * rows, [None] * rows, matrix)
+    else:
+        index, _ = QuantizedVectorIndex.open(path)
+    opened = time.perf_counter() - started
+    for query in queries:
+        index.score(query, shortlist=40)
+    results.put((mode, opened, memory()))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--rescore-factor", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+
+    from app.core.vector_index import QuantizedVectorIndex, VectorIndex
+
+    vectors = corpus(args.rows, args.clusters, args.seed)
+    rng = np.random.default_rng(args.seed + 1)
+    queries = vectors[rng.integers(0, args.rows, args.queries)] + 0.05 * rng.standard_normal((args.queries, DIM))
+    queries = queries.astype(np.float32)
+    keys = [f"row:{i}" for i in range(args.rows)]
+    exact_index = VectorIndex(DIM, keys, np.arange(args.rows, dtype=np.int64), [""] * args.rows,
+                              [None] * args.rows, vectors)
+    truth = [top_k(exact_index.score(query), args.k) for query in queries]
+
+    float_list_bytes = sys.getsizeof(vectors[0].tolist()) + sum(sys.getsizeof(x) for x in vectors[0].tolist())
+    print(f"{args.rows} x {DIM} embeddings")
+    print(f"  as Python float lists: {float_list_bytes * args.rows / 2 ** 20:8.1f} MB per worker")
+    print(f"  as float32 matrix:     {vectors.nbytes / 2 ** 20:8.1f} MB per worker\n")
+
+    print(f"{'variant':<22}{'recall@' + str(args.k):>10}{'ms/query':>10}{'hot MB':>9}{'on disk MB':>12}{'open ms':>9}")
+    variants = [("int8", False), ("int8", True), ("float16", False), ("float16", True)]
+    failures = []
+    with tempfile.TemporaryDirectory() as directory:
+        elapsed = time.perf_counter()
+        for query in queries:
+            exact_index.score(query)
+        elapsed = (time.perf_counter() - elapsed) / args.queries
+        print(f"{'float32 (in memory)':<22}{1.0:>10.3f}{elapsed * 1000:>10.2f}{vectors.nbytes / 2 ** 20:>9.1f}"
+              f"{'-':>12}{'-':>9}")
+        shortlist = args.k * args.rescore_factor
+        for dtype, rescore in variants:
+            path = os.path.join(directory, f"{dtype}-{rescore}")
+            exact_index.save(path, dtype=dtype, rescore=rescore)
+            started = time.perf_counter()
+            index, _ = QuantizedVectorIndex.open(path)
+            opened = time.perf_counter() - started
+            hits, elapsed = 0, time.perf_counter()
+            for query, expected in zip(queries, truth):
+                hits += len(top_k(index.score(query, shortlist=shortlist), args.k) & expected)
+            elapsed = (time.perf_counter() - elapsed) / args.queries
+            recall = hits / (args.k * args.queries)
+            version = os.path.join(path, QuantizedVectorIndex.current_version(path))
+            disk = sum(os.path.getsize(os.path.join(version, name)) for name in os.listdir(version))
+            hot = index.codes.nbytes + (index.scales.nbytes if index.scales is not None else 0)
+            name = f"{dtype}{' + rescore' if rescore else ''}"
+            print(f"{name:<22}{recall:>10.3f}{elapsed * 1000:>10.2f}{hot / 2 ** 20:>9.1f}"
+                  f"{disk / 2 ** 20:>12.1f}{opened * 1000:>9.1f}")
+            if rescore and recall < 0.99:
+                failures.append(f"{name} recall {recall:.3f}")
+
+        if args.workers and os.path.exists("/proc/self/smaps_rollup"):
+            shared = os.path.join(directory, "shared")
+            exact_index.save(shared, dtype="int8", rescore=True)
+            vectors.tofile(os.path.join(shared, "float32.bin"))
+            # Spawned, so no worker inherits pages from this process
+            context = multiprocessing.get_context("spawn")
+            # Mapped pages are page cache shared by the workers; PSS splits them between
+            # the processes that touched them, the private heap is what each worker adds
+            print(f"\n{args.workers} worker processes, {args.queries} queries each:")
+            for mode in ("float32", "mapped"):
+                results = context.Queue()
+                processes = [context.Process(target=worker, args=(mode, shared, args.rows, queries, results))
+                             for _ in range(args.workers)]
+                for process in processes:
+                    process.start()
+                reports = [results.get() for _ in processes]
+                for process in processes:
+                    process.join()
+                pss = sum(report[2].get("Pss", 0.0) for report in reports)
+                anonymous = sum(report[2].get("Anonymous", 0.0) for report in reports)
+                opened = max(report[1] for report in reports)
+                print(f"  {mode:<8} total PSS {pss:8.1f} MB, of which private heap {anonymous:8.1f} MB, "
+                      f"slowest open {opened * 1000:7.1f} ms")
+
+    if failures:
+        print("FAIL: " + "; ".join(failures))
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
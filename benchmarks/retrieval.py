@@ -0,0 +1,201 @@
+"""
+Recall and latency of article retrieval by vector similarity alone, BM25
+alone and both fused with reciprocal-rank fusion, over a fixed query set,
+plus the cost of the previous clinic keyword scoring against the clinic
+BM25 index.
+
+The stand-in embeddings model what dense embeddings do well and badly: they
+place a text by the topic words in it and ignore rare terms such as
+medication or insurer names. Half of the queries are topical, half hinge on
+such an exact term.
+
+    python -m benchmarks.retrieval --articles 300 --clinics 5000 -k 10
+"""
+import argparse
+import random
+import re
+import sys
+import time
+from unittest import mock
+
+import numpy as np
+
+from benchmarks.fakes import EMBEDDING_DIM, fake_vector
+
+TOPICS = {
+    "anxiety": "anxiety anxious panic worry nervous calm breathing",
+    "sleep": "sleep insomnia tired night rest bedtime",
+    "depression": "depression sad low mood hopeless motivation",
+    "stress": "stress overwhelmed pressure burnout workload",
+    "grief": "grief loss mourning bereavement",
+}
+TERMS = {
+    "sertraline": "depression", "fluoxetine": "depression", "bupropion": "depression",
+    "melatonin": "sleep", "zolpidem": "sleep", "propranolol": "anxiety",
+    "hydroxyzine": "anxiety", "buspirone": "anxiety",
+}
+FILLER = ("Small daily habits make a real difference over time. Talk to someone you trust "
+          "and be patient with yourself while you try what works for you.")
+TOPIC_QUERIES = [
+    ("how do I calm down during a panic attack", "anxiety"),
+    ("I can't sleep at night and feel tired all day", "sleep"),
+    ("my mood has been low and I feel hopeless", "depression"),
+    ("work pressure is making me burn out", "stress"),
+    ("coping with the loss of my father", "grief"),
+]
+TERM_QUERIES = [
+    (f"does {term} have side effects", term) for term in TERMS
+]
+
+
+def _topic_vectors() -> dict:
+    return {topic: np.asarray(fake_vector(f"topic:{topic}"), dtype=np.float32) for topic in TOPICS}
+
+
+def embed(text: str, topics: dict) -> np.ndarray:
+    """Topic-word pseudo-embedding with a little per-text noise; rare terms carry no signal."""
+    words = set(re.findall(r'\w+', text.lower()))
+    vector = 0.6 * np.asarray(fake_vector(text), dtype=np.float32)
+    for topic, vocabulary in TOPICS.items():
+        vector += len(words & set(vocabulary.split())) * topics[topic]
+    return vector
+
+
+def corpus(articles: int, seed: int):
+    """Articles with sections per topic; one section per rare term mentions it."""
+    rng = random.Random(seed)
+    topic_names = list(TOPICS)
+    rows, contents, sections = [], {}, {}
+    relevant = {topic: set() for topic in topic_names}
+    term_sections = {}
+    section_id = 0
+    terms = list(TERMS)
+    for article_id in range(1, articles + 1):
+        topic = topic_names[article_id % len(topic_names)]
+        rows.append({"id": article_id, "title": f"Living with {topic} ({article_id})",
+                     "category": topic, "read_time": "5 min"})
+        contents[article_id] = {"article_id": article_id, "introduction": f"An overview of {topic}. {FILLER}"}
+        for j in range(4):
+            section_id += 1
+            words = rng.sample(TOPICS[topic].split(), 3)
+            content = f"Notes on {' and '.join(words)}. {FILLER}"
+            title = f"{topic.title()} part {j + 1}"
+            if terms and j == 3 and TERMS[terms[0]] == topic:
+                term = terms.pop(0)
+                content = f"Some people are prescribed {term} for this. {content}"
+                term_sections[term] = {(article_id, title)}
+            else:
+                relevant[topic].add((article_id, title))
+            sections.setdefault(article_id, []).append(
+                {"id": section_id, "article_id": article_id, "title": title, "content": content}
+            )
+    return rows, contents, sections, relevant, term_sections
+
+
+def recall(found: list, wanted: set, k: int) -> float:
+    keys = {(row["id"], row["section_title"]) for row in found}
+    return len(keys & wanted) / min(len(wanted), k)
+
+
+def legacy_clinic_scores(query: str, clinics: list, specialties: dict) -> list:
+    """The previous fallback: re-tokenise every clinic on every request."""
+    keywords = set(re.findall(r'\w+', query.lower()))
+    scored = []
+    for clinic in clinics:
+        clinic_keywords = set(re.findall(r'\w+', f"{clinic['name']} {clinic.get('description', '')}".lower()))
+        matches = len(keywords.intersection(clinic_keywords))
+        for specialty in specialties.get(clinic["id"], []):
+            if any(keyword in specialty.lower() for keyword in keywords):
+                matches += 2
+        if matches:
+            scored.append((clinic["id"], 0.5 + 0.1 * matches))
+    scored.sort(key=lambda item: -item[1])
+    return scored
+
+
+def timed(function, repeat: int) -> tuple:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return result, (time.perf_counter() - started) / repeat
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--articles", type=int, default=300)
+    parser.add_argument("--clinics", type=int, default=5000)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    from app.core.lexical_index import BM25Index
+    from app.core.reference_data import clinic_documents
+    from app.core.vector_index import ArticleIndex
+    from app.core.vector_store import VectorStore
+
+    topics = _topic_vectors()
+    rows, contents, sections, relevant, term_sections = corpus(args.articles, args.seed)
+    index = ArticleIndex()
+    with mock.patch.object(index, "_fetch_corpus", return_value=(rows, contents, sections, {})), \
+            mock.patch.object(index, "_fetch_section_embeddings", return_value={}), \
+            mock.patch("app.core.vector_index.get_embeddings",
+                       side_effect=lambda texts: [embed(text, topics) for text in texts]):
+        started = time.perf_counter()
+        index.refresh_sync()
+        build = time.perf_counter() - started
+    print(f"indexed {len(index.index)} rows ({len(index.lexical)} lexical documents) in {build:.2f}s")
+
+    key = lambda row: (row["id"], row["section_title"])  # noqa: E731
+    queries = [(query, relevant[topic], "topical") for query, topic in TOPIC_QUERIES] + \
+              [(query, term_sections[term], "exact term") for query, term in TERM_QUERIES if term in term_sections]
+    methods = {
+        "vector": lambda q, e: index.search_sections(e, args.k),
+        "bm25": lambda q, e: index.search_lexical(q, e, args.k),
+        "fused": lambda q, e: VectorStore.fuse(
+            index.search_sections(e, args.k), index.search_lexical(q, e, args.k), key, args.k
+        ),
+    }
+    print(f"\n{'recall@' + str(args.k):>12}{'topical':>10}{'exact term':>12}{'all':>8}{'ms/query':>10}")
+    results = {}
+    for name, method in methods.items():
+        scores = {"topical": [], "exact term": []}
+        elapsed = 0.0
+        for query, wanted, kind in queries:
+            embedding = embed(query, topics)
+            found, seconds = timed(lambda: method(query, embedding), args.repeat)
+            elapsed += seconds
+            scores[kind].append(recall(found, wanted, args.k))
+        results[name] = {kind: float(np.mean(values)) for kind, values in scores.items()}
+        overall = float(np.mean(scores["topical"] + scores["exact term"]))
+        print(f"{name:>12}{results[name]['topical']:>10.2f}{results[name]['exact term']:>12.2f}"
+              f"{overall:>8.2f}{elapsed / len(queries) * 1000:>10.2f}")
+
+    rng = random.Random(args.seed)
+    clinics = [
+        {"id": i, "name": f"Clinic {i}", "description": f"Care for {rng.choice(list(TOPICS))} and "
+         f"{rng.choice(list(TOPICS))}. {FILLER}", "location": "Springfield", "rating": 4.0, "accepting_new": True}
+        for i in range(1, args.clinics + 1)
+    ]
+    specialties = {clinic["id"]: [rng.choice(list(TOPICS)).title()] for clinic in clinics}
+    insurance = {clinic["id"]: [rng.choice(["Aetna", "Cigna", "Medicaid", "Kaiser"])] for clinic in clinics}
+    clinic_index = BM25Index()
+    _, build = timed(lambda: clinic_index.sync(clinic_documents(clinics, specialties, insurance)), 1)
+    _, resync = timed(lambda: clinic_index.sync(clinic_documents(clinics, specialties, insurance)), 1)
+    query = "a therapist for anxiety who takes Cigna"
+    _, legacy = timed(lambda: legacy_clinic_scores(query, clinics, specialties), 5)
+    _, bm25 = timed(lambda: clinic_index.search(query, 3), 5)
+    print(f"\n{args.clinics} clinics: keyword scoring {legacy * 1000:.1f} ms/query, "
+          f"BM25 {bm25 * 1000:.1f} ms/query (built once in {build * 1000:.0f} ms, "
+          f"unchanged re-sync {resync * 1000:.0f} ms)")
+
+    if results["fused"]["exact term"] <= results["vector"]["exact term"] or \
+            results["fused"]["topical"] < results["vector"]["topical"] - 0.1:
+        print("FAIL: fusion does not recover exact-term matches without hurting topical recall")
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
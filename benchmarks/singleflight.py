@@ -0,0 +1,137 @@
+"""
+A burst of identical first messages (as when a shared link brings many
+users at once) sent concurrently to POST /api/chat, with request
+coalescing on and off, with OpenAI and Supabase replaced by the fakes and
+the answer cache off. Reports chat-model calls, wall time and p50/p95
+latency, and checks that every caller gets the same answer. Also checks
+cancellation: followers still get the answer when the leader disconnects,
+and the shared run is cancelled once every caller has gone.
+
+    python -m benchmarks.singleflight --burst 50 --chat-latency 0.5
+"""
+import argparse
+import asyncio
+import sys
+import time
+from contextlib import ExitStack
+from unittest import mock
+
+import numpy as np
+
+from benchmarks.fakes import FakeOpenAI, FakeSupabase, Latency
+
+QUERY = "Hi, I saw this link shared and I've been feeling really anxious lately. Where do I start?"
+
+
+async def burst(label: str, args, client, openai_fake: FakeOpenAI, query: str) -> dict:
+    calls = openai_fake.chat_calls
+    latencies = []
+
+    async def one():
+        started = time.perf_counter()
+        response = await client.post("/api/chat", json={"query": query, "chat_history": []})
+        latencies.append(time.perf_counter() - started)
+        return response.json()["response"]
+
+    started = time.perf_counter()
+    responses = await asyncio.gather(*(one() for _ in range(args.burst)))
+    wall = time.perf_counter() - started
+    ms = np.asarray(latencies) * 1000
+    row = {"calls": openai_fake.chat_calls - calls, "same": len(set(responses)) == 1, "wall": wall}
+    print(f"{label:<16}{row['calls']:>12}{wall:>9.2f}{np.percentile(ms, 50):>10.1f}{np.percentile(ms, 95):>10.1f}")
+    return row
+
+
+async def cancellation(openai_fake: FakeOpenAI) -> list:
+    """Drive RAG.process_query directly, cancelling callers mid-flight."""
+    from app.core.context import RequestContext
+    from app.core.rag import RAG
+    from app.core.singleflight import singleflight
+
+    failures = []
+
+    def call(query: str):
+        return asyncio.create_task(RAG.process_query(query, [], RequestContext(query=query)))
+
+    # The leader disconnects; its followers still get the answer from the one run
+    calls = openai_fake.chat_calls
+    leader = call(QUERY + " (leader)")
+    await asyncio.sleep(0.05)
+    followers = [call(QUERY + " (leader)") for _ in range(5)]
+    await asyncio.sleep(0.05)
+    leader.cancel()
+    results = await asyncio.gather(*followers)
+    if not leader.cancelled() or any(not response for response, _, _ in results):
+        failures.append("followers did not get the answer after the leader was cancelled")
+    if openai_fake.chat_calls - calls > 2:
+        failures.append(f"{openai_fake.chat_calls - calls} chat calls for one coalesced request")
+
+    # Every caller disconnects; the shared run is cancelled
+    abandoned = singleflight.stats["abandoned"]
+    tasks = [call(QUERY + " (abandoned)") for _ in range(3)]
+    await asyncio.sleep(0.05)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await asyncio.sleep(0)
+    if singleflight.stats["abandoned"] != abandoned + 1 or singleflight.stats["in_flight"]:
+        failures.append("the shared run was not cancelled when every caller left")
+    print(f"cancellation: leader cancelled, {len(results)} followers answered; abandoned run cancelled")
+    return failures
+
+
+async def run(args, openai_fake: FakeOpenAI) -> int:
+    import httpx
+    from app.config import settings
+    from app.core.reference_data import reference_data
+    from app.core.singleflight import singleflight
+    from app.core.vector_index import article_index
+    from app.main import app
+
+    failures = []
+    async with app.router.lifespan_context(app):
+        await reference_data.refresh()
+        await article_index.ensure_loaded()
+        async with httpx.AsyncClient(app=app, base_url="http://benchmark", timeout=None) as client:
+            print(f"{'coalescing':<16}{'chat calls':>12}{'wall s':>9}{'p50 ms':>10}{'p95 ms':>10}")
+            with mock.patch.object(settings, "SINGLEFLIGHT_ENABLED", False):
+                off = await burst("off", args, client, openai_fake, QUERY + " (off)")
+            coalesced = singleflight.stats["coalesced"]
+            on = await burst("on", args, client, openai_fake, QUERY)
+            print(f"coalesced requests: {singleflight.stats['coalesced'] - coalesced}/{args.burst}")
+        failures += await cancellation(openai_fake)
+
+    if not on["same"]:
+        failures.append("coalesced callers got different answers")
+    if on["calls"] * args.burst > off["calls"] * 2:
+        failures.append(f"coalescing made {on['calls']} chat calls for {args.burst} identical requests")
+    if failures:
+        print("FAIL: " + "; ".join(failures))
+        return 1
+    print("OK")
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--burst", type=int, default=50, help="identical concurrent requests")
+    parser.add_argument("--chat-latency", type=Latency, default=Latency("0.5"))
+    parser.add_argument("--embedding-latency", type=Latency, default=Latency("0.05"))
+    parser.add_argument("--db-latency", type=Latency, default=Latency("0.01"))
+    args = parser.parse_args()
+
+    import logging
+    from app.config import settings
+
+    logging.disable(logging.WARNING)
+    openai_fake = FakeOpenAI(chat_latency=args.chat_latency, embedding_latency=args.embedding_latency)
+    supabase_fake = FakeSupabase(articles=50, sections_per_article=4, clinics=20, latency=args.db_latency)
+    with ExitStack() as stack:
+        for patch in openai_fake.patches() + supabase_fake.patches():
+            stack.enter_context(patch)
+        stack.enter_context(mock.patch.object(settings, "ANSWER_CACHE_ENABLED", False))
+        return asyncio.run(run(args, openai_fake))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+"""
+Cold start: how long importing the app takes (in a fresh interpreter,
+broken down by package with -X importtime), which client
+libraries it defers, how long each warm-up step takes with OpenAI and
+Supabase replaced by the fakes, and the latency of the first chat request
+with and without the warm-up. Fails when import plus warm-up exceed the
+budget.
+
+    python -m benchmarks.startup --budget 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from contextlib import ExitStack
+from typing import Dict
+
+DEFERRED = ("openai", "aiohttp", "requests", "httpx", "postgrest", "tiktoken")
+
+IMPORT_PROBE = (
+    "import sys, time; started = time.perf_counter(); import app.main; "
+    "elapsed = time.perf_counter() - started; import json; "
+    f"print(json.dumps({{'seconds': elapsed, 'loaded': [m for m in {DEFERRED!r} if m in sys.modules]}}))"
+)
+
+
+def child_env() -> Dict[str, str]:
+    import benchmarks.fakes  # noqa: F401  (sets the settings the app reads)
+    return dict(os.environ, PYTHONPATH=os.getcwd())
+
+
+def import_breakdown(env: Dict[str, str]) -> Dict[str, float]:
+    """Import time per top-level package (each module's own time, summed), from -X importtime."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app.main"],
+                            env=env, capture_output=True, text=True, check=True)
+    packages: Dict[str, float] = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        own, _, name = line[len("import time:"):].split("|")
+        if not own.strip().isdigit():
+            continue
+        package = name.strip().split(".")[0]
+        packages[package] = packages.get(package, 0.0) + int(own) / 1e6
+    return packages
+
+
+async def first_request(warm: bool) -> Dict[str, float]:
+    import httpx
+    from unittest import mock
+    from app.core.warmup import warmup
+    from app.main import app
+
+    async def skip_warmup():
+        warmup.ready = True
+
+    with ExitStack() as stack:
+        if not warm:
+            stack.enter_context(mock.patch.object(warmup, "run", skip_warmup))
+        async with app.router.lifespan_context(app):
+            async with httpx.AsyncClient(app=app, base_url="http://benchmark", timeout=None) as client:
+                started = time.perf_counter()
+                while (await client.get("/api/ready")).status_code != 200:
+                    await asyncio.sleep(0.01)
+                ready = time.perf_counter() - started
+                started = time.perf_counter()
+                response = await client.post(
+                    "/api/chat", json={"query": "I have been feeling anxious lately", "chat_history": []}
+                )
+                first = time.perf_counter() - started
+                response.raise_for_status()
+    return {"ready": ready, "first_request": first, "timings": dict(warmup.timings), "errors": warmup.errors}
+
+
+def child(mode: str, args) -> int:
+    import logging
+    from benchmarks.fakes import FakeOpenAI, FakeSupabase, Latency
+
+    logging.disable(logging.WARNING)
+    openai_fake = FakeOpenAI(chat_latency=Latency("0.3"), embedding_latency=Latency(args.embedding_latency))
+    supabase_fake = FakeSupabase(articles=args.articles, sections_per_article=6, clinics=100,
+                                 latency=Latency(args.db_latency))
+    with ExitStack() as stack:
+        for patch in openai_fake.patches() + supabase_fake.patches():
+            stack.enter_context(patch)
+        result = asyncio.run(first_request(mode == "warm"))
+    print(json.dumps(result))
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget", type=float, default=5.0, help="seconds allowed for import plus warm-up")
+    parser.add_argument("--articles", type=int, default=500)
+    parser.add_argument("--embedding-latency", default="0.05")
+    parser.add_argument("--db-latency", default="0.05")
+    parser.add_argument("--child", choices=("warm", "cold"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child(args.child, args)
+
+    env = child_env()
+    failures = []
+    probe = json.loads(subprocess.run([sys.executable, "-c", IMPORT_PROBE], env=env, capture_output=True,
+                                      text=True, check=True).stdout)
+    packages = import_breakdown(env)
+    print(f"import app.main: {probe['seconds'] * 1000:.0f} ms")
+    for package, seconds in sorted(packages.items(), key=lambda item: -item[1])[:8]:
+        print(f"  {package:<20}{seconds * 1000:>8.0f} ms")
+    if probe["loaded"]:
+        failures.append(f"importing the app loads {', '.join(probe['loaded'])}")
+    else:
+        print(f"deferred until warm-up: {', '.join(DEFERRED)}")
+
+    runs = {}
+    for mode in ("cold", "warm"):
+        output = subprocess.run([sys.executable, "-m", "benchmarks.startup", "--child", mode,
+                                 "--articles", str(args.articles), "--embedding-latency", args.embedding_latency,
+                                 "--db-latency", args.db_latency],
+                                env=env, capture_output=True, text=True, check=True).stdout
+        runs[mode] = json.loads(output.strip().splitlines()[-1])
+    warm = runs["warm"]
+    print("warm-up steps:")
+    for step, seconds in warm["timings"].items():
+        if step != "import":
+            print(f"  {step:<20}{seconds * 1000:>8.0f} ms")
+    if warm["errors"]:
+        failures.append(f"warm-up steps failed: {warm['errors']}")
+    print(f"first /api/chat: {runs['cold']['first_request'] * 1000:.0f} ms without warm-up, "
+          f"{warm['first_request'] * 1000:.0f} ms after it")
+
+    total = probe["seconds"] + warm["timings"]["warmup"]
+    print(f"import + warm-up: {total:.2f}s (budget {args.budget:.1f}s)")
+    if total > args.budget:
+        failures.append(f"startup took {total:.2f}s, over the {args.budget:.1f}s budget")
+    if warm["first_request"] >= runs["cold"]["first_request"]:
+        failures.append("the first request was not faster after the warm-up")
+    if failures:
+        print("FAIL: " + "; ".join(failures))
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,181 @@
+"""
+Connection reuse and latency of the OpenAI and Supabase clients against a
+local stub HTTP server, with and without the pooled keep-alive transport.
+The stub charges a setup delay on the first request of every new
+connection (standing in for the TCP and TLS handshakes to a remote API)
+and counts the connections it accepts. Reports connections opened and
+p50/p95 latency for concurrent embedding calls (async OpenAI client) and
+Supabase RPCs (blocking client on the I/O pool).
+
+    python -m benchmarks.transport --calls 400 --concurrency 32 --handshake 0.03
+"""
+import argparse
+import asyncio
+import sys
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+
+from benchmarks.fakes import fake_vector
+
+
+class StubServer:
+    """OpenAI embeddings and PostgREST RPC endpoints, with a per-connection setup delay."""
+
+    def __init__(self, latency: float, handshake: float):
+        self.latency = latency
+        self.handshake = handshake
+        self.connections = 0
+        self._seen = set()
+        self._runner = None
+        self.port = 0
+
+    async def _delay(self, request) -> None:
+        # The client's address and port identify the connection
+        peer = request.transport.get_extra_info("peername")
+        if peer not in self._seen:
+            self._seen.add(peer)
+            self.connections += 1
+            await asyncio.sleep(self.handshake)
+        await asyncio.sleep(self.latency)
+
+    async def embeddings(self, request):
+        from aiohttp import web
+        await self._delay(request)
+        body = await request.json()
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        return web.json_response({
+            "object": "list",
+            "data": [{"object": "embedding", "index": i, "embedding": fake_vector(text)} for i, text in enumerate(inputs)],
+            "model": body.get("model"),
+            "usage": {"prompt_tokens": 8, "total_tokens": 8},
+        })
+
+    async def rpc(self, request):
+        from aiohttp import web
+        await self._delay(request)
+        return web.json_response([{"id": 1, "article_id": 1, "similarity": 0.9}])
+
+    async def start(self) -> None:
+        from aiohttp import web
+        app = web.Application()
+        app.router.add_post("/v1/embeddings", self.embeddings)
+        app.router.add_post("/rest/v1/rpc/{name}", self.rpc)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        await self._runner.cleanup()
+
+
+async def drive(concurrency: int, calls: int, call) -> List[float]:
+    latencies: List[float] = []
+    issued = 0
+
+    async def client() -> None:
+        nonlocal issued
+        while issued < calls:
+            issued += 1
+            number = issued
+            started = time.perf_counter()
+            await call(number)
+            latencies.append(time.perf_counter() - started)
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return latencies
+
+
+def report(label: str, server: StubServer, connections: int, latencies: List[float]) -> Dict[str, Any]:
+    ms = np.asarray(latencies) * 1000
+    row = {
+        "label": label, "connections": server.connections - connections,
+        "p50": float(np.percentile(ms, 50)), "p95": float(np.percentile(ms, 95)),
+    }
+    print(f"{label:<30}{row['connections']:>12}{row['p50']:>10.1f}{row['p95']:>10.1f}")
+    return row
+
+
+async def run(args) -> int:
+    import openai
+    from supabase import create_client
+    from app.config import settings
+    from app.utils.concurrency import run_blocking
+    from app.utils.embeddings import aget_embeddings
+    from app.utils.http import http2_available, openai_transport
+    from app.utils.supabase import supabase
+
+    server = StubServer(args.latency, args.handshake)
+    await server.start()
+    base = f"http://127.0.0.1:{server.port}"
+    openai.api_base = f"{base}/v1"
+    settings.SUPABASE_URL = base
+    settings.SUPABASE_KEY = "local.benchmark.key"
+    rows = []
+    print(f"HTTP/2 for Supabase: {'on' if http2_available() else 'off (h2 not installed)'}")
+    print(f"{'client':<30}{'connections':>12}{'p50 ms':>10}{'p95 ms':>10}")
+    try:
+        async def embed(number: int) -> None:
+            vectors = await aget_embeddings([f"embedding text {args.mode}-{number}"])
+            if not any(vectors[0]):
+                raise RuntimeError("embedding request failed")
+
+        args.mode = "default"
+        connections = server.connections
+        rows.append(report("openai, session per call", server, connections,
+                           await drive(args.concurrency, args.calls, embed)))
+        await openai_transport.open()
+        args.mode = "pooled"
+        connections = server.connections
+        rows.append(report("openai, pooled", server, connections, await drive(args.concurrency, args.calls, embed)))
+        await openai_transport.close()
+
+        # The client the app used before: supabase-py with its default httpx pool
+        default_client = create_client(base, "local.benchmark.key")
+
+        def rpc_with(client):
+            async def call(number: int) -> None:
+                await run_blocking(client.rpc("match_article_sections", {"n": number}).execute)
+            return call
+
+        connections = server.connections
+        rows.append(report("supabase, default client", server, connections,
+                           await drive(args.concurrency, args.calls, rpc_with(default_client))))
+        supabase.open()
+        connections = server.connections
+        rows.append(report("supabase, pooled", server, connections,
+                           await drive(args.concurrency, args.calls, rpc_with(supabase))))
+        supabase.close()
+    finally:
+        await server.stop()
+
+    failures = []
+    for default, pooled in ((rows[0], rows[1]), (rows[2], rows[3])):
+        if pooled["connections"] > args.concurrency:
+            failures.append(f"{pooled['label']} opened {pooled['connections']} connections")
+        if pooled["p50"] > default["p50"] * 1.1:
+            failures.append(f"{pooled['label']} p50 is slower than {default['label']}")
+    if failures:
+        print("FAIL: " + "; ".join(failures))
+        return 1
+    print("OK")
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=400, help="calls per client")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--latency", type=float, default=0.01, help="server time per request, seconds")
+    parser.add_argument("--handshake", type=float, default=0.03, help="setup time per new connection, seconds")
+    args = parser.parse_args()
+
+    import logging
+    logging.disable(logging.WARNING)
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())